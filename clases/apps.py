@@ -5,3 +5,6 @@ class ClasesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "clases"
     verbose_name = "Gestión de Clases"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,33 @@
+"""
+Build the study card code registry (StudyCardCode).
+
+Usage:
+    python manage.py build_study_card_codes
+    python manage.py build_study_card_codes --book "Libreta Musical"
+"""
+from django.core.management.base import BaseCommand
+
+from clases.services import card_registry
+from cms.models import BlogIndexPage
+
+
+class Command(BaseCommand):
+    help = "Build the study card code registry used to resolve codes in pickups and OCR"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--book", type=str, help="Only rebuild books whose title contains this text")
+
+    def handle(self, *args, **options):
+        if not options["book"]:
+            total = card_registry.rebuild_all()
+            self.stdout.write(self.style.SUCCESS(f"{total} codes registered"))
+            return
+
+        books = BlogIndexPage.objects.live().filter(title__icontains=options["book"])
+        if not books.exists():
+            self.stdout.write(self.style.WARNING("No books found"))
+            return
+
+        for book in books:
+            total = card_registry.rebuild_book(book)
+            self.stdout.write(self.style.SUCCESS(f"{book.title}: {total} codes registered"))
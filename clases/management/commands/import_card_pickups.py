@@ -22,7 +22,8 @@ from datetime import date
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand, CommandError
 
-from clases.models import Enrollment, StudyCardItem, StudyCardPickup
+from clases.models import Enrollment, Group
+from clases.services.card_pickups import register_pickups
 
 User = get_user_model()
 
@@ -50,25 +51,28 @@ class Command(BaseCommand):
         except (FileNotFoundError, json.JSONDecodeError) as e:
             raise CommandError(f"Error reading JSON file: {e}")
 
-        created_count = 0
-        skipped_count = 0
-        error_count = 0
+        group = None
+        if options.get("group_id"):
+            group = Group.objects.filter(pk=options["group_id"]).first()
+            if group is None:
+                raise CommandError(f"Group {options['group_id']} not found")
 
-        # Batch-fetch all card items by code to avoid N+1 queries
-        all_codes = [code for entry in data for code in entry.get("codes", [])]
-        card_items_by_code = {
-            item.code: item
-            for item in StudyCardItem.objects.filter(code__in=all_codes)
-        }
+        # Enrollments of the group loaded once to match names in memory
+        enrolled_users = []
+        if group is not None:
+            enrolled_users = [
+                e.user for e in Enrollment.objects.filter(group=group, is_active=True).select_related("user")
+            ]
 
+        error_count = 0
+        entries = []
+        names = {}
         for entry in data:
             student_name = entry.get("student", "")
             codes = entry.get("codes", [])
-            pickup_date = entry.get("date", date.today().isoformat())
-            confidence = entry.get("confidence")
 
             # Find student by name
-            user = self._find_student(student_name, options.get("group_id"))
+            user = self._find_student(student_name, enrolled_users)
             if not user:
                 self.stderr.write(
                     self.style.WARNING(f"Student not found: '{student_name}'")
@@ -76,58 +80,53 @@ class Command(BaseCommand):
                 error_count += len(codes)
                 continue
 
-            for code in codes:
-                card_item = card_items_by_code.get(code)
-                if not card_item:
-                    self.stderr.write(
-                        self.style.WARNING(f"Card code not found: '{code}'")
-                    )
-                    error_count += 1
-                    continue
-
-                if options["dry_run"]:
-                    self.stdout.write(
-                        f"  [DRY RUN] {student_name} <- {code} ({pickup_date})"
-                    )
-                    created_count += 1
-                    continue
-
-                _, created = StudyCardPickup.objects.get_or_create(
-                    card_item=card_item,
-                    student=user,
-                    defaults={
-                        "picked_up_at": pickup_date,
-                        "source": "photo_ocr",
-                        "confidence": confidence,
-                    },
+            names[user.pk] = student_name
+            entries.append({
+                "student_id": user.pk,
+                "codes": codes,
+                "date": entry.get("date"),
+                "confidence": entry.get("confidence"),
+            })
+
+        report = register_pickups(
+            group,
+            entries,
+            picked_up_at=date.today().isoformat(),
+            source="photo_ocr",
+            dry_run=options["dry_run"],
+        )
+
+        prefix = "  [DRY RUN] " if options["dry_run"] else "  "
+        for row in report["rows"]:
+            student_name = names[row["student_id"]]
+            if row["status"] == "created":
+                self.stdout.write(f"{prefix}{student_name} <- {row['code']}")
+            elif row["status"] == "unknown_code":
+                self.stderr.write(
+                    self.style.WARNING(f"Card code not found: '{row['code']}'")
+                )
+            elif row["status"] == "not_enrolled":
+                self.stderr.write(
+                    self.style.WARNING(f"Student not enrolled: '{student_name}'")
                 )
-                if created:
-                    created_count += 1
-                    self.stdout.write(f"  {student_name} <- {code}")
-                else:
-                    skipped_count += 1
 
         self.stdout.write(
             self.style.SUCCESS(
-                f"\nImported: {created_count} | "
-                f"Skipped (duplicate): {skipped_count} | "
-                f"Errors: {error_count}"
+                f"\nImported: {report['created']} | "
+                f"Skipped (duplicate): {report['duplicates']} | "
+                f"Errors: {error_count + report['errors']}"
             )
         )
 
-    def _find_student(self, name, group_id=None):
-        """Find a user by name, optionally within a group."""
-        if group_id:
-            enrollments = Enrollment.objects.filter(
-                group_id=group_id,
-                is_active=True,
-                user__name__icontains=name.strip(),
-            ).select_related("user")
-            if enrollments.exists():
-                return enrollments.first().user
+    def _find_student(self, name, enrolled_users=()):
+        """Find a user by name, first among the group's enrolled students."""
+        needle = name.strip().lower()
+        for user in enrolled_users:
+            if needle in (user.name or "").lower():
+                return user
 
         # Fallback: search all users
-        users = User.objects.filter(name__icontains=name.strip())
-        if users.count() == 1:
-            return users.first()
+        users = list(User.objects.filter(name__icontains=name.strip())[:2])
+        if len(users) == 1:
+            return users[0]
         return None
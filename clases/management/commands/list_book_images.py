@@ -53,7 +53,7 @@ class Command(BaseCommand):
 
             for ch_idx, chapter in enumerate(chapters, start=1):
                 if options["codes"]:
-                    codes = generate_codes_for_page(chapter, all_books=all_books, tag=options.get("tag"))
+                    codes = generate_codes_for_page(chapter, all_books=all_books, tag=options.get("tag"), book=book)
                     if not codes:
                         continue
                     total_images += len(codes)
@@ -0,0 +1,17 @@
+"""
+Rebuild the stored image counters used by the study cards dashboard.
+
+Usage:
+    python manage.py rebuild_study_card_stats
+"""
+from django.core.management.base import BaseCommand
+
+from clases.services import card_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute per-page image and imprimible counters for the study cards dashboard"
+
+    def handle(self, *args, **options):
+        total = card_stats.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f"{total} pages updated"))
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.11 on 2026-10-18 23:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clases', '0013_classsession_reflection'),
+        ('wagtailcore', '0097_baselogentry_uuid_action_timestamp_indexes'),
+        ('wagtailimages', '0027_image_description'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudyCardCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20, unique=True, verbose_name='Código')),
+                ('chapter_num', models.PositiveIntegerField(verbose_name='Número de capítulo')),
+                ('position', models.PositiveIntegerField(verbose_name='Posición en el capítulo')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='study_card_codes', to='wagtailcore.page', verbose_name='Libro')),
+                ('chapter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wagtailcore.page', verbose_name='Capítulo')),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wagtailimages.image', verbose_name='Imagen')),
+            ],
+            options={
+                'verbose_name': 'Código de Tarjeta',
+                'verbose_name_plural': 'Códigos de Tarjetas',
+                'ordering': ['book', 'chapter_num', 'position'],
+            },
+        ),
+    ]
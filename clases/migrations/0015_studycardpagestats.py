@@ -0,0 +1,31 @@
+# Generated by Django 5.0.11 on 2026-10-18 23:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clases', '0014_studycardcode'),
+        ('wagtailcore', '0097_baselogentry_uuid_action_timestamp_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudyCardPageStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image_ids', models.JSONField(blank=True, default=list, verbose_name='Imágenes')),
+                ('total_images', models.PositiveIntegerField(default=0, verbose_name='Imágenes')),
+                ('imprimible_images', models.PositiveIntegerField(default=0, verbose_name='Imprimibles')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('book', models.ForeignKey(blank=True, help_text='BlogIndexPage padre si la página es un capítulo', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='study_card_chapter_stats', to='wagtailcore.page', verbose_name='Libro')),
+                ('page', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='study_card_stats', to='wagtailcore.page', verbose_name='Página')),
+            ],
+            options={
+                'verbose_name': 'Estadísticas de Tarjetas',
+                'verbose_name_plural': 'Estadísticas de Tarjetas',
+            },
+        ),
+    ]
@@ -854,59 +854,44 @@ class GroupLibraryItem(models.Model):
                 })
 
         # --- 2) + 3) Body RichTextField (imágenes y embeds de media) ---
-        body_html = getattr(blogpage, "body", None)
-        if body_html:
-            from bs4 import BeautifulSoup
-
-            soup = BeautifulSoup(body_html, "html.parser")
-
+        # Las referencias se extraen al guardar la BlogPage (`body_refs`),
+        # así que aquí no hace falta parsear el HTML.
+        int_ids = blogpage.get_body_image_ids()
+        embed_urls = blogpage.get_body_embed_urls()
+        if int_ids or embed_urls:
             # 2) Imágenes embebidas en el body — son Image reales con PK.
             # Dedupe contra las imágenes ya añadidas desde attachments.
             existing_image_pks = {
                 e["object"].pk for e in elements if e["type"] == "image"
             }
-            image_id_attrs = [
-                tag.get("id")
-                for tag in soup.find_all("embed", embedtype="image")
-                if tag.get("id")
-            ]
-            if image_id_attrs:
+            if int_ids:
                 # Una sola query para todas las imágenes del body
-                try:
-                    int_ids = [int(i) for i in image_id_attrs]
-                except (TypeError, ValueError):
-                    int_ids = []
-                if int_ids:
-                    db_images = Image.objects.filter(pk__in=int_ids)
-                    for image in db_images:
-                        if image.pk in existing_image_pks:
-                            continue
-                        elements.append({
-                            "type": "image",
-                            "title": image.title,
-                            "object": image,
-                            "content_type_id": image_ct.id,
-                            "tags": [],
-                            "session_count": self.get_session_count_for_object(
-                                self.group, image
-                            ),
-                        })
-                        existing_image_pks.add(image.pk)
+                db_images = Image.objects.filter(pk__in=int_ids)
+                for image in db_images:
+                    if image.pk in existing_image_pks:
+                        continue
+                    elements.append({
+                        "type": "image",
+                        "title": image.title,
+                        "object": image,
+                        "content_type_id": image_ct.id,
+                        "tags": [],
+                        "session_count": self.get_session_count_for_object(
+                            self.group, image
+                        ),
+                    })
+                    existing_image_pks.add(image.pk)
 
             # 3) Embeds de media (vídeos/audios) embebidos en el body.
             # `get_embed(url)` resuelve y cachea en el modelo Embed.
-            media_embed_tags = soup.find_all("embed", embedtype="media")
-            if media_embed_tags:
+            if embed_urls:
                 from wagtail.embeds.embeds import get_embed
                 from wagtail.embeds.exceptions import EmbedException
                 from wagtail.embeds.models import Embed
 
                 embed_ct = ContentType.objects.get_for_model(Embed)
                 seen_embed_pks = set()
-                for tag in media_embed_tags:
-                    url = tag.get("url")
-                    if not url:
-                        continue
+                for url in embed_urls:
                     try:
                         embed_obj = get_embed(url)
                     except EmbedException:
@@ -1028,8 +1013,11 @@ class ClassSession(models.Model):
         Reordenar items según lista de IDs.
         item_ids: lista de IDs en el orden deseado
         """
-        for index, item_id in enumerate(item_ids):
-            self.items.filter(pk=item_id).update(order=index)
+        positions = {int(item_id): index for index, item_id in enumerate(item_ids)}
+        items = list(self.items.filter(pk__in=positions).only("pk", "order", "session"))
+        for item in items:
+            item.order = positions[item.pk]
+        ClassSessionItem.objects.bulk_update(items, ["order"])
 
     # === Cierre / reflexión ===
 
@@ -1459,3 +1447,80 @@ class StudyCardLabel(models.Model):
 
     def __str__(self):
         return f"{self.description} ({self.image.title})"
+
+
+class StudyCardCode(models.Model):
+    """
+    Registro código → imagen de los capítulos de cada libro.
+
+    Lo reconstruye `clases.services.card_registry` (comando
+    `build_study_card_codes` y señales de publicación/movimiento de páginas),
+    de modo que resolver un código es una única consulta indexada.
+    """
+
+    code = models.CharField(max_length=20, unique=True, verbose_name="Código")
+    image = models.ForeignKey(
+        "wagtailimages.Image",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Imagen",
+    )
+    chapter = models.ForeignKey(
+        "wagtailcore.Page",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Capítulo",
+    )
+    book = models.ForeignKey(
+        "wagtailcore.Page",
+        on_delete=models.CASCADE,
+        related_name="study_card_codes",
+        verbose_name="Libro",
+    )
+    chapter_num = models.PositiveIntegerField(verbose_name="Número de capítulo")
+    position = models.PositiveIntegerField(verbose_name="Posición en el capítulo")
+
+    class Meta:
+        ordering = ["book", "chapter_num", "position"]
+        verbose_name = "Código de Tarjeta"
+        verbose_name_plural = "Códigos de Tarjetas"
+
+    def __str__(self):
+        return f"{self.code} - {self.image_id}"
+
+
+class StudyCardPageStats(models.Model):
+    """
+    Contadores de imágenes de una BlogPage para el panel de tarjetas.
+
+    Los mantiene `clases.services.card_stats` al publicar o mover la página y
+    al marcar/desmarcar una imagen como imprimible, para que el panel agregue
+    sin parsear el contenido de cada página.
+    """
+
+    page = models.OneToOneField(
+        "wagtailcore.Page",
+        on_delete=models.CASCADE,
+        related_name="study_card_stats",
+        verbose_name="Página",
+    )
+    book = models.ForeignKey(
+        "wagtailcore.Page",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="study_card_chapter_stats",
+        verbose_name="Libro",
+        help_text="BlogIndexPage padre si la página es un capítulo",
+    )
+    image_ids = models.JSONField(default=list, blank=True, verbose_name="Imágenes")
+    total_images = models.PositiveIntegerField(default=0, verbose_name="Imágenes")
+    imprimible_images = models.PositiveIntegerField(default=0, verbose_name="Imprimibles")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Estadísticas de Tarjetas"
+        verbose_name_plural = "Estadísticas de Tarjetas"
+
+    def __str__(self):
+        return f"{self.page_id}: {self.imprimible_images}/{self.total_images}"
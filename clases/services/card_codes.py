@@ -6,8 +6,15 @@ Produces deterministic codes from CMS structure:
 
 Example: LM-3-07 = Libreta Musical, chapter 3, image 7
 """
+from django.core.cache import cache
+from wagtail.images import get_image_model
+from wagtail.models import Page
+
 from cms.models import BlogPage, BlogIndexPage
 
+CHAPTER_POSITIONS_CACHE_KEY = "clases:card_codes:chapters:{path}"
+CHAPTER_POSITIONS_TIMEOUT = 60 * 60 * 24
+
 
 def _get_book_abbreviation(index_page):
     """
@@ -22,39 +29,106 @@ def _get_book_abbreviation(index_page):
     return "".join(initials[:3]) or index_page.title[:2].upper()
 
 
+def _resolve_abbreviation(book, all_books=None):
+    """
+    Abbreviation for `book`, disambiguated against `all_books`.
+
+    If another book shares the abbreviation, append the first letter of the
+    title that is not already part of it.
+    """
+    abbrev = _get_book_abbreviation(book)
+    if all_books is None:
+        return abbrev
+    same_abbrev = [
+        b for b in all_books
+        if b.pk != book.pk and _get_book_abbreviation(b) == abbrev
+    ]
+    if same_abbrev:
+        # Add differentiating character from title
+        for char in book.title:
+            if char.upper() not in abbrev and char.isalpha():
+                abbrev = abbrev + char.upper()
+                break
+    return abbrev
+
+
+def book_abbreviations(all_books):
+    """
+    Resolve the abbreviation of every book in one pass.
+
+    Returns:
+        dict: {book.pk: abbrev}
+    """
+    by_abbrev = {}
+    for book in all_books:
+        by_abbrev.setdefault(_get_book_abbreviation(book), []).append(book)
+
+    result = {}
+    for abbrev, books in by_abbrev.items():
+        for book in books:
+            result[book.pk] = (
+                _resolve_abbreviation(book, books) if len(books) > 1 else abbrev
+            )
+    return result
+
+
+def chapter_positions(parent_path):
+    """
+    1-based position of every BlogPage child of the page at `parent_path`.
+
+    One query over the children ordered by path, cached until a chapter
+    under that parent is saved, moved or deleted (see `clases/signals.py`).
+
+    Returns:
+        dict: {blog_page.pk: position}
+    """
+    key = CHAPTER_POSITIONS_CACHE_KEY.format(path=parent_path)
+    positions = cache.get(key)
+    if positions is None:
+        child_ids = (
+            BlogPage.objects.filter(
+                path__startswith=parent_path,
+                depth=len(parent_path) // Page.steplen + 1,
+            )
+            .order_by("path")
+            .values_list("pk", flat=True)
+        )
+        positions = {pk: idx for idx, pk in enumerate(child_ids, start=1)}
+        cache.set(key, positions, CHAPTER_POSITIONS_TIMEOUT)
+    return positions
+
+
+def invalidate_chapter_positions(parent_path):
+    cache.delete(CHAPTER_POSITIONS_CACHE_KEY.format(path=parent_path))
+
+
 def _get_chapter_position(blog_page):
     """
     Get 1-based position of a BlogPage among its siblings, ordered by Wagtail path.
     """
-    siblings = (
-        blog_page.get_parent()
-        .get_children()
-        .type(BlogPage)
-        .order_by("path")
-    )
-    for idx, sibling in enumerate(siblings, start=1):
-        if sibling.pk == blog_page.pk:
-            return idx
-    return 1
+    return chapter_positions(blog_page.path[:-Page.steplen]).get(blog_page.pk, 1)
 
 
 def find_book_index_page(blog_page):
     """
     Navigate up the Wagtail page tree to find the nearest BlogIndexPage ancestor.
     This is the "book" container.
+
+    Ancestor paths are prefixes of the page's own path, so a single query
+    finds the closest one.
     """
-    ancestors = blog_page.get_ancestors().type(BlogIndexPage).specific()
-    if ancestors.exists():
-        # Return the closest BlogIndexPage ancestor (last in the list = most specific)
-        return ancestors.last()
-    # Fallback: use direct parent if it's a BlogIndexPage
-    parent = blog_page.get_parent().specific
-    if isinstance(parent, BlogIndexPage):
-        return parent
-    return None
+    steplen = Page.steplen
+    ancestor_paths = [
+        blog_page.path[:end] for end in range(steplen, len(blog_page.path), steplen)
+    ]
+    return (
+        BlogIndexPage.objects.filter(path__in=ancestor_paths)
+        .order_by("-depth")
+        .first()
+    )
 
 
-def generate_code(blog_page, image_index, all_books=None):
+def generate_code(blog_page, image_index, all_books=None, book=None):
     """
     Generate a deterministic study card code.
 
@@ -62,35 +136,24 @@ def generate_code(blog_page, image_index, all_books=None):
         blog_page: A BlogPage instance (the chapter)
         image_index: 1-based index of the image within get_images()
         all_books: Optional list of all BlogIndexPage titles for collision detection
+        book: Optional BlogIndexPage already known to contain `blog_page`
 
     Returns:
         str: Code like "LM-3-07"
     """
-    book = find_book_index_page(blog_page)
+    if book is None:
+        book = find_book_index_page(blog_page)
     if not book:
         # Fallback: use first 2 chars of page title
         abbrev = blog_page.title[:2].upper()
     else:
-        abbrev = _get_book_abbreviation(book)
-
-        # Collision detection: if another book shares the abbreviation
-        if all_books is not None:
-            same_abbrev = [
-                b for b in all_books
-                if b.pk != book.pk and _get_book_abbreviation(b) == abbrev
-            ]
-            if same_abbrev:
-                # Add differentiating character from title
-                for char in book.title:
-                    if char.upper() not in abbrev and char.isalpha():
-                        abbrev = abbrev + char.upper()
-                        break
+        abbrev = _resolve_abbreviation(book, all_books)
 
     chapter_num = _get_chapter_position(blog_page)
     return f"{abbrev}-{chapter_num}-{image_index:02d}"
 
 
-def generate_codes_for_page(blog_page, all_books=None, tag=None):
+def generate_codes_for_page(blog_page, all_books=None, tag=None, book=None):
     """
     Generate codes for all images in a BlogPage.
 
@@ -100,32 +163,30 @@ def generate_codes_for_page(blog_page, all_books=None, tag=None):
         blog_page: A BlogPage instance (the chapter)
         all_books: Optional list of all BlogIndexPage titles for collision detection
         tag: Optional tag name to filter images (e.g. "imprimible")
+        book: Optional BlogIndexPage already known to contain `blog_page`
+            (callers iterating a book's chapters pass it to skip the lookup)
 
     Returns:
         list of (image, code) tuples
     """
     images = blog_page.get_images()
-    if tag:
-        images = [img for img in images if img.tags.filter(name=tag).exists()]
+    if tag and images:
+        tagged_ids = set(
+            get_image_model().objects.filter(
+                pk__in=[img.pk for img in images], tags__name=tag
+            ).values_list("pk", flat=True)
+        )
+        images = [img for img in images if img.pk in tagged_ids]
     if not images:
         return []
 
     # Compute expensive lookups once for the entire page
-    book = find_book_index_page(blog_page)
+    if book is None:
+        book = find_book_index_page(blog_page)
     if not book:
         abbrev = blog_page.title[:2].upper()
     else:
-        abbrev = _get_book_abbreviation(book)
-        if all_books is not None:
-            same_abbrev = [
-                b for b in all_books
-                if b.pk != book.pk and _get_book_abbreviation(b) == abbrev
-            ]
-            if same_abbrev:
-                for char in book.title:
-                    if char.upper() not in abbrev and char.isalpha():
-                        abbrev = abbrev + char.upper()
-                        break
+        abbrev = _resolve_abbreviation(book, all_books)
 
     chapter_num = _get_chapter_position(blog_page)
 
@@ -12,9 +12,12 @@ from django.conf import settings
 from google import genai
 from google.genai import types
 
+from martina_bescos_app.utils import llm_cache
+
 logger = logging.getLogger(__name__)
 
 MODEL_ID = "gemini-2.0-flash"
+CACHE_NAMESPACE = "card_ocr"
 
 PROMPT_TEMPLATE = """Analiza esta foto de una hoja de registro de tarjetas de estudio musical.
 
@@ -65,6 +68,14 @@ def ocr_registration_sheet(image_bytes, mime_type, student_names):
         student_names="\n".join(f"- {name}" for name in student_names)
     )
 
+    # La misma foto con la misma lista de alumnos se reutiliza (reintentos, reimportaciones)
+    cache_key = llm_cache.make_key(
+        CACHE_NAMESPACE, MODEL_ID, prompt, data=image_bytes, config={"mime_type": mime_type}
+    )
+    cached = llm_cache.lookup(cache_key)
+    if cached is not None:
+        return cached, None
+
     try:
         client = genai.Client(api_key=settings.GEMINI_API_KEY)
 
@@ -97,6 +108,7 @@ def ocr_registration_sheet(image_bytes, mime_type, student_names):
                     "codes": [c.strip().upper() for c in entry["codes"] if isinstance(c, str)],
                     "confidence": float(entry.get("confidence", 0.5)),
                 })
+        llm_cache.store(cache_key, validated)
         return validated, None
 
     except json.JSONDecodeError:
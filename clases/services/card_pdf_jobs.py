@@ -0,0 +1,177 @@
+"""
+Study Card PDF jobs.
+
+Card PDFs are generated by a Huey task (`clases.tasks.generate_study_card_pdf`)
+instead of inside the request, and stored on the default storage under a
+digest of everything that affects the output: images (file, hash and focal
+point, which determine the renditions), codes, descriptions and layout
+options. Identical requests reuse the stored file.
+
+Job status lives in the cache while the task runs; once the file exists in
+storage the job is done. With a per-process cache (LocMemCache in local
+settings) the consumer's errors never reach the web process, so every
+request enqueues the job again instead of waiting on a pending marker.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from clases.models import StudyCardLabel
+from clases.services.card_codes import generate_codes_for_page
+from clases.services.card_pdf import generate_cards_pdf
+from clases.services.card_stats import TAG_IMPRIMIBLE
+from cms.models import BlogIndexPage, BlogPage
+from martina_bescos_app.utils.cache import cache_is_shared
+
+# Bump when the PDF layout changes so stored files are regenerated
+PDF_LAYOUT_VERSION = 1
+PDF_STORAGE_DIR = "study_cards/pdf"
+STATUS_CACHE_KEY = "clases:card_pdf:{digest}"
+STATUS_TIMEOUT = 60 * 60
+
+PENDING = "pending"
+DONE = "done"
+ERROR = "error"
+MISSING = "missing"
+
+
+def _labels(page_ids):
+    return {
+        (l.image_id, l.source_page_id): l.description
+        for l in StudyCardLabel.objects.filter(source_page_id__in=page_ids)
+    }
+
+
+def book_items(book):
+    """
+    Cards of a book: (items, fill_items).
+
+    items are the imprimible images as (image, code, description); fill_items
+    the rest of the book's images as (image, code), used to fill blank halves.
+    """
+    chapters = list(book.get_children().type(BlogPage).specific().order_by("path"))
+    all_books = list(BlogIndexPage.objects.live())
+    labels = _labels([ch.pk for ch in chapters])
+
+    items = []
+    all_codes = []
+    for chapter in chapters:
+        codes = generate_codes_for_page(chapter, all_books=all_books, tag=TAG_IMPRIMIBLE, book=book)
+        items.extend((img, code, labels.get((img.pk, chapter.pk), "")) for img, code in codes)
+        all_codes.extend(generate_codes_for_page(chapter, all_books=all_books, book=book))
+
+    selected_ids = {img.pk for img, _, _ in items}
+    fill_items = [(img, code) for img, code in all_codes if img.pk not in selected_ids]
+    return items, fill_items
+
+
+def page_items(page):
+    """Cards of a single BlogPage: (items, fill_items), as in `book_items`."""
+    all_books = list(BlogIndexPage.objects.live())
+    labels = _labels([page.pk])
+
+    items = [
+        (img, code, labels.get((img.pk, page.pk), ""))
+        for img, code in generate_codes_for_page(page, all_books=all_books, tag=TAG_IMPRIMIBLE)
+    ]
+    selected_ids = {img.pk for img, _, _ in items}
+    fill_items = [
+        (img, code)
+        for img, code in generate_codes_for_page(page, all_books=all_books)
+        if img.pk not in selected_ids
+    ]
+    return items, fill_items
+
+
+def _image_key(image):
+    return [
+        image.pk,
+        image.file.name,
+        image.file_hash,
+        image.focal_point_x,
+        image.focal_point_y,
+        image.focal_point_width,
+        image.focal_point_height,
+    ]
+
+
+def pdf_digest(items, fill_items, duplicate, page_format):
+    """Hash of everything that determines the generated PDF."""
+    payload = {
+        "version": PDF_LAYOUT_VERSION,
+        "items": [[_image_key(img), code, desc] for img, code, desc in items],
+        "fill": [[_image_key(img), code] for img, code in fill_items],
+        "duplicate": bool(duplicate),
+        "page_format": page_format,
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.sha256(raw).hexdigest()
+
+
+def storage_path(digest):
+    return f"{PDF_STORAGE_DIR}/{digest}.pdf"
+
+
+def get_status(digest):
+    """
+    Status of the PDF job for `digest`.
+
+    Returns:
+        tuple: (status, error message or "")
+    """
+    if default_storage.exists(storage_path(digest)):
+        return DONE, ""
+    state = cache.get(STATUS_CACHE_KEY.format(digest=digest))
+    if state is None:
+        return MISSING, ""
+    if state.startswith(f"{ERROR}:"):
+        return ERROR, state[len(ERROR) + 1:]
+    return PENDING, ""
+
+
+def mark_pending(digest):
+    """
+    Mark the job as pending. Returns False if it was already pending and the
+    consumer shares the cache (it will clear the marker or record an error).
+    """
+    key = STATUS_CACHE_KEY.format(digest=digest)
+    if not cache_is_shared():
+        cache.set(key, PENDING, STATUS_TIMEOUT)
+        return True
+    return cache.add(key, PENDING, STATUS_TIMEOUT)
+
+
+def clear_status(digest):
+    cache.delete(STATUS_CACHE_KEY.format(digest=digest))
+
+
+def mark_error(digest, message):
+    cache.set(STATUS_CACHE_KEY.format(digest=digest), f"{ERROR}:{message}", STATUS_TIMEOUT)
+
+
+def build_pdf(kind, object_id, duplicate, page_format, digest):
+    """
+    Generate the PDF of a book (`kind="book"`) or page (`kind="page"`) and
+    store it. Runs inside the Huey task.
+
+    The cards are read again here, so the file is stored under the digest of
+    what was actually rendered: if the content changed since `digest` was
+    computed in the request, the requested job ends as missing instead of
+    serving a PDF that no longer matches its key.
+    """
+    if kind == "book":
+        items, fill_items = book_items(BlogIndexPage.objects.get(pk=object_id))
+    else:
+        items, fill_items = page_items(BlogPage.objects.get(pk=object_id))
+
+    path = storage_path(pdf_digest(items, fill_items, duplicate, page_format))
+    if not default_storage.exists(path):
+        pdf_bytes = generate_cards_pdf(
+            items, fill_items=fill_items, duplicate=duplicate, page_format=page_format,
+        )
+        default_storage.save(path, ContentFile(pdf_bytes))
+    clear_status(digest)
+    return path
@@ -0,0 +1,180 @@
+"""
+Bulk registration of study card pickups.
+
+Takes a whole OCR result (student → codes) and resolves enrollments, card
+items, registry codes and existing pickups with a handful of `IN` queries,
+then inserts the new pickups with one `bulk_create` inside a transaction.
+
+Report statuses per (student, code) row:
+  created       new pickup registered
+  duplicate     the student already had that card (or it was repeated)
+  unknown_code  the code is not in the group's batches nor in the registry
+  not_enrolled  the student is not actively enrolled in the group
+"""
+from django.db import transaction
+
+from clases.models import (
+    Enrollment,
+    StudyCardBatch,
+    StudyCardCode,
+    StudyCardItem,
+    StudyCardPickup,
+)
+from clases.services import card_registry
+
+AUTO_BATCH_OWNER_ID = 1  # Placeholder owner for auto-batches, replaced by the first real user
+
+
+def _normalize(entries):
+    rows = []
+    for entry in entries:
+        codes = []
+        for code in entry.get("codes", []):
+            code = (code or "").strip().upper()
+            if code and code not in codes:
+                codes.append(code)
+        rows.append({
+            "student_id": int(entry["student_id"]),
+            "codes": codes,
+            "confidence": entry.get("confidence"),
+            "date": entry.get("date"),
+        })
+    return rows
+
+
+def _resolve_items(group, codes, user):
+    """
+    Map code → StudyCardItem for `codes`, creating auto-batch items from the
+    registry for codes the group has not used yet.
+    """
+    items_qs = StudyCardItem.objects.filter(code__in=codes).select_related("batch")
+    if group is not None:
+        items_qs = items_qs.filter(batch__group=group)
+    items = {}
+    for item in items_qs.order_by("pk"):
+        items.setdefault(item.code, item)
+
+    missing = [code for code in codes if code not in items]
+    if group is None or not missing:
+        return items
+
+    card_registry.ensure_built()
+    entries = list(StudyCardCode.objects.filter(code__in=missing).select_related("book"))
+    if not entries:
+        return items
+
+    titles = {f"Auto — {entry.book.title}" for entry in entries}
+    batches = {
+        batch.title: batch
+        for batch in StudyCardBatch.objects.filter(group=group, title__in=titles)
+    }
+    owner_id = user.pk if user is not None else AUTO_BATCH_OWNER_ID
+    new_batches = [
+        StudyCardBatch(group=group, title=title, created_by_id=owner_id)
+        for title in sorted(titles - set(batches))
+    ]
+    for batch in StudyCardBatch.objects.bulk_create(new_batches):
+        batches[batch.title] = batch
+
+    new_items = [
+        StudyCardItem(
+            batch=batches[f"Auto — {entry.book.title}"],
+            image_id=entry.image_id,
+            source_page_id=entry.chapter_id,
+            code=entry.code,
+            position=0,
+        )
+        for entry in entries
+    ]
+    for item in StudyCardItem.objects.bulk_create(new_items):
+        items[item.code] = item
+    return items
+
+
+def register_pickups(group, entries, picked_up_at, source="photo_ocr", user=None, dry_run=False):
+    """
+    Register the pickups of several students at once.
+
+    Args:
+        group: Group whose enrollments and batches are used. If None, codes
+            are matched against every existing StudyCardItem and enrollment
+            is not checked (legacy import without group).
+        entries: iterable of {"student_id", "codes", "confidence"?, "date"?}
+        picked_up_at: date (or ISO string) of the pickup, unless the entry
+            has its own "date"
+        source: StudyCardPickup.source value
+        user: teacher confirming; becomes owner of auto-batches
+        dry_run: compute the report without saving anything
+
+    Returns:
+        dict: {"created": int, "duplicates": int, "errors": int, "rows": [...]}
+    """
+    entries = _normalize(entries)
+    student_ids = {entry["student_id"] for entry in entries}
+
+    with transaction.atomic():
+        if group is not None:
+            enrolled = set(
+                Enrollment.objects.filter(
+                    group=group, user_id__in=student_ids, is_active=True
+                ).values_list("user_id", flat=True)
+            )
+        else:
+            enrolled = student_ids
+
+        codes = list(dict.fromkeys(
+            code for entry in entries if entry["student_id"] in enrolled for code in entry["codes"]
+        ))
+        items = _resolve_items(group, codes, user) if codes else {}
+
+        if user is not None:
+            auto_batch_ids = {
+                item.batch_id for item in items.values()
+                if item.batch.created_by_id == AUTO_BATCH_OWNER_ID
+            }
+            if auto_batch_ids:
+                StudyCardBatch.objects.filter(pk__in=auto_batch_ids).update(created_by=user)
+
+        existing = set(
+            StudyCardPickup.objects.filter(
+                card_item__in=[item.pk for item in items.values()],
+                student_id__in=student_ids,
+            ).values_list("student_id", "card_item_id")
+        ) if items else set()
+
+        rows = []
+        pickups = []
+        for entry in entries:
+            student_id = entry["student_id"]
+            for code in entry["codes"]:
+                row = {"student_id": student_id, "code": code}
+                item = items.get(code)
+                if student_id not in enrolled:
+                    row["status"] = "not_enrolled"
+                elif item is None:
+                    row["status"] = "unknown_code"
+                elif (student_id, item.pk) in existing:
+                    row["status"] = "duplicate"
+                else:
+                    row["status"] = "created"
+                    existing.add((student_id, item.pk))
+                    pickups.append(StudyCardPickup(
+                        card_item=item,
+                        student_id=student_id,
+                        picked_up_at=entry["date"] or picked_up_at,
+                        source=source,
+                        confidence=entry["confidence"],
+                    ))
+                rows.append(row)
+
+        StudyCardPickup.objects.bulk_create(pickups, ignore_conflicts=True)
+        if dry_run:
+            transaction.set_rollback(True)
+
+    statuses = [row["status"] for row in rows]
+    return {
+        "created": statuses.count("created"),
+        "duplicates": statuses.count("duplicate"),
+        "errors": len(statuses) - statuses.count("created") - statuses.count("duplicate"),
+        "rows": rows,
+    }
@@ -0,0 +1,141 @@
+"""
+Study Card code registry.
+
+Keeps `StudyCardCode` (code → image, chapter, book, position) in sync with
+the CMS so resolving a code typed by the teacher or read by the OCR is a
+single indexed lookup instead of regenerating every book's codes.
+
+Codes are the same ones `card_codes.generate_codes_for_page` produces for the
+chapters (direct BlogPage children) of every live BlogIndexPage. Book
+abbreviation collisions are resolved once per rebuild.
+"""
+import logging
+
+from django.db import transaction
+
+from clases.models import StudyCardCode
+from clases.services.card_codes import book_abbreviations
+from cms.models import BlogIndexPage, BlogPage
+
+logger = logging.getLogger(__name__)
+
+
+def _book_rows(book, abbrev):
+    """Unsaved StudyCardCode rows for every image of every chapter in `book`."""
+    chapters = book.get_children().type(BlogPage).specific().order_by("path")
+    rows = []
+    for chapter_num, chapter in enumerate(chapters, start=1):
+        for idx, image in enumerate(chapter.get_images(), start=1):
+            rows.append(StudyCardCode(
+                code=f"{abbrev}-{chapter_num}-{idx:02d}",
+                image=image,
+                chapter_id=chapter.pk,
+                book_id=book.pk,
+                chapter_num=chapter_num,
+                position=idx,
+            ))
+    return rows
+
+
+def _dedupe(rows, taken=()):
+    """Drop rows whose code is already used, keeping the first occurrence."""
+    seen = set(taken)
+    unique = []
+    for row in rows:
+        if row.code in seen:
+            logger.warning("Código de tarjeta duplicado %s (capítulo %s), se ignora", row.code, row.chapter_id)
+            continue
+        seen.add(row.code)
+        unique.append(row)
+    return unique
+
+
+def rebuild_all():
+    """
+    Rebuild the whole registry.
+
+    Returns:
+        int: number of codes stored
+    """
+    all_books = list(BlogIndexPage.objects.live().order_by("path"))
+    abbreviations = book_abbreviations(all_books)
+
+    rows = []
+    for book in all_books:
+        rows.extend(_book_rows(book, abbreviations[book.pk]))
+    rows = _dedupe(rows)
+
+    with transaction.atomic():
+        StudyCardCode.objects.all().delete()
+        StudyCardCode.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def rebuild_book(book):
+    """
+    Rebuild the codes of a single book (after a chapter changed).
+
+    Returns:
+        int: number of codes stored for the book
+    """
+    with transaction.atomic():
+        StudyCardCode.objects.filter(book_id=book.pk).delete()
+        if not BlogIndexPage.objects.live().filter(pk=book.pk).exists():
+            return 0
+
+        abbrev = book_abbreviations(list(BlogIndexPage.objects.live()))[book.pk]
+        taken = StudyCardCode.objects.values_list("code", flat=True)
+        rows = _dedupe(_book_rows(book, abbrev), taken=taken)
+        StudyCardCode.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def refresh_for_page(page):
+    """
+    Update the registry after `page` was published, unpublished or moved.
+
+    A book change may alter abbreviation collisions with other books, so it
+    rebuilds everything; a chapter change only rebuilds its book.
+    """
+    page = page.specific
+    if isinstance(page, BlogIndexPage):
+        rebuild_all()
+        return
+
+    if isinstance(page, BlogPage):
+        # Puede haber salido de un libro: sus códigos ya no son válidos
+        StudyCardCode.objects.filter(chapter_id=page.pk).delete()
+        parent = page.get_parent()
+        if parent is not None and isinstance(parent.specific, BlogIndexPage):
+            rebuild_book(parent.specific)
+
+
+def refresh_book_by_id(book_id):
+    """Rebuild the book with pk `book_id`, if it is (still) a book."""
+    book = BlogIndexPage.objects.filter(pk=book_id).first()
+    if book is not None:
+        rebuild_book(book)
+
+
+def ensure_built():
+    """
+    Build the registry if it has never been built (fresh install without
+    running `build_study_card_codes`).
+    """
+    if not StudyCardCode.objects.exists():
+        rebuild_all()
+
+
+def lookup(code):
+    """
+    Resolve a code to its `StudyCardCode`, or None.
+
+    The registry is built on the first miss if it is still empty.
+    """
+    code = code.strip().upper()
+    queryset = StudyCardCode.objects.select_related("image", "chapter", "book")
+    entry = queryset.filter(code=code).first()
+    if entry is None and not StudyCardCode.objects.exists():
+        rebuild_all()
+        entry = queryset.filter(code=code).first()
+    return entry
@@ -0,0 +1,102 @@
+"""
+Study Card image counters.
+
+Stores per-page counters (total images, `imprimible` images) in
+`StudyCardPageStats` so the study cards dashboard aggregates them with a
+query instead of parsing every page and checking tags image by image.
+
+Counters are refreshed when a BlogPage is published or moved
+(`clases/signals.py`) and when an image is (un)marked as imprimible.
+"""
+from wagtail.images import get_image_model
+from wagtail.models import Page
+
+from clases.models import StudyCardPageStats
+from cms.models import BlogIndexPage, BlogPage
+
+TAG_IMPRIMIBLE = "imprimible"
+
+
+def _tagged_ids(image_ids):
+    if not image_ids:
+        return set()
+    return set(
+        get_image_model().objects.filter(pk__in=image_ids, tags__name=TAG_IMPRIMIBLE)
+        .values_list("pk", flat=True)
+    )
+
+
+def _parent_book_id(page):
+    """Pk of the BlogIndexPage that is the direct parent of `page`, if any."""
+    return (
+        BlogIndexPage.objects.filter(path=page.path[:-Page.steplen])
+        .values_list("pk", flat=True)
+        .first()
+    )
+
+
+def refresh_page(page):
+    """Recompute the counters of a single BlogPage."""
+    image_ids = [img.pk for img in page.get_images()]
+    tagged = _tagged_ids(image_ids)
+    StudyCardPageStats.objects.update_or_create(
+        page_id=page.pk,
+        defaults={
+            "book_id": _parent_book_id(page),
+            "image_ids": image_ids,
+            "total_images": len(image_ids),
+            "imprimible_images": sum(1 for pk in image_ids if pk in tagged),
+        },
+    )
+
+
+def refresh_image(image_id):
+    """
+    Recompute the imprimible counter of every page showing `image_id`
+    (after its tags changed).
+    """
+    rows = list(StudyCardPageStats.objects.filter(image_ids__contains=[image_id]))
+    if not rows:
+        return
+    tagged = _tagged_ids({pk for row in rows for pk in row.image_ids})
+    for row in rows:
+        row.imprimible_images = sum(1 for pk in row.image_ids if pk in tagged)
+    StudyCardPageStats.objects.bulk_update(rows, ["imprimible_images"])
+
+
+def rebuild_all():
+    """
+    Recompute the counters of every live BlogPage.
+
+    Returns:
+        int: number of pages processed
+    """
+    pages = list(BlogPage.objects.live().order_by("path"))
+    book_paths = dict(BlogIndexPage.objects.values_list("path", "pk"))
+    images = {page.pk: [img.pk for img in page.get_images()] for page in pages}
+    tagged = _tagged_ids({pk for ids in images.values() for pk in ids})
+
+    rows = [
+        StudyCardPageStats(
+            page_id=page.pk,
+            book_id=book_paths.get(page.path[:-Page.steplen]),
+            image_ids=images[page.pk],
+            total_images=len(images[page.pk]),
+            imprimible_images=sum(1 for pk in images[page.pk] if pk in tagged),
+        )
+        for page in pages
+    ]
+    StudyCardPageStats.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=["page"],
+        update_fields=["book", "image_ids", "total_images", "imprimible_images", "updated_at"],
+    )
+    return len(rows)
+
+
+def ensure_built():
+    """Build the counters if they have never been built."""
+    if not StudyCardPageStats.objects.exists():
+        rebuild_all()
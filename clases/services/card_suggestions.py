@@ -2,116 +2,145 @@
 Study Card suggestion engine.
 
 Analyzes pickup history and suggests next cards for students.
+
+Works at group level: all pickups of the group are loaded in one query and
+the chapter/image ordinals of the books involved come from the code registry
+(`StudyCardCode`) in another, so the suggestions of every student are
+computed in memory with a constant number of queries.
 """
 from collections import defaultdict
 
-from cms.models import BlogPage
+from wagtail.images import get_image_model
 
 
-def get_suggestions_for_group(group, max_per_student=3):
+def _book_maps(chapter_ids):
     """
-    For each student in the group with pickups, suggest next sequential images.
+    Ordinal maps of every book containing one of `chapter_ids`.
 
     Returns:
-        dict: {user: [(image, blog_page, code, reason), ...]}
+        tuple: ({chapter_id: [StudyCardCode, ...]},
+                {(book_id, chapter_num): [StudyCardCode, ...]}), both ordered by position
     """
-    from clases.models import Enrollment, StudyCardPickup, StudyCardItem
-    from clases.services.card_codes import generate_code, find_book_index_page
+    from clases.models import StudyCardCode
+
+    book_ids = StudyCardCode.objects.filter(chapter_id__in=chapter_ids).values("book_id")
+    entries = (
+        StudyCardCode.objects.filter(book_id__in=book_ids)
+        .select_related("chapter")
+        .order_by("book_id", "chapter_num", "position")
+    )
+
+    by_chapter = defaultdict(list)
+    by_ordinal = {}
+    for entry in entries:
+        by_chapter[entry.chapter_id].append(entry)
+        by_ordinal[(entry.book_id, entry.chapter_num)] = by_chapter[entry.chapter_id]
+    return by_chapter, by_ordinal
+
+
+def _suggest_for_student(pickups, by_chapter, by_ordinal, max_per_student):
+    """Next-card suggestions for one student's pickups (newest first)."""
+    suggestions = []
+    seen_codes = set()
+
+    def push(entry, reason):
+        if entry.code in seen_codes:
+            return
+        suggestions.append({
+            "image_id": entry.image_id,
+            "source_page": entry.chapter,
+            "code": entry.code,
+            "reason": reason,
+        })
+        seen_codes.add(entry.code)
+
+    # Group pickups by book, keeping the most recent first
+    book_pickups = defaultdict(list)
+    for pickup in pickups:
+        chapter_entries = by_chapter.get(pickup["source_page_id"])
+        if chapter_entries:
+            book_pickups[chapter_entries[0].book_id].append(pickup)
+
+    # For each book, find next sequential images
+    for book_id, book_picks in book_pickups.items():
+        if len(suggestions) >= max_per_student:
+            break
+
+        # Find the latest chapter and image index from pickups
+        latest_pickup = book_picks[0]
+        try:
+            last_img_idx = int(latest_pickup["code"].split("-")[-1])
+        except ValueError:
+            continue
 
-    students = Enrollment.objects.filter(group=group, is_active=True).select_related("user")
-    suggestions = {}
+        current = by_chapter[latest_pickup["source_page_id"]]
 
-    for enrollment in students:
-        student = enrollment.user
-        # Get all pickups for this student in this group's batches
-        pickups = (
-            StudyCardPickup.objects.filter(
-                student=student,
-                card_item__batch__group=group,
-            )
-            .select_related("card_item", "card_item__image", "card_item__source_page")
-            .order_by("-picked_up_at")
-        )
+        # Suggest next images in same chapter
+        for entry in current[last_img_idx:]:
+            if len(suggestions) >= max_per_student:
+                break
+            push(entry, f"Siguiente en {entry.chapter.title}")
 
-        if not pickups.exists():
-            continue
+        # If chapter exhausted, suggest next chapter
+        if len(suggestions) < max_per_student and last_img_idx >= len(current):
+            next_chapter = by_ordinal.get((book_id, current[0].chapter_num + 1))
+            if next_chapter:
+                entry = next_chapter[0]
+                push(entry, f"Siguiente capítulo: {entry.chapter.title}")
 
-        student_suggestions = []
-        seen_codes = set()
-
-        # Group pickups by book (source_page's parent BlogIndexPage)
-        book_pickups = defaultdict(list)
-        for pickup in pickups:
-            source_page = pickup.card_item.source_page
-            if source_page:
-                page = source_page.specific
-                book = find_book_index_page(page)
-                if book:
-                    book_pickups[book.pk].append(pickup)
-
-        # For each book, find next sequential images
-        for book_pk, book_picks in book_pickups.items():
-            if len(student_suggestions) >= max_per_student:
-                break
+    return suggestions
 
-            # Find the latest chapter and image index from pickups
-            latest_pickup = book_picks[0]  # Already ordered by -picked_up_at
-            source_page = latest_pickup.card_item.source_page.specific
-            code_parts = latest_pickup.card_item.code.split("-")
-
-            if len(code_parts) >= 3:
-                try:
-                    last_img_idx = int(code_parts[-1])
-                except ValueError:
-                    continue
-
-                # Get all images for this chapter
-                images = source_page.get_images()
-
-                # Suggest next images in same chapter
-                for next_idx in range(last_img_idx + 1, len(images) + 1):
-                    if len(student_suggestions) >= max_per_student:
-                        break
-                    if next_idx <= len(images):
-                        next_code = generate_code(source_page, next_idx)
-                        if next_code not in seen_codes:
-                            student_suggestions.append({
-                                "image": images[next_idx - 1],
-                                "source_page": source_page,
-                                "code": next_code,
-                                "reason": f"Siguiente en {source_page.title}",
-                            })
-                            seen_codes.add(next_code)
-
-                # If chapter exhausted, suggest next chapter
-                if len(student_suggestions) < max_per_student and last_img_idx >= len(images):
-                    siblings = (
-                        source_page.get_parent()
-                        .get_children()
-                        .type(BlogPage)
-                        .order_by("path")
-                    )
-                    found_current = False
-                    for sibling in siblings:
-                        if sibling.pk == source_page.pk:
-                            found_current = True
-                            continue
-                        if found_current:
-                            next_page = sibling.specific
-                            next_images = next_page.get_images()
-                            if next_images:
-                                next_code = generate_code(next_page, 1)
-                                if next_code not in seen_codes:
-                                    student_suggestions.append({
-                                        "image": next_images[0],
-                                        "source_page": next_page,
-                                        "code": next_code,
-                                        "reason": f"Siguiente capítulo: {next_page.title}",
-                                    })
-                                    seen_codes.add(next_code)
-                            break
 
+def get_suggestions_for_group(group, max_per_student=3):
+    """
+    For each student in the group with pickups, suggest next sequential images.
+
+    Returns:
+        dict: {user: [{"image", "source_page", "code", "reason"}, ...]}
+    """
+    from clases.models import Enrollment, StudyCardPickup
+    from clases.services import card_registry
+
+    students = [
+        enrollment.user
+        for enrollment in Enrollment.objects.filter(group=group, is_active=True).select_related("user")
+    ]
+
+    pickups_by_student = defaultdict(list)
+    pickups = (
+        StudyCardPickup.objects.filter(
+            card_item__batch__group=group,
+            student__in=[student.pk for student in students],
+        )
+        .order_by("-picked_up_at", "-id")
+        .values("student_id", "card_item__code", "card_item__source_page_id")
+    )
+    for pickup in pickups:
+        pickups_by_student[pickup["student_id"]].append({
+            "code": pickup["card_item__code"],
+            "source_page_id": pickup["card_item__source_page_id"],
+        })
+    if not pickups_by_student:
+        return {}
+
+    card_registry.ensure_built()
+    chapter_ids = {p["source_page_id"] for picks in pickups_by_student.values() for p in picks}
+    by_chapter, by_ordinal = _book_maps(chapter_ids)
+
+    suggestions = {}
+    for student in students:
+        picks = pickups_by_student.get(student.pk)
+        if not picks:
+            continue
+        student_suggestions = _suggest_for_student(picks, by_chapter, by_ordinal, max_per_student)
         if student_suggestions:
             suggestions[student] = student_suggestions
 
+    # Images (and their renditions for the thumbnails) in one go
+    image_ids = {s["image_id"] for items in suggestions.values() for s in items}
+    images = get_image_model().objects.prefetch_renditions().in_bulk(image_ids) if image_ids else {}
+    for items in suggestions.values():
+        for sug in items:
+            sug["image"] = images.get(sug.pop("image_id"))
+
     return suggestions
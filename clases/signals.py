@@ -0,0 +1,87 @@
+"""
+Señales: mantener el registro de códigos de tarjetas (`StudyCardCode`) y los
+contadores de imágenes (`StudyCardPageStats`) al día cuando se publican,
+despublican, mueven, reordenan o borran libros y capítulos, e invalidar las
+posiciones de capítulo cacheadas por `card_codes`.
+
+La reconstrucción se hace al confirmar la transacción, cuando el árbol de
+páginas ya está en su estado final.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from wagtail.models import Page
+from wagtail.signals import page_published, page_unpublished, post_page_move
+
+from cms.models import BlogIndexPage, BlogPage
+
+from .services.card_codes import invalidate_chapter_positions
+
+
+def _is_card_page(page):
+    return isinstance(page.specific_deferred, (BlogIndexPage, BlogPage))
+
+
+def _refresh_on_commit(page_id):
+    def refresh():
+        from .services import card_registry, card_stats
+
+        page = Page.objects.filter(pk=page_id).first()
+        if page is None:
+            return
+        card_registry.refresh_for_page(page)
+        if isinstance(page.specific, BlogPage):
+            card_stats.refresh_page(page.specific)
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=BlogPage, dispatch_uid="clases_chapter_positions_saved")
+def on_chapter_saved(sender, instance, **kwargs):
+    if instance.path:
+        invalidate_chapter_positions(instance.path[: -Page.steplen])
+
+
+@receiver(page_published, dispatch_uid="clases_card_codes_published")
+def on_page_published(sender, instance, **kwargs):
+    if _is_card_page(instance):
+        _refresh_on_commit(instance.pk)
+
+
+@receiver(page_unpublished, dispatch_uid="clases_card_codes_unpublished")
+def on_page_unpublished(sender, instance, **kwargs):
+    if _is_card_page(instance):
+        _refresh_on_commit(instance.pk)
+
+
+@receiver(post_page_move, dispatch_uid="clases_card_codes_moved")
+def on_page_moved(sender, instance, parent_page_before, parent_page_after, **kwargs):
+    # Mover dentro del mismo padre es reordenar: cambian los números de capítulo
+    if not _is_card_page(instance):
+        return
+    if isinstance(instance.specific_deferred, BlogPage):
+        invalidate_chapter_positions(parent_page_before.path)
+        invalidate_chapter_positions(parent_page_after.path)
+    _refresh_on_commit(instance.pk)
+    if parent_page_before.pk != parent_page_after.pk and isinstance(
+        parent_page_before.specific_deferred, BlogIndexPage
+    ):
+        _refresh_on_commit(parent_page_before.pk)
+
+
+@receiver(post_delete, sender=BlogPage, dispatch_uid="clases_card_codes_chapter_deleted")
+def on_chapter_deleted(sender, instance, **kwargs):
+    # Los capítulos siguientes se renumeran; el padre se localiza por el path
+    parent_path = instance.path[: -Page.steplen]
+    invalidate_chapter_positions(parent_path)
+    parent_id = Page.objects.filter(path=parent_path).values_list("pk", flat=True).first()
+    if parent_id is None:
+        return
+
+    def refresh():
+        from .services import card_registry
+
+        card_registry.refresh_book_by_id(parent_id)
+
+    transaction.on_commit(refresh)
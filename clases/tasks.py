@@ -0,0 +1,23 @@
+"""
+Huey tasks for the clases app.
+"""
+
+import logging
+
+from huey.contrib.djhuey import db_task
+
+logger = logging.getLogger(__name__)
+
+
+@db_task()
+def generate_study_card_pdf(kind: str, object_id: int, duplicate: bool, page_format: str, digest: str):
+    """Genera el PDF de tarjetas de un libro o página y lo guarda en el storage."""
+    from clases.services import card_pdf_jobs
+
+    try:
+        path = card_pdf_jobs.build_pdf(kind, object_id, duplicate, page_format, digest)
+    except Exception as exc:
+        logger.exception("Error generando el PDF de tarjetas %s %s", kind, object_id)
+        card_pdf_jobs.mark_error(digest, str(exc) or exc.__class__.__name__)
+        return
+    logger.info("PDF de tarjetas %s %s guardado en %s", kind, object_id, path)
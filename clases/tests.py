@@ -1,3 +1,5 @@
+import json
+
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
@@ -145,3 +147,571 @@ class LibraryAdditionReproductionTest(TestCase):
             object_id=self.document.id
         ).exists()
         self.assertTrue(is_in_group_library, "Item should be in group library")
+
+
+class StudyCardBooksMixin:
+    """Dos libros con capítulos e imágenes para las pruebas de tarjetas."""
+
+    def setUp(self):
+        from wagtail.images.models import Image
+        from wagtail.images.tests.utils import get_test_image_file
+        from wagtail.models import Collection, Page
+        from cms.models import BlogIndexPage, BlogPage
+
+        if not Collection.objects.exists():
+            Collection.add_root(name="Root")
+        root = Page.objects.filter(depth=1).first()
+
+        self.book = BlogIndexPage(title="Libreta Musical", slug="libreta-musical-codes")
+        root.add_child(instance=self.book)
+        self.other_book = BlogIndexPage(title="Lenguaje Musical", slug="lenguaje-musical-codes")
+        root.add_child(instance=self.other_book)
+
+        self.images = [
+            Image.objects.create(title=f"Figura {i}", file=get_test_image_file())
+            for i in range(3)
+        ]
+
+        def chapter(book, title, images):
+            body = "".join(
+                f'<embed alt="" embedtype="image" format="fullwidth" id="{img.pk}"/>'
+                for img in images
+            )
+            page = BlogPage(title=title, slug=f"{book.slug}-{title.lower().replace(' ', '-')}",
+                            date="2026-01-01", intro="intro", body=body)
+            book.add_child(instance=page)
+            return page
+
+        self.ch1 = chapter(self.book, "Capítulo 1", self.images[:2])
+        self.ch2 = chapter(self.book, "Capítulo 2", self.images[2:])
+        self.other_ch = chapter(self.other_book, "Tema 1", self.images[:1])
+
+
+class StudyCardCodeRegistryTest(StudyCardBooksMixin, TestCase):
+
+    def test_registry_matches_generated_codes(self):
+        from clases.models import StudyCardCode
+        from clases.services import card_registry
+        from clases.services.card_codes import generate_codes_for_page
+        from cms.models import BlogIndexPage
+
+        card_registry.rebuild_all()
+
+        all_books = list(BlogIndexPage.objects.live())
+        expected = set()
+        for ch in (self.ch1, self.ch2, self.other_ch):
+            expected |= {(code, img.pk) for img, code in generate_codes_for_page(ch, all_books=all_books)}
+        stored = set(StudyCardCode.objects.values_list("code", "image_id"))
+        self.assertEqual(stored, expected)
+        # Colisión de abreviaturas resuelta: "LM" se desambigua en ambos libros
+        self.assertEqual(len({code.split("-")[0] for code, _ in stored}), 2)
+
+    def test_lookup_is_a_single_query(self):
+        from clases.models import StudyCardCode
+        from clases.services import card_registry
+
+        card_registry.rebuild_all()
+        code = StudyCardCode.objects.get(chapter_id=self.ch2.pk).code
+
+        with self.assertNumQueries(1):
+            entry = card_registry.lookup(code)
+            self.assertEqual(entry.image_id, self.images[2].pk)
+            self.assertEqual(entry.book.pk, self.book.pk)
+            self.assertEqual(entry.chapter_num, 2)
+
+    def test_reordering_chapters_updates_codes(self):
+        from clases.models import StudyCardCode
+        from clases.services import card_registry
+
+        card_registry.rebuild_all()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ch2.move(self.ch1, pos="left")
+
+        entry = StudyCardCode.objects.get(chapter_id=self.ch2.pk)
+        self.assertEqual((entry.chapter_num, entry.position), (1, 1))
+        self.assertEqual(
+            list(StudyCardCode.objects.filter(chapter_id=self.ch1.pk).values_list("chapter_num", flat=True)),
+            [2, 2],
+        )
+
+    def test_add_pickup_resolves_code_from_registry(self):
+        from datetime import date
+        from django.urls import reverse
+        from clases.models import StudyCardCode, StudyCardPickup, Subject
+        from clases.services import card_registry
+
+        teacher = User.objects.create_user(email="cards@example.com", password="x", is_staff=True)
+        student = User.objects.create_user(email="alumno-cards@example.com", password="x")
+        subject = Subject.objects.create(name="Música", code="MUS-CARDS")
+        group = Group.objects.create(name="1A", subject=subject)
+        Enrollment.objects.create(user=student, group=group)
+
+        card_registry.rebuild_all()
+        code = StudyCardCode.objects.get(chapter_id=self.other_ch.pk).code
+
+        self.client.force_login(teacher)
+        response = self.client.post(
+            reverse("clases:study_cards_add_pickup", args=[group.pk]),
+            {"student_id": student.pk, "code": code.lower(), "date": date.today().isoformat()},
+        )
+        self.assertEqual(response.status_code, 200)
+        pickup = StudyCardPickup.objects.get(student=student)
+        self.assertEqual(pickup.card_item.code, code)
+        self.assertEqual(pickup.card_item.source_page_id, self.other_ch.pk)
+
+
+class RegisterPickupsTest(StudyCardBooksMixin, TestCase):
+    def setUp(self):
+        from clases.models import Subject
+        from clases.services import card_registry
+
+        super().setUp()
+        self.teacher = User.objects.create_user(email="bulk-cards@example.com", password="x", is_staff=True)
+        subject = Subject.objects.create(name="Música", code="MUS-BULK")
+        self.group = Group.objects.create(name="2B", subject=subject)
+        self.students = [
+            User.objects.create_user(email=f"alumno{i}-bulk@example.com", password="x")
+            for i in range(3)
+        ]
+        for student in self.students[:2]:
+            Enrollment.objects.create(user=student, group=self.group)
+        card_registry.rebuild_all()
+
+    def _code(self, chapter, position=1):
+        from clases.models import StudyCardCode
+
+        return StudyCardCode.objects.get(chapter_id=chapter.pk, position=position).code
+
+    def test_report_per_row_and_no_duplicates(self):
+        from clases.models import StudyCardBatch, StudyCardPickup
+        from clases.services.card_pickups import register_pickups
+
+        code1, code2 = self._code(self.ch1), self._code(self.ch2)
+        entries = [
+            {"student_id": self.students[0].pk, "codes": [code1, code2.lower(), "XX-9-99"]},
+            {"student_id": self.students[1].pk, "codes": [code1, code1]},
+            {"student_id": self.students[2].pk, "codes": [code1]},
+        ]
+        report = register_pickups(self.group, entries, picked_up_at="2026-03-01", user=self.teacher)
+
+        self.assertEqual(report["created"], 3)
+        self.assertEqual(
+            [row["status"] for row in report["rows"]],
+            ["created", "created", "unknown_code", "created", "not_enrolled"],
+        )
+        self.assertEqual(StudyCardPickup.objects.filter(card_item__batch__group=self.group).count(), 3)
+        batch = StudyCardBatch.objects.get(group=self.group)
+        self.assertEqual(batch.created_by, self.teacher)
+
+        # Repetir la misma hoja no duplica recogidas
+        report = register_pickups(self.group, entries, picked_up_at="2026-03-01", user=self.teacher)
+        self.assertEqual((report["created"], report["duplicates"]), (0, 3))
+
+    def test_query_count_does_not_grow_with_students(self):
+        from clases.services.card_pickups import register_pickups
+
+        codes = [self._code(self.ch1), self._code(self.ch1, 2), self._code(self.other_ch)]
+        entries = [{"student_id": s.pk, "codes": codes} for s in self.students[:2]]
+        # savepoint, matrículas, items, registro (existe + códigos), lotes (select + insert),
+        # items (insert), recogidas existentes, insert recogidas, release
+        with self.assertNumQueries(11):
+            report = register_pickups(self.group, entries, picked_up_at="2026-03-01", user=self.teacher)
+        self.assertEqual(report["created"], 6)
+
+    def test_dry_run_saves_nothing(self):
+        from clases.models import StudyCardItem, StudyCardPickup
+        from clases.services.card_pickups import register_pickups
+
+        entries = [{"student_id": self.students[0].pk, "codes": [self._code(self.ch1)]}]
+        report = register_pickups(self.group, entries, picked_up_at="2026-03-01", dry_run=True)
+        self.assertEqual(report["created"], 1)
+        self.assertFalse(StudyCardPickup.objects.exists())
+        self.assertFalse(StudyCardItem.objects.exists())
+
+
+class ChapterPositionsTest(StudyCardBooksMixin, TestCase):
+    def test_find_book_index_page_is_one_query(self):
+        from clases.services.card_codes import find_book_index_page
+
+        with self.assertNumQueries(1):
+            self.assertEqual(find_book_index_page(self.ch2).pk, self.book.pk)
+
+    def test_positions_are_cached_until_chapters_move(self):
+        from clases.services.card_codes import generate_codes_for_page
+
+        ch2 = self.ch2.specific
+        self.assertEqual(generate_codes_for_page(ch2, book=self.book)[0][1], "LM-2-01")
+        with self.assertNumQueries(0):
+            self.assertEqual(generate_codes_for_page(ch2, book=self.book)[0][1], "LM-2-01")
+
+        self.ch2.move(self.ch1, pos="left")
+        ch2.refresh_from_db()
+        self.assertEqual(generate_codes_for_page(ch2, book=self.book)[0][1], "LM-1-01")
+
+    def test_tag_filter_is_one_query_per_chapter(self):
+        from clases.services.card_codes import generate_codes_for_page
+
+        self.images[1].tags.add("imprimible")
+        ch1 = self.ch1.specific
+        ch1.get_images()
+        generate_codes_for_page(ch1, book=self.book)
+        with self.assertNumQueries(1):
+            codes = generate_codes_for_page(ch1, book=self.book, tag="imprimible")
+        self.assertEqual([img.pk for img, _ in codes], [self.images[1].pk])
+
+    def test_book_browser_marks_imprimible_images(self):
+        from django.urls import reverse
+
+        self.images[0].tags.add("imprimible")
+        teacher = User.objects.create_user(email="browser@example.com", password="x", is_staff=True)
+        self.client.force_login(teacher)
+        response = self.client.get(reverse("clases:study_cards_book", args=[self.book.pk]))
+        self.assertEqual(response.status_code, 200)
+        flags = [
+            (item["image"].pk, item["is_imprimible"])
+            for chapter in response.context["chapters"]
+            for item in chapter["images"]
+        ]
+        self.assertEqual(flags, [(self.images[0].pk, True), (self.images[1].pk, False), (self.images[2].pk, False)])
+
+
+class CardSuggestionsTest(StudyCardBooksMixin, TestCase):
+    def setUp(self):
+        from clases.models import Subject
+        from clases.services import card_registry
+
+        super().setUp()
+        subject = Subject.objects.create(name="Música", code="MUS-SUG")
+        self.group = Group.objects.create(name="3C", subject=subject)
+        self.teacher = User.objects.create_user(email="sug-teacher@example.com", password="x", is_staff=True)
+        card_registry.rebuild_all()
+
+    def _student_with_pickups(self, index, codes):
+        from clases.services.card_pickups import register_pickups
+
+        student = User.objects.create_user(email=f"sug{index}@example.com", password="x")
+        Enrollment.objects.create(user=student, group=self.group)
+        register_pickups(
+            self.group, [{"student_id": student.pk, "codes": codes}], picked_up_at="2026-03-01", user=self.teacher
+        )
+        return student
+
+    def _code(self, chapter, position=1):
+        from clases.models import StudyCardCode
+
+        return StudyCardCode.objects.get(chapter_id=chapter.pk, position=position).code
+
+    def test_next_image_then_next_chapter(self):
+        from clases.services.card_suggestions import get_suggestions_for_group
+
+        first = self._student_with_pickups(0, [self._code(self.ch1)])
+        last = self._student_with_pickups(1, [self._code(self.ch1, 2)])
+
+        suggestions = get_suggestions_for_group(self.group)
+        self.assertEqual([s["code"] for s in suggestions[first]], [self._code(self.ch1, 2)])
+        self.assertEqual(suggestions[first][0]["image"].pk, self.images[1].pk)
+        self.assertEqual(
+            [(s["code"], s["reason"]) for s in suggestions[last]],
+            [(self._code(self.ch2), "Siguiente capítulo: Capítulo 2")],
+        )
+
+    def test_query_count_is_constant_for_group_size(self):
+        from clases.services.card_suggestions import get_suggestions_for_group
+
+        self._student_with_pickups(0, [self._code(self.ch1)])
+        with self.assertNumQueries(6) as ctx:
+            get_suggestions_for_group(self.group)
+
+        for i in range(1, 6):
+            self._student_with_pickups(i, [self._code(self.ch1, 2), self._code(self.other_ch)])
+        with self.assertNumQueries(len(ctx.captured_queries)):
+            suggestions = get_suggestions_for_group(self.group)
+        self.assertEqual(len(suggestions), 6)
+
+    def test_group_tracking_renders_suggestions(self):
+        from django.urls import reverse
+
+        self._student_with_pickups(0, [self._code(self.ch1)])
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse("clases:study_cards_group_tracking", args=[self.group.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self._code(self.ch1, 2))
+
+
+class CardStatsTest(StudyCardBooksMixin, TestCase):
+    def setUp(self):
+        from clases.services import card_stats
+
+        super().setUp()
+        self.teacher = User.objects.create_user(email="stats@example.com", password="x", is_staff=True)
+        self.client.force_login(self.teacher)
+        card_stats.rebuild_all()
+
+    def _books(self):
+        from django.urls import reverse
+
+        response = self.client.get(reverse("clases:study_cards_dashboard"))
+        self.assertEqual(response.status_code, 200)
+        return {
+            item["book"].pk: (item["chapters"], item["total"], item["imprimible"])
+            for item in response.context["books"]
+        }
+
+    def test_dashboard_reads_stored_counters(self):
+        self.assertEqual(
+            self._books(),
+            {self.book.pk: (2, 3, 0), self.other_book.pk: (1, 1, 0)},
+        )
+
+    def test_toggle_tag_updates_every_page_showing_the_image(self):
+        from django.urls import reverse
+
+        # images[0] aparece en el capítulo 1 de ambos libros
+        self.client.post(reverse("clases:study_cards_toggle_tag", args=[self.images[0].pk]))
+        self.assertEqual(
+            self._books(),
+            {self.book.pk: (2, 3, 1), self.other_book.pk: (1, 1, 1)},
+        )
+        self.client.post(reverse("clases:study_cards_toggle_tag", args=[self.images[0].pk]))
+        self.assertEqual(self._books()[self.other_book.pk], (1, 1, 0))
+
+    def test_publishing_a_chapter_refreshes_its_counters(self):
+        chapter = self.ch2.specific
+        chapter.body = ""
+        with self.captureOnCommitCallbacks(execute=True):
+            chapter.save_revision().publish()
+        self.assertEqual(self._books()[self.book.pk], (2, 2, 0))
+
+    def test_dashboard_query_count_does_not_depend_on_images(self):
+        from django.urls import reverse
+        from wagtail.images.models import Image
+        from wagtail.images.tests.utils import get_test_image_file
+        from clases.services import card_stats
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from cms.models import BlogPage
+
+        self.client.get(reverse("clases:study_cards_dashboard"))  # calienta cachés (Site, etc.)
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(reverse("clases:study_cards_dashboard"))
+
+        extra = Image.objects.create(title="Extra", file=get_test_image_file())
+        page = BlogPage(title="Suelta", slug="suelta-stats", date="2026-01-01", intro="intro",
+                        body=f'<embed alt="" embedtype="image" format="fullwidth" id="{extra.pk}"/>')
+        self.book.get_parent().add_child(instance=page)
+        card_stats.rebuild_all()
+
+        with self.assertNumQueries(len(before.captured_queries)):
+            response = self.client.get(reverse("clases:study_cards_dashboard"))
+        self.assertEqual([item["page"].pk for item in response.context["pages"]], [page.pk])
+
+
+class CardPdfJobTest(StudyCardBooksMixin, TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        super().setUp()
+        self.images[0].tags.add("imprimible")
+        self.teacher = User.objects.create_user(email="pdf@example.com", password="x", is_staff=True)
+        self.client.force_login(self.teacher)
+
+    def test_pdf_is_generated_in_background_and_reused(self):
+        from unittest import mock
+        from django.urls import reverse
+        from clases.tasks import generate_study_card_pdf
+
+        url = reverse("clases:study_cards_generate_pdf", args=[self.book.pk])
+        with (
+            mock.patch("clases.views_study_cards.generate_study_card_pdf") as task,
+            mock.patch("clases.services.card_pdf_jobs.cache_is_shared", return_value=True),
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, {"page_format": "a5"})
+            self.assertEqual(response.status_code, 200)
+            self.assertTemplateUsed(response, "clases/study_cards/pdf_job.html")
+            task.assert_called_once()
+
+            # Una segunda petición mientras se genera no encola otra tarea
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, {"page_format": "a5"})
+            task.assert_called_once()
+
+        args = task.call_args.args
+        digest = args[-1]
+        generate_study_card_pdf.call_local(*args)
+
+        status = self.client.get(reverse("clases:study_cards_pdf_status", args=[digest]))
+        self.assertContains(status, reverse("clases:study_cards_pdf_download", args=[digest]))
+
+        # Mismo contenido y opciones: se sirve el PDF guardado directamente
+        response = self.client.post(url, {"page_format": "a5"})
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+    def test_pending_job_is_enqueued_again_without_a_shared_cache(self):
+        from unittest import mock
+        from django.urls import reverse
+
+        url = reverse("clases:study_cards_generate_pdf", args=[self.book.pk])
+        with (
+            mock.patch("clases.views_study_cards.generate_study_card_pdf") as task,
+            mock.patch("clases.services.card_pdf_jobs.cache_is_shared", return_value=False),
+        ):
+            for _ in range(2):
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(url, {"page_format": "a5"})
+                self.assertTemplateUsed(response, "clases/study_cards/pdf_job.html")
+        # El consumidor no puede avisar de un error: cada petición vuelve a encolar
+        self.assertEqual(task.call_count, 2)
+
+    def test_pdf_is_stored_under_the_digest_of_the_rendered_content(self):
+        from django.core.files.storage import default_storage
+        from clases.models import StudyCardLabel
+        from clases.services import card_pdf_jobs
+
+        items, fill = card_pdf_jobs.book_items(self.book)
+        requested = card_pdf_jobs.pdf_digest(items, fill, False, "a5")
+        card_pdf_jobs.mark_pending(requested)
+
+        # La página cambia entre encolar la tarea y ejecutarla
+        StudyCardLabel.objects.create(image=self.images[0], source_page=self.ch1, description="Clave de sol")
+        path = card_pdf_jobs.build_pdf("book", self.book.pk, False, "a5", requested)
+
+        items, fill = card_pdf_jobs.book_items(self.book)
+        self.assertEqual(path, card_pdf_jobs.storage_path(card_pdf_jobs.pdf_digest(items, fill, False, "a5")))
+        self.assertFalse(default_storage.exists(card_pdf_jobs.storage_path(requested)))
+        self.assertEqual(card_pdf_jobs.get_status(requested), (card_pdf_jobs.MISSING, ""))
+
+    def test_digest_changes_with_layout_and_descriptions(self):
+        from clases.models import StudyCardLabel
+        from clases.services import card_pdf_jobs
+
+        items, fill = card_pdf_jobs.book_items(self.book)
+        a5 = card_pdf_jobs.pdf_digest(items, fill, False, "a5")
+        self.assertNotEqual(a5, card_pdf_jobs.pdf_digest(items, fill, False, "a4"))
+
+        StudyCardLabel.objects.create(image=self.images[0], source_page=self.ch1, description="Clave de sol")
+        items, fill = card_pdf_jobs.book_items(self.book)
+        self.assertNotEqual(a5, card_pdf_jobs.pdf_digest(items, fill, False, "a5"))
+
+
+class CardOcrCacheTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+
+    def test_same_photo_reuses_cached_ocr(self):
+        from unittest import mock
+        from django.test import override_settings
+        from clases.services import card_ocr
+        from martina_bescos_app.utils import llm_cache
+
+        response = mock.Mock(text='[{"student_name": "Ana", "codes": ["mjg-1-03"], "confidence": 0.9}]')
+        with override_settings(GEMINI_API_KEY="test"), mock.patch.object(card_ocr, "genai") as genai:
+            genai.Client.return_value.models.generate_content.return_value = response
+            first = card_ocr.ocr_registration_sheet(b"foto", "image/jpeg", ["Ana"])
+            second = card_ocr.ocr_registration_sheet(b"foto", "image/jpeg", ["Ana"])
+            card_ocr.ocr_registration_sheet(b"otra foto", "image/jpeg", ["Ana"])
+
+        self.assertEqual(first, ([{"student_name": "Ana", "codes": ["MJG-1-03"], "confidence": 0.9}], None))
+        self.assertEqual(second, first)
+        self.assertEqual(genai.Client.return_value.models.generate_content.call_count, 2)
+        self.assertEqual(llm_cache.stats()["card_ocr"], {"hit": 1, "miss": 2})
+
+
+class ClassSessionPresentTest(TestCase):
+    def setUp(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from wagtail.models import Collection
+        from clases.models import ClassSession, Subject
+
+        if not Collection.objects.exists():
+            Collection.add_root(name="Root")
+        User = get_user_model()
+        self.teacher = User.objects.create_user(email="present@example.com", password="x", is_staff=True)
+        group = Group.objects.create(
+            name="2º ESO B", subject=Subject.objects.create(name="Música"), academic_year="2025-2026"
+        )
+        group.teachers.add(self.teacher)
+        self.session = ClassSession.objects.create(
+            teacher=self.teacher, group=group, date="2026-01-10", title="Clase"
+        )
+        self.doc_ct = ContentType.objects.get_for_model(Document)
+        self.docs = [
+            Document.objects.create(title=f"Partitura {i}", file=SimpleUploadedFile(f"p{i}.pdf", b"%PDF-1.4"))
+            for i in range(10)
+        ]
+        self.client.force_login(self.teacher)
+
+    def _add_items(self, docs, start=0):
+        ClassSessionItem.objects.bulk_create([
+            ClassSessionItem(session=self.session, content_type=self.doc_ct, object_id=doc.pk, order=start + i)
+            for i, doc in enumerate(docs)
+        ])
+
+    def _present(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("clases:class_session_present", args=[self.session.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_playlist_is_resolved_in_bulk(self):
+        self._add_items(self.docs[:2])
+        self._present()  # calentar caché de ContentType
+        _, few = self._present()
+
+        self._add_items(self.docs[2:], start=2)
+        # Un item cuyo documento ya no existe no entra en la playlist
+        ClassSessionItem.objects.create(session=self.session, content_type=self.doc_ct, object_id=999999, order=50)
+        response, many = self._present()
+
+        self.assertEqual(few, many)
+        playlist = json.loads(response.context["playlist_json"])
+        self.assertEqual([p["title"] for p in playlist], [d.title for d in self.docs])
+        self.assertEqual(playlist[0]["type"], "Documento PDF")
+
+    def test_next_item_prefetch_hint(self):
+        from django.urls import reverse
+
+        self._add_items(self.docs[:2])
+        response, _ = self._present()
+        second = self.session.get_items_ordered()[1]
+        self.assertContains(
+            response,
+            f'<link rel="prefetch" href="{reverse("clases:class_session_item_content", args=[self.session.pk, second.pk])}">',
+        )
+        self.assertContains(response, f'<link rel="prefetch" href="{self.docs[1].file.url}">')
+
+    def test_image_prefetch_hint_is_the_viewer_rendition(self):
+        import re
+
+        from django.urls import reverse
+        from wagtail.images.models import Image
+        from wagtail.images.tests.utils import get_test_image_file
+
+        image = Image.objects.create(title="Figura", file=get_test_image_file())
+        self._add_items(self.docs[:1])
+        ClassSessionItem.objects.create(
+            session=self.session, content_type=ContentType.objects.get_for_model(Image), object_id=image.pk, order=1
+        )
+        response, _ = self._present()
+        hint = json.loads(response.context["playlist_json"])[1]["prefetch"]
+
+        second = self.session.get_items_ordered()[1]
+        viewer = self.client.get(reverse("clases:class_session_item_content", args=[self.session.pk, second.pk]))
+        # El visor pinta la misma rendición que se precargó, no el original
+        self.assertEqual(re.findall(r'<img src="([^"]+)"', viewer.content.decode()), [hint])
+        self.assertNotEqual(hint, image.file.url)
@@ -193,6 +193,16 @@ urlpatterns = [
         views_study_cards.generate_pdf_page,
         name="study_cards_generate_pdf_page",
     ),
+    path(
+        "study-cards/pdf/<str:digest>/status/",
+        views_study_cards.pdf_status,
+        name="study_cards_pdf_status",
+    ),
+    path(
+        "study-cards/pdf/<str:digest>/download/",
+        views_study_cards.pdf_download,
+        name="study_cards_pdf_download",
+    ),
     path(
         "study-cards/group/<int:group_id>/",
         views_study_cards.group_tracking,
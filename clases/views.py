@@ -7,6 +7,11 @@ from django.views.decorators.http import require_http_methods
 from django.contrib.contenttypes.models import ContentType
 import json
 
+from martina_bescos_app.utils.generic_relations import (
+    media_prefetch_url,
+    prefetch_content_objects,
+)
+
 from .models import (
     Group,
     GroupLibraryItem,
@@ -421,11 +426,11 @@ def class_session_close(request, pk):
 
     session.close(reflection_text=reflection_text, audio_file=audio_file)
 
-    # Actualizar cobertura del plan de programación (si existe la app)
+    # Actualizar cobertura del plan de programación (si existe la app), en segundo plano
     try:
-        from programacion.services import update_coverage_for_session
+        from programacion.services import schedule_coverage_for_session
 
-        update_coverage_for_session(session)
+        schedule_coverage_for_session(session)
     except ImportError:
         pass
 
@@ -510,19 +515,18 @@ def class_session_present(request, pk):
 
             raise PermissionDenied("No tienes permiso para ver esta sesión.")
 
-    items = session.get_items_ordered()
-    playlist = []
-    for item in items:
-        if not item.content_object:
-            continue
-        playlist.append(
-            {
-                "pk": item.pk,
-                "title": item.get_content_title(),
-                "icon": item.get_icon(),
-                "type": item.get_content_type_name(),
-            }
-        )
+    # Contenidos de toda la sesión de una vez (una consulta por tipo de contenido)
+    items = prefetch_content_objects(session.get_items_ordered())
+    playlist = [
+        {
+            "pk": item.pk,
+            "title": item.get_content_title(),
+            "icon": item.get_icon(),
+            "type": item.get_content_type_name(),
+            "prefetch": media_prefetch_url(item.content_object),
+        }
+        for item in items
+    ]
 
     return render(
         request,
@@ -530,6 +534,8 @@ def class_session_present(request, pk):
         {
             "session": session,
             "playlist_json": json.dumps(playlist),
+            # El navegador precarga el segundo elemento mientras se muestra el primero
+            "next_item": playlist[1] if len(playlist) > 1 else None,
             "is_teacher": is_teacher and session.teacher == user,
         },
     )
@@ -876,14 +882,26 @@ def class_session_duplicate(request, pk):
     )
 
     # Duplicar todos los items de la sesión original
-    for item in original_session.items.all():
-        ClassSessionItem.objects.create(
-            session=new_session,
-            content_type=item.content_type,
-            object_id=item.object_id,
-            order=item.order,
-            notes=item.notes,
-        )
+    ClassSessionItem.objects.bulk_create(
+        [
+            ClassSessionItem(
+                session=new_session,
+                content_type_id=item.content_type_id,
+                object_id=item.object_id,
+                order=item.order,
+                notes=item.notes,
+            )
+            for item in original_session.items.all()
+        ]
+    )
+
+    # bulk_create no dispara señales: encolar la cobertura de la programación
+    try:
+        from programacion.services import schedule_coverage_for_session
+
+        schedule_coverage_for_session(new_session)
+    except ImportError:
+        pass
 
     messages.success(
         request,
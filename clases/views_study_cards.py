@@ -1,8 +1,13 @@
+import re
 from datetime import date
 
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import HttpResponse
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
 from django.views.decorators.http import require_http_methods
 
 from wagtail.images import get_image_model
@@ -15,30 +20,28 @@ from clases.models import (
     StudyCardLabel,
     StudyCardPickup,
 )
+from clases.services import card_pdf_jobs, card_registry, card_stats
 from clases.services.card_codes import generate_codes_for_page
 from clases.services.card_ocr import ocr_registration_sheet
-from clases.services.card_pdf import generate_cards_pdf, generate_registration_sheet
+from clases.services.card_pickups import register_pickups
+from clases.services.card_pdf import generate_registration_sheet
+from clases.services.card_stats import TAG_IMPRIMIBLE
 from clases.services.card_suggestions import get_suggestions_for_group
+from clases.tasks import generate_study_card_pdf
 from clases.views import is_staff
 from cms.models import BlogIndexPage, BlogPage
 
-TAG_IMPRIMIBLE = "imprimible"
+PDF_DIGEST_RE = re.compile(r"[0-9a-f]{64}")
 
 
-def _has_tag(image, tag_name):
-    return tag_name in {t.name for t in image.tags.all()}
-
-
-def _get_book_stats(book):
-    """Get image stats for a book: total and imprimible counts."""
-    chapters = book.get_children().type(BlogPage).specific().order_by("path")
-    total = 0
-    imprimible = 0
-    for ch in chapters:
-        images = ch.get_images()
-        total += len(images)
-        imprimible += sum(1 for img in images if _has_tag(img, TAG_IMPRIMIBLE))
-    return {"total": total, "imprimible": imprimible, "chapters": len(chapters)}
+def _tagged_image_ids(image_ids, tag_name):
+    """Subset of `image_ids` tagged with `tag_name`, in one query."""
+    if not image_ids:
+        return set()
+    return set(
+        get_image_model().objects.filter(pk__in=image_ids, tags__name=tag_name)
+        .values_list("pk", flat=True)
+    )
 
 
 def _find_item_by_code(code, group):
@@ -50,28 +53,22 @@ def _find_item_by_code(code, group):
     if item:
         return item, None
 
-    # Code not in any batch — find image from CMS and create batch + item
-    all_books = list(BlogIndexPage.objects.live())
-    for book in all_books:
-        chapters = book.get_children().type(BlogPage).specific().order_by("path")
-        for chapter in chapters:
-            codes = generate_codes_for_page(chapter, all_books=all_books)
-            for img, generated_code in codes:
-                if generated_code == code:
-                    # Found it — create auto-batch and item
-                    batch, _ = StudyCardBatch.objects.get_or_create(
-                        group=group,
-                        title=f"Auto — {book.title}",
-                        defaults={"created_by_id": 1},  # Will be overridden
-                    )
-                    item = StudyCardItem.objects.create(
-                        batch=batch,
-                        image=img,
-                        source_page=chapter,
-                        code=code,
-                        position=0,
-                    )
-                    return item, None
+    # Code not in any batch — resolve it in the code registry and create batch + item
+    entry = card_registry.lookup(code)
+    if entry:
+        batch, _ = StudyCardBatch.objects.get_or_create(
+            group=group,
+            title=f"Auto — {entry.book.title}",
+            defaults={"created_by_id": 1},  # Will be overridden
+        )
+        item = StudyCardItem.objects.create(
+            batch=batch,
+            image=entry.image,
+            source_page=entry.chapter,
+            code=entry.code,
+            position=0,
+        )
+        return item, None
 
     return None, f"Código '{code}' no encontrado en ningún libro"
 
@@ -81,39 +78,43 @@ def _find_item_by_code(code, group):
 # =============================================================================
 
 
-def _get_page_stats(page):
-    """Get image stats for a single BlogPage."""
-    images = page.get_images()
-    total = len(images)
-    imprimible = sum(1 for img in images if _has_tag(img, TAG_IMPRIMIBLE))
-    return {"total": total, "imprimible": imprimible}
-
-
 @login_required
 @user_passes_test(is_staff)
 def dashboard(request):
-    books = BlogIndexPage.objects.live().order_by("title")
-    book_data = []
-    book_child_ids = set()
-    for book in books:
-        stats = _get_book_stats(book)
-        if stats["total"] > 0:
-            book_data.append({"book": book, **stats})
-        # Track which pages are already shown as book chapters
-        for ch in book.get_children().type(BlogPage):
-            book_child_ids.add(ch.pk)
+    card_stats.ensure_built()
+
+    # Books: sum of their chapters' stored counters
+    books = (
+        BlogIndexPage.objects.live()
+        .annotate(
+            total=Sum("study_card_chapter_stats__total_images"),
+            imprimible=Sum("study_card_chapter_stats__imprimible_images"),
+            chapters=Count("study_card_chapter_stats"),
+        )
+        .filter(total__gt=0)
+        .order_by("title")
+    )
+    book_data = [
+        {"book": book, "total": book.total, "imprimible": book.imprimible, "chapters": book.chapters}
+        for book in books
+    ]
 
     # Individual BlogPages with images (not already shown as book chapters)
-    # Note: can't pre-filter by body content alone — images may come from
-    # StreamField attachments (get_images includes both body embeds + attachments)
-    all_pages = BlogPage.objects.live().exclude(
-        pk__in=book_child_ids
-    ).order_by("title")
-    page_data = []
-    for page in all_pages:
-        stats = _get_page_stats(page)
-        if stats["total"] > 0:
-            page_data.append({"page": page, **stats})
+    all_pages = (
+        BlogPage.objects.live()
+        .filter(study_card_stats__total_images__gt=0)
+        .exclude(study_card_stats__book__live=True)
+        .annotate(
+            total=F("study_card_stats__total_images"),
+            imprimible=F("study_card_stats__imprimible_images"),
+        )
+        .select_related("featured_image")
+        .order_by("title")
+    )
+    page_data = [
+        {"page": page, "total": page.total, "imprimible": page.imprimible}
+        for page in all_pages
+    ]
 
     # Groups where current user is teacher
     groups = Group.objects.filter(teachers=request.user).order_by("name")
@@ -154,16 +155,23 @@ def book_browser(request, book_id):
         for l in StudyCardLabel.objects.filter(source_page_id__in=chapter_ids)
     }
 
+    codes_by_chapter = [
+        (ch_idx, chapter, generate_codes_for_page(chapter, all_books=all_books, book=book))
+        for ch_idx, chapter in enumerate(chapters, start=1)
+    ]
+    imprimible_ids = _tagged_image_ids(
+        [img.pk for _, _, codes in codes_by_chapter for img, _ in codes], TAG_IMPRIMIBLE
+    )
+
     chapter_data = []
     total_imprimible = 0
 
-    for ch_idx, chapter in enumerate(chapters, start=1):
-        codes = generate_codes_for_page(chapter, all_books=all_books)
+    for ch_idx, chapter, codes in codes_by_chapter:
         if not codes:
             continue
         images_with_tag = []
         for img, code in codes:
-            is_imprimible = _has_tag(img, TAG_IMPRIMIBLE)
+            is_imprimible = img.pk in imprimible_ids
             if is_imprimible:
                 total_imprimible += 1
             images_with_tag.append({
@@ -202,6 +210,7 @@ def toggle_tag(request, image_id):
         is_imprimible = True
         delta = 1
     image.save()
+    card_stats.refresh_image(image.pk)
 
     code = request.POST.get("code", "???")
     book_id = request.POST.get("book_id")
@@ -255,53 +264,89 @@ def save_description(request, image_id):
 @require_http_methods(["POST"])
 def generate_pdf(request, book_id):
     book = get_object_or_404(BlogIndexPage, pk=book_id)
-    chapters = list(book.get_children().type(BlogPage).specific().order_by("path"))
-    all_books = list(BlogIndexPage.objects.live())
-
-    # Pre-load labels for all chapters
-    chapter_ids = [ch.pk for ch in chapters]
-    labels = {
-        (l.image_id, l.source_page_id): l.description
-        for l in StudyCardLabel.objects.filter(source_page_id__in=chapter_ids)
-    }
+    items, fill_items = card_pdf_jobs.book_items(book)
+    return _start_pdf_job(
+        request, "book", book, items, fill_items,
+        back_url=reverse("clases:study_cards_book", args=[book.pk]),
+    )
 
-    all_items = []
-    all_codes_by_chapter = []
-    for chapter in chapters:
-        codes = generate_codes_for_page(chapter, all_books=all_books, tag=TAG_IMPRIMIBLE)
-        # Extend tuples with descriptions: (image, code, description)
-        for img, code in codes:
-            desc = labels.get((img.pk, chapter.pk), "")
-            all_items.append((img, code, desc))
-        # Also collect all images for fill candidates
-        all_codes_by_chapter.append(
-            generate_codes_for_page(chapter, all_books=all_books)
-        )
 
-    if not all_items:
+def _start_pdf_job(request, kind, obj, items, fill_items, back_url):
+    """
+    Serve the stored PDF if it already exists; otherwise enqueue its
+    generation and render a page that polls until it is ready.
+    """
+    if not items:
         return HttpResponse(
             '<div class="alert alert-warning">No hay imágenes marcadas como imprimible.</div>',
             status=200,
         )
 
-    # Build fill candidates: non-imprimible images from the same book (no description)
-    selected_ids = {img.pk for img, _, _ in all_items}
-    fill_items = []
-    for chapter_codes in all_codes_by_chapter:
-        for img, code in chapter_codes:
-            if img.pk not in selected_ids:
-                fill_items.append((img, code))
-
     duplicate = request.POST.get("duplicate") == "on"
     page_format = request.POST.get("page_format", "a5")
-    pdf_bytes = generate_cards_pdf(
-        all_items, fill_items=fill_items, duplicate=duplicate, page_format=page_format,
+    digest = card_pdf_jobs.pdf_digest(items, fill_items, duplicate, page_format)
+    filename = f"tarjetas_{obj.title.replace(' ', '_')[:40]}.pdf"
+
+    status, _ = card_pdf_jobs.get_status(digest)
+    if status == card_pdf_jobs.DONE:
+        return _pdf_file_response(digest, filename)
+
+    if status == card_pdf_jobs.ERROR:
+        card_pdf_jobs.clear_status(digest)
+    if card_pdf_jobs.mark_pending(digest):
+        transaction.on_commit(
+            lambda: generate_study_card_pdf(kind, obj.pk, duplicate, page_format, digest)
+        )
+
+    return render(request, "clases/study_cards/pdf_job.html", {
+        "title": obj.title,
+        "back_url": back_url,
+        "digest": digest,
+        "filename": filename,
+        "status": card_pdf_jobs.PENDING,
+    })
+
+
+def _pdf_file_response(digest, filename):
+    return FileResponse(
+        default_storage.open(card_pdf_jobs.storage_path(digest), "rb"),
+        as_attachment=True,
+        filename=filename,
+        content_type="application/pdf",
     )
 
-    response = HttpResponse(pdf_bytes, content_type="application/pdf")
-    safe_title = book.title.replace(" ", "_")[:40]
-    response["Content-Disposition"] = f'attachment; filename="tarjetas_{safe_title}.pdf"'
-    return response
+
+def _pdf_filename(request):
+    name = request.GET.get("name", "")
+    if not re.fullmatch(r"[\w\-. ]{1,80}\.pdf", name):
+        return "tarjetas.pdf"
+    return name
+
+
+@login_required
+@user_passes_test(is_staff)
+def pdf_status(request, digest):
+    """Polled by the PDF job page until the file is ready."""
+    if not PDF_DIGEST_RE.fullmatch(digest):
+        raise Http404
+    status, error = card_pdf_jobs.get_status(digest)
+    return render(request, "clases/study_cards/partials/pdf_status.html", {
+        "digest": digest,
+        "filename": _pdf_filename(request),
+        "status": status,
+        "error": error,
+    })
+
+
+@login_required
+@user_passes_test(is_staff)
+def pdf_download(request, digest):
+    if not PDF_DIGEST_RE.fullmatch(digest):
+        raise Http404
+    status, _ = card_pdf_jobs.get_status(digest)
+    if status != card_pdf_jobs.DONE:
+        raise Http404
+    return _pdf_file_response(digest, _pdf_filename(request))
 
 
 # =============================================================================
@@ -321,10 +366,11 @@ def page_browser(request, page_id):
     }
 
     codes = generate_codes_for_page(page, all_books=all_books)
+    imprimible_ids = _tagged_image_ids([img.pk for img, _ in codes], TAG_IMPRIMIBLE)
     total_imprimible = 0
     images_data = []
     for img, code in codes:
-        is_imprimible = _has_tag(img, TAG_IMPRIMIBLE)
+        is_imprimible = img.pk in imprimible_ids
         if is_imprimible:
             total_imprimible += 1
         images_data.append({
@@ -347,41 +393,12 @@ def page_browser(request, page_id):
 @require_http_methods(["POST"])
 def generate_pdf_page(request, page_id):
     page = get_object_or_404(BlogPage, pk=page_id)
-    all_books = list(BlogIndexPage.objects.live())
-
-    labels = {
-        (l.image_id, l.source_page_id): l.description
-        for l in StudyCardLabel.objects.filter(source_page_id=page.pk)
-    }
-
-    imprimible_codes = generate_codes_for_page(page, all_books=all_books, tag=TAG_IMPRIMIBLE)
-    all_codes = generate_codes_for_page(page, all_books=all_books)
-
-    all_items = []
-    for img, code in imprimible_codes:
-        desc = labels.get((img.pk, page.pk), "")
-        all_items.append((img, code, desc))
-
-    if not all_items:
-        return HttpResponse(
-            '<div class="alert alert-warning">No hay imágenes marcadas como imprimible.</div>',
-            status=200,
-        )
-
-    selected_ids = {img.pk for img, _, _ in all_items}
-    fill_items = [(img, code) for img, code in all_codes if img.pk not in selected_ids]
-
-    duplicate = request.POST.get("duplicate") == "on"
-    page_format = request.POST.get("page_format", "a5")
-    pdf_bytes = generate_cards_pdf(
-        all_items, fill_items=fill_items, duplicate=duplicate, page_format=page_format,
+    items, fill_items = card_pdf_jobs.page_items(page)
+    return _start_pdf_job(
+        request, "page", page, items, fill_items,
+        back_url=reverse("clases:study_cards_page", args=[page.pk]),
     )
 
-    response = HttpResponse(pdf_bytes, content_type="application/pdf")
-    safe_title = page.title.replace(" ", "_")[:40]
-    response["Content-Disposition"] = f'attachment; filename="tarjetas_{safe_title}.pdf"'
-    return response
-
 
 # =============================================================================
 # GROUP TRACKING
@@ -634,36 +651,19 @@ def ocr_confirm(request, group_id):
                 if idx in entries:
                     entries[idx]["codes"].append(value)
 
-    created = 0
-    errors = []
-
-    for idx, entry in entries.items():
-        student_id = entry["student_id"]
-        enrollment = Enrollment.objects.filter(
-            group=group, user_id=student_id, is_active=True
-        ).select_related("user").first()
-        if not enrollment:
-            continue
-
-        for code in entry["codes"]:
-            code = code.strip().upper()
-            item, err = _find_item_by_code(code, group)
-            if err:
-                errors.append(f"{code}: {err}")
-                continue
-
-            if item.batch.created_by_id == 1:
-                item.batch.created_by = request.user
-                item.batch.save(update_fields=["created_by"])
-
-            if not StudyCardPickup.objects.filter(card_item=item, student=enrollment.user).exists():
-                StudyCardPickup.objects.create(
-                    card_item=item,
-                    student=enrollment.user,
-                    picked_up_at=pickup_date,
-                    source="photo_ocr",
-                )
-                created += 1
+    report = register_pickups(
+        group,
+        entries.values(),
+        picked_up_at=pickup_date,
+        source="photo_ocr",
+        user=request.user,
+    )
+    created = report["created"]
+    errors = [
+        f"{row['code']}: Código '{row['code']}' no encontrado en ningún libro"
+        for row in report["rows"]
+        if row["status"] == "unknown_code"
+    ]
 
     msg = f'<div class="alert alert-success text-sm">{created} recogida{"s" if created != 1 else ""} registrada{"s" if created != 1 else ""} desde OCR.</div>'
     if errors:
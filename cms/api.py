@@ -1,3 +1,4 @@
+import uuid
 from datetime import date
 from typing import List, Optional
 
@@ -13,6 +14,7 @@ from wagtail.models import Collection
 
 from api_keys.auth import DatabaseApiKey
 from .models import (
+    AIPublishJob,
     BlogIndexPage,
     BlogPage,
     MusicCategory,
@@ -20,7 +22,7 @@ from .models import (
     MusicTag,
     TestPage,
 )
-from .services import AIMetadataExtractor, ContentPublisher
+from .services import ai_publish_jobs
 
 
 router = Router(tags=["CMS Tests"], auth=[DatabaseApiKey(), django_auth])
@@ -166,10 +168,17 @@ def create_test_page(request, payload: TestPageIn):
 # ------------------------------------------------------------------------------
 
 
-class AIPublishOut(Schema):
-    """Response schema for AI-powered publishing"""
+class AIPublishJobOut(Schema):
+    """Response schema for an enqueued AI publish job"""
+
+    job_id: str
+    status: str
+    status_url: str
+
+
+class AIPublishResultOut(Schema):
+    """Page created by an AI publish job"""
 
-    success: bool
     score_page_id: int
     title: str
     edit_url: str
@@ -178,7 +187,23 @@ class AIPublishOut(Schema):
     created_items: dict
 
 
-@router.post("/ai-publish", response=AIPublishOut)
+class AIPublishJobStatusOut(Schema):
+    """Status of an AI publish job"""
+
+    job_id: str
+    status: str
+    stage: str
+    stage_label: str
+    progress: int
+    result: Optional[AIPublishResultOut] = None
+    error: str = ""
+
+
+def _job_status_url(job):
+    return f"/api/cms/ai-publish/jobs/{job.pk}"
+
+
+@router.post("/ai-publish", response={202: AIPublishJobOut})
 def ai_publish_content(
     request,
     description: str = Form(..., description="Descripción en lenguaje natural del contenido"),
@@ -191,21 +216,23 @@ def ai_publish_content(
     midi_files: List[UploadedFile] = File(None, description="Archivos MIDI"),
 ):
     """
-    Crear ScorePage o DictadoPage usando IA para procesar descripción en lenguaje natural.
+    Crear ScorePage, DictadoPage o BlogPage usando IA para procesar una
+    descripción en lenguaje natural, en segundo plano.
 
     Este endpoint permite subir archivos musicales (PDFs, audios, imágenes, MIDI)
     junto con una descripción en lenguaje natural. La IA extrae automáticamente
     metadata estructurada (título, compositor, dificultad, etc.) y crea la página
     correspondiente en Wagtail.
-    
+
     Para ScorePage: PDFs, audios e imágenes se agregan como bloques de contenido.
     Para DictadoPage: Audios se muestran con WaveSurfer.js, PDFs e imágenes como respuestas colapsables.
 
     Proceso:
     1. Validar archivos y descripción
-    2. Extraer metadata con IA (Google Gemini)
-    3. Crear ScorePage con ContentPublisher
-    4. Retornar URLs de edición
+    2. Guardar los archivos y encolar un AIPublishJob (respuesta inmediata, 202)
+    3. En segundo plano: extraer metadata con IA (Google Gemini) y crear la
+       página con ContentPublisher
+    4. Consultar el progreso y el resultado en GET /ai-publish/jobs/{job_id}
 
     Args:
         request: Request object
@@ -218,36 +245,24 @@ def ai_publish_content(
         midi_files: Lista de archivos MIDI
 
     Returns:
-        AIPublishOut con información de la página creada
+        AIPublishJobOut con el id del job y la URL de estado
 
     Raises:
         HttpError 400: Si faltan datos requeridos o son inválidos
-        HttpError 500: Si falla la creación de la página
     """
     # Validaciones básicas
     if not description or not description.strip():
         raise HttpError(400, "Debes proporcionar una descripción.")
 
-    # Convertir None a listas vacías
-    pdf_files = pdf_files or []
-    audio_files = audio_files or []
-    image_files = image_files or []
-    midi_files = midi_files or []
-
-    if not any([pdf_files, audio_files, image_files, midi_files]):
+    uploads = {
+        "pdf": pdf_files or [],
+        "audio": audio_files or [],
+        "image": image_files or [],
+        "midi": midi_files or [],
+    }
+    if not any(uploads.values()):
         raise HttpError(400, "Debes subir al menos un archivo.")
 
-    # Preparar nombres de archivos para la IA
-    file_names = []
-    if pdf_files:
-        file_names.extend([f"PDF: {f.name}" for f in pdf_files])
-    if audio_files:
-        file_names.extend([f"Audio: {f.name}" for f in audio_files])
-    if image_files:
-        file_names.extend([f"Imagen: {f.name}" for f in image_files])
-    if midi_files:
-        file_names.extend([f"MIDI: {f.name}" for f in midi_files])
-
     # Get parent page si se especificó
     parent_page = None
     if parent_page_id:
@@ -256,113 +271,40 @@ def ai_publish_content(
         except MusicLibraryIndexPage.DoesNotExist as exc:
             raise HttpError(400, "La página padre indicada no existe.") from exc
 
-    # Extraer metadata con IA
-    try:
-        extractor = AIMetadataExtractor()
-        metadata = extractor.extract_metadata(description, file_names)
-        
-        # Log the extracted metadata for debugging
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.info(
-            f"AI metadata extraction result: title='{metadata.get('title')}', "
-            f"composer='{metadata.get('composer')}', "
-            f"categories={metadata.get('categories')}, "
-            f"tags={metadata.get('tags')}"
-        )
-        
-        # Check if we got fallback values (indicating API failure)
-        if metadata.get('title') == 'Sin título' or not metadata.get('composer'):
-            logger.warning(
-                "AI metadata extraction returned default values - possible API failure. "
-                f"Title: '{metadata.get('title')}', Composer: '{metadata.get('composer')}'"
-            )
-            
-    except ValueError as e:
-        raise HttpError(400, f"Error en la descripción: {str(e)}")
-    except Exception as e:
-        # More specific error message for AI failures
-        logger.error(f"AI metadata extraction failed: {e}", exc_info=True)
-        raise HttpError(
-            500, 
-            f"Error al procesar con IA: {str(e)}. Por favor, verifica la configuración de GEMINI_API_KEY."
-        )
-
-    # Crear ScorePage o DictadoPage con transaction
-    try:
-        with transaction.atomic():
-            publisher = ContentPublisher(user=request.auth)  # auth is the User from DatabaseApiKey
-            
-            if page_type == 'dictadopage':
-                # Create DictadoPage
-                page = publisher.create_dictadopage_from_ai(
-                    metadata=metadata,
-                    pdf_files=pdf_files,
-                    audio_files=audio_files,
-                    image_files=image_files,
-                    midi_files=midi_files,
-                    publish=publish_immediately,
-                    parent_page=parent_page,
-                )
-            elif page_type == 'blogpage':
-                # Create BlogPage
-                page = publisher.create_blogpage_from_ai(
-                    metadata=metadata,
-                    pdf_files=pdf_files,
-                    audio_files=audio_files,
-                    image_files=image_files,
-                    midi_files=midi_files,
-                    publish=publish_immediately,
-                    parent_page=parent_page,
-                )
-            else:
-                # Create ScorePage (default)
-                page = publisher.create_scorepage_from_ai(
-                    metadata=metadata,
-                    pdf_files=pdf_files,
-                    audio_files=audio_files,
-                    image_files=image_files,
-                    midi_files=midi_files,
-                    publish=publish_immediately,
-                    parent_page=parent_page,
-                )
-
-            created_items = {
-                "composer": metadata.get("composer", ""),
-                "categories": metadata.get("categories", []),
-                "tags": metadata.get("tags", []),
-            }
-    except ValueError as e:
-        raise HttpError(400, str(e))
-    except Exception as e:
-        raise HttpError(500, f"Error al crear la página: {str(e)}")
-
-    # Construir URLs
-    edit_url = f"/cms/pages/{page.id}/edit/"
-    if page.live:
-        try:
-            preview_url = page.get_url(request)
-        except Exception:
-            preview_url = f"/cms/pages/{page.id}/"
-    else:
-        preview_url = f"/cms/pages/{page.id}/view_draft/"
-    
-    page_type_names = {'dictadopage': 'DictadoPage', 'blogpage': 'BlogPage', 'scorepage': 'ScorePage'}
-    page_type_name = page_type_names.get(page_type, 'ScorePage')
-    message = (
-        f"{page_type_name} creada como borrador. Revísala y publica cuando estés listo."
-        if not publish_immediately
-        else f"{page_type_name} publicada correctamente."
+    job = ai_publish_jobs.create_job(
+        user=request.auth,  # auth is the User from DatabaseApiKey
+        description=description,
+        page_type=page_type,
+        publish_immediately=publish_immediately,
+        parent_page=parent_page,
+        uploads=uploads,
+    )
+    return 202, AIPublishJobOut(
+        job_id=str(job.pk), status=job.status, status_url=_job_status_url(job)
     )
 
-    return AIPublishOut(
-        success=True,
-        score_page_id=page.id,
-        title=page.title,
-        edit_url=edit_url,
-        preview_url=preview_url,
-        message=message,
-        created_items=created_items,
+
+@router.get("/ai-publish/jobs/{job_id}", response=AIPublishJobStatusOut)
+def ai_publish_job_status(request, job_id: uuid.UUID):
+    """
+    Estado de un job de publicación con IA: etapa, progreso (0-100) y,
+    al terminar, la página creada o el error.
+
+    Raises:
+        HttpError 404: Si el job no existe o es de otro usuario
+    """
+    job = AIPublishJob.objects.filter(pk=job_id, user=request.auth).first()
+    if job is None:
+        raise HttpError(404, "El job de publicación no existe.")
+
+    return AIPublishJobStatusOut(
+        job_id=str(job.pk),
+        status=job.status,
+        stage=job.stage,
+        stage_label=job.get_stage_display(),
+        progress=job.progress,
+        result=job.result or None,
+        error=job.error,
     )
 
 
@@ -0,0 +1,23 @@
+"""
+Show hit/miss counters of the Gemini response cache.
+
+Usage:
+    python manage.py gemini_cache_stats
+"""
+
+from django.core.management.base import BaseCommand
+
+from martina_bescos_app.utils import llm_cache
+
+
+class Command(BaseCommand):
+    help = "Muestra los aciertos y fallos de la caché de respuestas de Gemini"
+
+    def handle(self, *args, **options):
+        for namespace, counters in llm_cache.stats().items():
+            total = counters["hit"] + counters["miss"]
+            ratio = f"{counters['hit'] / total:.0%}" if total else "-"
+            self.stdout.write(
+                f"{namespace}: {counters['hit']} aciertos, {counters['miss']} fallos ({ratio})"
+            )
+        self.stdout.write(self.style.SUCCESS("Listo"))
@@ -10,6 +10,7 @@ This script:
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from taggit.models import Tag, TaggedItem
+from cms.models import TagUsage
 from collections import defaultdict
 
 
@@ -80,6 +81,9 @@ class Command(BaseCommand):
                         tag.name = tag.name.lower().strip()
                         tag.save()
                         self.stdout.write(f"  '{old_name}' → '{tag.name}'")
+
+                # El update() masivo de TaggedItem no dispara señales
+                TagUsage.rebuild()
         
         if dry_run:
             self.stdout.write(self.style.WARNING('\nDRY RUN COMPLETE - No changes were made'))
@@ -0,0 +1,19 @@
+"""
+Management command to rebuild the TagUsage counters from taggit_taggeditem.
+
+The counters are kept current by signals; run this after bulk operations
+that bypass them (queryset.update(), raw SQL, fixture loads).
+"""
+from django.core.management.base import BaseCommand
+
+from cms.models import TagUsage
+
+
+class Command(BaseCommand):
+    help = 'Rebuild tag usage counters used by the resource library sidebar'
+
+    def handle(self, *args, **options):
+        TagUsage.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {TagUsage.objects.count()} tag usage counters rebuilt'
+        ))
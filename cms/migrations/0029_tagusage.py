@@ -0,0 +1,51 @@
+# Generated by Django 5.0.11 on 2026-10-18 23:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_tag_usage(apps, schema_editor):
+    """Rellenar los contadores con los TaggedItem ya existentes"""
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    TagUsage = apps.get_model('cms', 'TagUsage')
+
+    usages = (
+        TaggedItem.objects.values('tag_id', 'content_type_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    TagUsage.objects.bulk_create(
+        TagUsage(tag_id=u['tag_id'], content_type_id=u['content_type_id'], count=u['total'])
+        for u in usages
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0028_blogpagetag_blogpage_faceted_tags_dictadopagetag_and_more'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usages', to='taggit.tag')),
+            ],
+            options={
+                'verbose_name': 'Uso de etiqueta',
+                'verbose_name_plural': 'Usos de etiquetas',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='tagusage',
+            constraint=models.UniqueConstraint(fields=('tag', 'content_type'), name='unique_tag_usage'),
+        ),
+        migrations.RunPython(backfill_tag_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.11 on 2026-10-18 23:08
+
+from django.db import migrations, models
+
+from cms.richtext_refs import extract_body_refs
+
+
+def backfill_body_refs(apps, schema_editor):
+    """Extraer las referencias del body de los artículos ya existentes"""
+    BlogPage = apps.get_model('cms', 'BlogPage')
+
+    batch = []
+    for page in BlogPage.objects.only('pk', 'body').iterator(chunk_size=500):
+        page.body_refs = extract_body_refs(page.body)
+        batch.append(page)
+        if len(batch) >= 500:
+            BlogPage.objects.bulk_update(batch, ['body_refs'])
+            batch = []
+    if batch:
+        BlogPage.objects.bulk_update(batch, ['body_refs'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0029_tagusage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpage',
+            name='body_refs',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(backfill_body_refs, migrations.RunPython.noop),
+    ]
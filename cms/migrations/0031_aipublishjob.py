@@ -0,0 +1,43 @@
+# Generated by Django 5.0.11 on 2026-10-18 23:38
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0030_blogpage_body_refs'),
+        ('wagtailcore', '0097_baselogentry_uuid_action_timestamp_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIPublishJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('description', models.TextField()),
+                ('page_type', models.CharField(default='scorepage', max_length=20)),
+                ('publish_immediately', models.BooleanField(default=False)),
+                ('files', models.JSONField(default=list, help_text='Ficheros subidos: [{"kind": "pdf", "name": "...", "path": "..."}]')),
+                ('status', models.CharField(choices=[('pending', 'En cola'), ('running', 'En proceso'), ('done', 'Terminado'), ('error', 'Error')], default='pending', max_length=10)),
+                ('stage', models.CharField(choices=[('queued', 'En cola'), ('extracting_metadata', 'Extrayendo metadata con IA'), ('creating_page', 'Creando página'), ('finished', 'Terminado')], default='queued', max_length=20)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('result', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('parent_page', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='wagtailcore.page')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ai_publish_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Publicación con IA',
+                'verbose_name_plural': 'Publicaciones con IA',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -1,4 +1,7 @@
+import uuid
+
 from django.db import models
+from django.db.models.functions import Greatest
 from django.conf import settings
 from django import forms
 from django.http import HttpResponseForbidden
@@ -36,6 +39,8 @@ from taggit.models import TaggedItemBase
 from taggit.managers import TaggableManager
 from wagtail.embeds.models import Embed
 
+from .richtext_refs import extract_body_refs
+
 
 class TaggedEmbedItem(TaggedItemBase):
     """Through model for tagging embeds via TaggableEmbed."""
@@ -643,6 +648,10 @@ class BlogPage(Page):
         help_text="Solo el creador de la página puede verla.",
     )
 
+    # Ids de imágenes y URLs de media incrustados en `body`, extraídos al
+    # guardar para que leerlos no exija parsear el HTML.
+    body_refs = models.JSONField(default=dict, blank=True, editable=False)
+
     # StreamField para archivos adjuntos — simplificado: un gesto por elemento
     attachments = StreamField(
         [
@@ -746,45 +755,61 @@ class BlogPage(Page):
     def get_external_links(self):
         return self._parse_attachments()['external_links']
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "body" in update_fields:
+            self.body_refs = extract_body_refs(self.body)
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {"body_refs"}
+        for attr in ("_body_refs_cache", "_images_cache"):
+            self.__dict__.pop(attr, None)
+        return super().save(*args, **kwargs)
+
+    def _body_refs(self):
+        """Referencias del body: las guardadas o, en filas antiguas sin
+        rellenar, extraídas al vuelo con la expresión regular."""
+        if not hasattr(self, "_body_refs_cache"):
+            refs = self.body_refs or {}
+            if "images" not in refs:
+                refs = extract_body_refs(self.body)
+            self._body_refs_cache = refs
+        return self._body_refs_cache
+
+    def get_body_image_ids(self):
+        """Ids de las imágenes incrustadas en el body, en orden."""
+        return list(self._body_refs().get("images", []))
+
+    def get_body_embed_urls(self):
+        """URLs de los embeds de media (vídeo/audio) incrustados en el body."""
+        return list(self._body_refs().get("embeds", []))
+
     def get_images(self):
         """
         Images from StreamField attachments + RichText body embeds.
         Uses instance cache to avoid repeated StreamField deserialization.
         """
-        images = [sv['image'] for sv in self._parse_attachments()['images'] if sv.get('image')]
-
-        # Images from RichText body — only on detail page, skip for listings
-        if self.body and '<embed embedtype="image"' in self.body:
-            from bs4 import BeautifulSoup
-            from wagtail.images import get_image_model
-            Image = get_image_model()
-            soup = BeautifulSoup(self.body, 'html.parser')
-            image_ids = [
-                tag.get('id') for tag in soup.find_all('embed', embedtype='image')
-                if tag.get('id')
-            ]
+        if not hasattr(self, "_images_cache"):
+            images = [sv['image'] for sv in self._parse_attachments()['images'] if sv.get('image')]
+
+            image_ids = self.get_body_image_ids()
             if image_ids:
-                db_images = {str(img.pk): img for img in Image.objects.filter(pk__in=image_ids)}
-                images.extend(db_images.get(id) for id in image_ids if db_images.get(id))
-        return images
+                from wagtail.images import get_image_model
+                Image = get_image_model()
+                db_images = Image.objects.in_bulk(image_ids)
+                images.extend(db_images[pk] for pk in image_ids if pk in db_images)
+            self._images_cache = images
+        return list(self._images_cache)
 
     def get_embeds(self):
         """
         Extrae URLs de embeds incrustados en el body (RichTextField)
         para mantener compatibilidad con otras páginas (ScorePage).
         """
-        from bs4 import BeautifulSoup
-        if not self.body:
-            return []
-            
-        soup = BeautifulSoup(self.body, 'html.parser')
-        embed_tags = soup.find_all('embed', embedtype='media')
-        
         class DummyEmbedValue:
             def __init__(self, url):
                 self.url = url
-                
-        return [DummyEmbedValue(tag.get('url')) for tag in embed_tags if tag.get('url')]
+
+        return [DummyEmbedValue(url) for url in self.get_body_embed_urls()]
 
     def clean(self):
         super().clean()
@@ -1729,6 +1754,96 @@ class ScorePage(Page):
 
         return getattr(embed, "html", "") or ""
 
+    # Bloques del StreamField que apuntan a medios etiquetables:
+    # tipo de bloque → (campo del StructBlock, "document" | "image")
+    MEDIA_TAG_BLOCKS = {
+        "pdf_score": ("pdf_file", "document"),
+        "audio": ("audio_file", "document"),
+        "image": ("image", "image"),
+    }
+
+    def _media_refs(self):
+        """(tipo, id) de PDFs, audios e imágenes en orden, leídos del JSON crudo
+        del StreamField para no instanciar ningún Document/Image."""
+        refs = []
+        for block in self.content.raw_data:
+            spec = self.MEDIA_TAG_BLOCKS.get(block.get("type"))
+            if not spec:
+                continue
+            field, kind = spec
+            value = block.get("value") or {}
+            object_id = value.get(field) if isinstance(value, dict) else None
+            if object_id:
+                refs.append((kind, int(object_id)))
+        return refs
+
+    @classmethod
+    def prefetch_all_tags(cls, pages):
+        """
+        Carga las tags de varias ScorePages de golpe y las deja cacheadas en
+        cada instancia (`get_all_tags()` / `get_media_tags()`).
+
+        Una consulta para las MusicTag directas (ninguna si ya vienen con
+        `prefetch_related("tags")`) y otra a `TaggedItem` para todas las tags
+        de los documentos e imágenes referenciados, sin importar cuántas
+        páginas o bloques haya.
+        """
+        from django.contrib.contenttypes.models import ContentType
+        from taggit.models import TaggedItem
+        from wagtail.documents.models import Document
+        from wagtail.images.models import Image
+
+        pages = [page for page in pages if isinstance(page, cls)]
+        if not pages:
+            return pages
+
+        # 1. Tags directas (MusicTag)
+        direct = {}
+        pending = {p.pk for p in pages if "tags" not in getattr(p, "_prefetched_objects_cache", {})}
+        if pending:
+            rows = (
+                cls.tags.through.objects.filter(scorepage_id__in=pending)
+                .select_related("musictag")
+                .order_by("musictag__name")
+            )
+            for row in rows:
+                direct.setdefault(row.scorepage_id, []).append(row.musictag)
+
+        # 2-4. Tags de PDFs, audios e imágenes
+        refs = {page.pk: page._media_refs() for page in pages}
+        content_types = {
+            "document": ContentType.objects.get_for_model(Document),
+            "image": ContentType.objects.get_for_model(Image),
+        }
+        wanted = models.Q()
+        for kind, content_type in content_types.items():
+            ids = {object_id for page_refs in refs.values() for k, object_id in page_refs if k == kind}
+            if ids:
+                wanted |= models.Q(content_type=content_type, object_id__in=ids)
+
+        media_tags = {}
+        if wanted:
+            items = TaggedItem.objects.filter(wanted).select_related("tag").order_by("tag__name")
+            for item in items:
+                media_tags.setdefault((item.content_type_id, item.object_id), []).append(item.tag)
+
+        for page in pages:
+            own = direct.get(page.pk, []) if page.pk in pending else list(page.tags.all())
+
+            from_media = []
+            for kind, object_id in refs[page.pk]:
+                from_media.extend(media_tags.get((content_types[kind].pk, object_id), []))
+
+            page._media_tags_cache = _unique_tags(from_media)
+            page._all_tags_cache = _unique_tags(own + from_media)
+        return pages
+
+    def get_media_tags(self):
+        """Tags (taggit) de los PDFs, audios e imágenes del StreamField."""
+        if not hasattr(self, "_media_tags_cache"):
+            type(self).prefetch_all_tags([self])
+        return self._media_tags_cache
+
     def get_all_tags(self):
         """
         Obtener unión de todas las tags de:
@@ -1737,40 +1852,13 @@ class ScorePage(Page):
         3. Tags de audios en el StreamField
         4. Tags de imágenes en el StreamField
 
+        Para listados, llamar antes a `ScorePage.prefetch_all_tags(pages)`.
+
         Returns: Lista de objetos tag únicos (sin duplicados)
         """
-        all_tags = []
-
-        # 1. Tags directas (MusicTag)
-        all_tags.extend(self.tags.all())
-
-        # 2. Tags de PDFs
-        for pdf_block in self.get_pdf_blocks():
-            if pdf_block.get("pdf_file") and hasattr(pdf_block["pdf_file"], "tags"):
-                all_tags.extend(pdf_block["pdf_file"].tags.all())
-
-        # 3. Tags de audios
-        for audio_block in self.get_audios():
-            if audio_block.get("audio_file") and hasattr(
-                audio_block["audio_file"], "tags"
-            ):
-                all_tags.extend(audio_block["audio_file"].tags.all())
-
-        # 4. Tags de imágenes
-        for image_block in self.get_images():
-            if image_block.get("image") and hasattr(image_block["image"], "tags"):
-                all_tags.extend(image_block["image"].tags.all())
-
-        # Deduplicar por nombre (case-insensitive)
-        seen_names = set()
-        unique_tags = []
-        for tag in all_tags:
-            tag_name_lower = tag.name.lower()
-            if tag_name_lower not in seen_names:
-                seen_names.add(tag_name_lower)
-                unique_tags.append(tag)
-
-        return unique_tags
+        if not hasattr(self, "_all_tags_cache"):
+            type(self).prefetch_all_tags([self])
+        return self._all_tags_cache
 
     @property
     def all_tags(self):
@@ -1778,6 +1866,18 @@ class ScorePage(Page):
         return self.get_all_tags()
 
 
+def _unique_tags(tags):
+    """Deduplicar por nombre (case-insensitive) conservando el orden."""
+    seen_names = set()
+    unique_tags = []
+    for tag in tags:
+        tag_name_lower = tag.name.lower()
+        if tag_name_lower not in seen_names:
+            seen_names.add(tag_name_lower)
+            unique_tags.append(tag)
+    return unique_tags
+
+
 class SetlistPage(Page):
     """Página para organizar partituras en setlists - MUSIC PILLS"""
 
@@ -1861,3 +1961,154 @@ class SavedResourceFilter(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.name}"
+
+
+class TagUsage(models.Model):
+    """
+    Número de objetos de cada tipo que llevan una tag de taggit.
+
+    Lo mantienen las señales de `cms/signals.py` al añadir/quitar tags, para
+    que la barra lateral de la biblioteca de recursos pinte las tags con sus
+    contadores sin recorrer `taggit_taggeditem` en cada carga.
+    """
+
+    tag = models.ForeignKey(
+        "taggit.Tag", on_delete=models.CASCADE, related_name="usages"
+    )
+    content_type = models.ForeignKey(
+        "contenttypes.ContentType", on_delete=models.CASCADE, related_name="+"
+    )
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Uso de etiqueta"
+        verbose_name_plural = "Usos de etiquetas"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tag", "content_type"], name="unique_tag_usage"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.tag} ({self.content_type.model}): {self.count}"
+
+    @classmethod
+    def bump(cls, tag_id, content_type_id, delta):
+        """Suma `delta` al contador de forma atómica (sin bajar de cero)."""
+        rows = cls.objects.filter(tag_id=tag_id, content_type_id=content_type_id)
+        if rows.update(count=Greatest(models.F("count") + delta, 0)):
+            return
+        if delta > 0:
+            cls.objects.get_or_create(
+                tag_id=tag_id, content_type_id=content_type_id, defaults={"count": 0}
+            )
+            rows.update(count=models.F("count") + delta)
+
+    @classmethod
+    def rebuild(cls):
+        """Recalcula todos los contadores desde `taggit_taggeditem`."""
+        from django.db import transaction
+        from django.db.models import Count
+        from taggit.models import TaggedItem
+
+        usages = (
+            TaggedItem.objects.values("tag_id", "content_type_id")
+            .annotate(total=Count("id"))
+            .order_by()
+        )
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                cls(tag_id=u["tag_id"], content_type_id=u["content_type_id"], count=u["total"])
+                for u in usages
+            )
+
+
+class AIPublishJob(models.Model):
+    """
+    Publicación con IA en segundo plano (`POST /api/cms/ai-publish`).
+
+    El endpoint guarda los ficheros subidos en el storage, crea el job y
+    encola `cms.tasks.run_ai_publish_job`; la extracción de metadata con
+    Gemini y la creación de la página ocurren fuera de la petición. El
+    cliente consulta el estado en `GET /api/cms/ai-publish/jobs/{id}`.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "En cola"
+        RUNNING = "running", "En proceso"
+        DONE = "done", "Terminado"
+        ERROR = "error", "Error"
+
+    class Stage(models.TextChoices):
+        QUEUED = "queued", "En cola"
+        EXTRACTING = "extracting_metadata", "Extrayendo metadata con IA"
+        CREATING = "creating_page", "Creando página"
+        FINISHED = "finished", "Terminado"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="ai_publish_jobs",
+    )
+    description = models.TextField()
+    page_type = models.CharField(max_length=20, default="scorepage")
+    publish_immediately = models.BooleanField(default=False)
+    parent_page = models.ForeignKey(
+        "wagtailcore.Page",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    files = models.JSONField(
+        default=list,
+        help_text='Ficheros subidos: [{"kind": "pdf", "name": "...", "path": "..."}]',
+    )
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    stage = models.CharField(
+        max_length=20, choices=Stage.choices, default=Stage.QUEUED
+    )
+    progress = models.PositiveSmallIntegerField(default=0)
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Publicación con IA"
+        verbose_name_plural = "Publicaciones con IA"
+
+    def __str__(self):
+        return f"{self.get_page_type_display_name()} · {self.get_status_display()} ({self.pk})"
+
+    def get_page_type_display_name(self):
+        names = {"dictadopage": "DictadoPage", "blogpage": "BlogPage", "scorepage": "ScorePage"}
+        return names.get(self.page_type, "ScorePage")
+
+    def set_stage(self, stage, progress):
+        """Avanzar de etapa guardando solo los campos de estado."""
+        self.status = self.Status.RUNNING
+        self.stage = stage
+        self.progress = progress
+        self.save(update_fields=["status", "stage", "progress", "updated_at"])
+
+    def finish(self, result):
+        self.status = self.Status.DONE
+        self.stage = self.Stage.FINISHED
+        self.progress = 100
+        self.result = result
+        self.finished_at = timezone.now()
+        self.save(update_fields=["status", "stage", "progress", "result", "finished_at", "updated_at"])
+
+    def fail(self, message):
+        self.status = self.Status.ERROR
+        self.error = message
+        self.finished_at = timezone.now()
+        self.save(update_fields=["status", "error", "finished_at", "updated_at"])
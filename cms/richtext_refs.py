@@ -0,0 +1,37 @@
+"""
+Referencias a medios dentro de un RichTextField de Wagtail.
+
+Wagtail guarda las imágenes y los embeds del editor como etiquetas `<embed>`
+con los atributos siempre entre comillas dobles:
+
+    <embed alt="..." embedtype="image" format="fullwidth" id="12"/>
+    <embed embedtype="media" url="https://youtu.be/..."/>
+
+Ese formato lo genera Wagtail, no una persona, así que basta una expresión
+regular para sacar los ids y las URLs sin montar un árbol con BeautifulSoup.
+"""
+
+import html
+import re
+
+EMBED_TAG_RE = re.compile(r"<embed\b([^>]*)>", re.IGNORECASE)
+ATTR_RE = re.compile(r'([\w-]+)="([^"]*)"')
+
+
+def extract_body_refs(body):
+    """`{"images": [ids de imagen], "embeds": [urls de media]}` en orden de aparición."""
+    images, embeds = [], []
+    if not body or "<embed" not in body:
+        return {"images": images, "embeds": embeds}
+
+    for match in EMBED_TAG_RE.finditer(body):
+        attrs = {name.lower(): html.unescape(value) for name, value in ATTR_RE.findall(match.group(1))}
+        embedtype = attrs.get("embedtype")
+        if embedtype == "image":
+            try:
+                images.append(int(attrs["id"]))
+            except (KeyError, ValueError):
+                continue
+        elif embedtype == "media" and attrs.get("url"):
+            embeds.append(attrs["url"])
+    return {"images": images, "embeds": embeds}
@@ -13,6 +13,8 @@ from django.conf import settings
 from google import genai
 from google.genai import types
 
+from martina_bescos_app.utils import llm_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -79,6 +81,14 @@ SIEMPRE usa el patrón: instrument/INSTRUMENTO, voice/VOZ, type/TIPO
 Responde SOLO con el JSON válido. EL ARRAY 'files' ES OBLIGATORIO.
 """
 
+    CACHE_NAMESPACE = "ai_metadata"
+
+    GENERATION_CONFIG = {
+        "temperature": 0.1,  # Low temperature for consistent output
+        "max_output_tokens": 2048,
+        "response_mime_type": "application/json",  # Request JSON response
+    }
+
     DEFAULT_METADATA = {
         "title": "Sin título",
         "composer": "",
@@ -141,8 +151,13 @@ Responde SOLO con el JSON válido. EL ARRAY 'files' ES OBLIGATORIO.
         )
 
         try:
-            # Call Gemini API with retry logic
-            metadata = self._call_gemini_with_retry(prompt)
+            # Call Gemini API with retry logic (misma descripción y ficheros → respuesta cacheada)
+            cache_key = llm_cache.make_key(
+                self.CACHE_NAMESPACE, self.model_id, prompt, config=self.GENERATION_CONFIG
+            )
+            metadata = llm_cache.get_or_call(
+                cache_key, lambda: self._call_gemini_with_retry(prompt)
+            )
             logger.info(
                 f"Successfully extracted metadata: title='{metadata.get('title', 'N/A')}', "
                 f"composer='{metadata.get('composer', 'N/A')}'"
@@ -194,11 +209,7 @@ Responde SOLO con el JSON válido. EL ARRAY 'files' ES OBLIGATORIO.
                 response = self.client.models.generate_content(
                     model=self.model_id,
                     contents=prompt,
-                    config=types.GenerateContentConfig(
-                        temperature=0.1,  # Low temperature for consistent output
-                        max_output_tokens=2048,
-                        response_mime_type="application/json",  # Request JSON response
-                    ),
+                    config=types.GenerateContentConfig(**self.GENERATION_CONFIG),
                 )
 
                 # Extract text from response
@@ -0,0 +1,177 @@
+"""
+AI Publish Jobs
+
+Runs the AI publishing flow (`POST /api/cms/ai-publish`) in the background:
+the request stores the uploads in the default storage and creates an
+`AIPublishJob`; the Huey task `cms.tasks.run_ai_publish_job` extracts the
+metadata with Gemini and builds the page, reporting stage and progress on
+the job so the client can poll for the result.
+"""
+
+import logging
+import os
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from cms.models import AIPublishJob
+
+from .ai_metadata_extractor import AIMetadataExtractor
+from .content_publisher import ContentPublisher
+
+logger = logging.getLogger(__name__)
+
+STAGING_DIR = "ai_publish"
+FILE_KINDS = {"pdf": "PDF", "audio": "Audio", "image": "Imagen", "midi": "MIDI"}
+
+
+def create_job(user, description, page_type, publish_immediately, parent_page, uploads):
+    """
+    Store the uploads and enqueue the job after the transaction commits.
+
+    Args:
+        user: user publishing the content
+        description: natural language description for the AI
+        page_type: 'scorepage', 'dictadopage' or 'blogpage'
+        publish_immediately: publish the page or keep it as a draft
+        parent_page: MusicLibraryIndexPage or None
+        uploads: dict kind ('pdf', 'audio', 'image', 'midi') -> list of uploaded files
+
+    Returns:
+        AIPublishJob
+    """
+    from cms.tasks import run_ai_publish_job
+
+    job = AIPublishJob(
+        user=user,
+        description=description,
+        page_type=page_type,
+        publish_immediately=publish_immediately,
+        parent_page=parent_page,
+    )
+    for kind in FILE_KINDS:
+        for upload in uploads.get(kind) or []:
+            name = os.path.basename(upload.name)
+            path = default_storage.save(f"{STAGING_DIR}/{job.pk}/{kind}/{name}", upload)
+            job.files.append({"kind": kind, "name": name, "path": path})
+    job.save()
+
+    job_id = str(job.pk)
+    transaction.on_commit(lambda: run_ai_publish_job(job_id))
+    return job
+
+
+def _open_files(job):
+    """Staged uploads as Django Files with their original name, by kind."""
+    files = {kind: [] for kind in FILE_KINDS}
+    for entry in job.files:
+        files[entry["kind"]].append(File(default_storage.open(entry["path"]), name=entry["name"]))
+    return files
+
+
+def _delete_staged_files(job):
+    for entry in job.files:
+        try:
+            default_storage.delete(entry["path"])
+        except OSError:
+            logger.warning("No se pudo borrar el fichero temporal %s", entry["path"])
+
+
+def _page_urls(page):
+    edit_url = f"/cms/pages/{page.id}/edit/"
+    if page.live:
+        preview_url = page.get_url() or f"/cms/pages/{page.id}/"
+    else:
+        preview_url = f"/cms/pages/{page.id}/view_draft/"
+    return edit_url, preview_url
+
+
+def run_job(job_id):
+    """
+    Extract metadata and create the page for `job_id`. Runs inside the Huey
+    task; failures are stored on the job instead of raised.
+    """
+    job = AIPublishJob.objects.select_related("user", "parent_page").filter(pk=job_id).first()
+    if job is None or job.status == AIPublishJob.Status.DONE:
+        return job
+    try:
+        _process(job)
+    except Exception as exc:
+        logger.exception("AI publish job %s failed", job.pk)
+        job.fail(str(exc) or exc.__class__.__name__)
+    finally:
+        # Los ficheros ya están en Documents/Images (o el job ha fallado)
+        _delete_staged_files(job)
+    return job
+
+
+def _process(job):
+    # Gemini fuera de cualquier transacción: puede tardar decenas de segundos
+    job.set_stage(AIPublishJob.Stage.EXTRACTING, 10)
+    file_names = [f"{FILE_KINDS[entry['kind']]}: {entry['name']}" for entry in job.files]
+    try:
+        metadata = AIMetadataExtractor().extract_metadata(job.description, file_names)
+    except ValueError as exc:
+        job.fail(f"Error en la descripción: {exc}")
+        return
+    except Exception as exc:
+        logger.error("AI metadata extraction failed for job %s: %s", job.pk, exc, exc_info=True)
+        job.fail(
+            f"Error al procesar con IA: {exc}. "
+            "Por favor, verifica la configuración de GEMINI_API_KEY."
+        )
+        return
+
+    if metadata.get("title") == "Sin título" or not metadata.get("composer"):
+        logger.warning(
+            "AI metadata extraction returned default values - possible API failure. "
+            "Title: '%s', Composer: '%s'", metadata.get("title"), metadata.get("composer"),
+        )
+
+    job.set_stage(AIPublishJob.Stage.CREATING, 60)
+    files = _open_files(job)
+    parent_page = job.parent_page.specific if job.parent_page else None
+    create = {
+        "dictadopage": ContentPublisher.create_dictadopage_from_ai,
+        "blogpage": ContentPublisher.create_blogpage_from_ai,
+    }.get(job.page_type, ContentPublisher.create_scorepage_from_ai)
+    try:
+        with transaction.atomic():
+            page = create(
+                ContentPublisher(user=job.user),
+                metadata=metadata,
+                pdf_files=files["pdf"],
+                audio_files=files["audio"],
+                image_files=files["image"],
+                midi_files=files["midi"],
+                publish=job.publish_immediately,
+                parent_page=parent_page,
+            )
+    except Exception as exc:
+        logger.error("AI publish job %s failed creating the page: %s", job.pk, exc, exc_info=True)
+        job.fail(f"Error al crear la página: {exc}")
+        return
+    finally:
+        for kind_files in files.values():
+            for f in kind_files:
+                f.close()
+
+    edit_url, preview_url = _page_urls(page)
+    page_type_name = job.get_page_type_display_name()
+    job.finish({
+        "score_page_id": page.id,
+        "title": page.title,
+        "edit_url": edit_url,
+        "preview_url": preview_url,
+        "message": (
+            f"{page_type_name} publicada correctamente."
+            if job.publish_immediately
+            else f"{page_type_name} creada como borrador. Revísala y publica cuando estés listo."
+        ),
+        "created_items": {
+            "composer": metadata.get("composer", ""),
+            "categories": metadata.get("categories", []),
+            "tags": metadata.get("tags", []),
+        },
+    })
@@ -617,15 +617,10 @@ class ContentPublisher:
             Canonical tag name if exists, None otherwise
         """
         normalized = self._normalize_tag_name(tag_name)
-        
-        # Search in taggit's Tag model (case-insensitive)
-        from taggit.models import Tag
-        existing = Tag.objects.filter(name__iexact=normalized).first()
-        
-        if existing:
-            return existing.name  # Return canonical version
-        
-        return None
+
+        # Case-insensitive lookup in the shared in-memory tag vocabulary
+        from cms.services.tag_suggestions import TagSuggestionService
+        return TagSuggestionService.find_existing(normalized)
 
     def _apply_tags_to_document(self, document: Document, tag_names: list[str]):
         """
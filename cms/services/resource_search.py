@@ -1,84 +1,237 @@
 from wagtail.documents.models import Document
 from wagtail.images.models import Image
 from wagtail.embeds.models import Embed
-from django.utils import timezone
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import CharField, Count, F, Q, Sum, TextField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from taggit.models import TaggedItem
 from typing import List, Dict, Any
 
+from cms.models import TagUsage
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.ogg', '.m4a', '.aac', '.flac')
+
+
+class ResourceSearchResults:
+    """
+    Resultado perezoso de una búsqueda de recursos.
+
+    Envuelve un único `UNION ALL` ordenado de (tipo, id, título, fecha) sobre
+    Documentos, Imágenes y Embeds. `Paginator` solo necesita `count()` y
+    slicing: el recuento se resuelve con un COUNT en la BD y cada página con
+    LIMIT/OFFSET, hidratando únicamente los objetos visibles.
+    """
+
+    def __init__(self, union_qs):
+        self._union = union_qs
+        self._count = None
+
+    def count(self) -> int:
+        if self._count is None:
+            self._count = self._union.count()
+        return self._count
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return ResourceSearchService.hydrate(list(self._union[key]))
+        return ResourceSearchService.hydrate(list(self._union[key:key + 1]))[0]
+
+
 class ResourceSearchService:
     @staticmethod
-    def search(query: str = '', type_filter: str = '', tags: list = None, user=None) -> List[Dict[str, Any]]:
+    def _documents(query: str, tags: list):
+        docs = Document.objects.all()
+        if query:
+            docs = docs.filter(title__icontains=query)
+        for tag in tags:
+            docs = docs.filter(tags__name__iexact=tag)
+        return docs.annotate(
+            res_type=Value('document', output_field=CharField()),
+            res_id=F('id'),
+            res_title=Cast('title', output_field=TextField()),
+            res_created=F('created_at'),
+        )
+
+    @staticmethod
+    def _images(query: str, tags: list):
+        images = Image.objects.all()
+        if query:
+            images = images.filter(title__icontains=query)
+        for tag in tags:
+            images = images.filter(tags__name__iexact=tag)
+        return images.annotate(
+            res_type=Value('image', output_field=CharField()),
+            res_id=F('id'),
+            res_title=Cast('title', output_field=TextField()),
+            res_created=F('created_at'),
+        )
+
+    @staticmethod
+    def _embeds(query: str, tags: list):
+        embeds = Embed.objects.all()
+        if query:
+            # Embed doesn't have title field explicitly in the same way, but it has `title` from oEmbed usually
+            embeds = embeds.filter(url__icontains=query) | embeds.filter(title__icontains=query)
+
+        # Embeds don't have tags in Wagtail by default.
+        if tags:
+            embeds = embeds.none()
+
+        return embeds.annotate(
+            res_type=Value('embed', output_field=CharField()),
+            res_id=F('id'),
+            res_title=Coalesce(NullIf('title', Value('')), 'url', output_field=TextField()),
+            res_created=F('last_updated'),
+        )
+
+    @staticmethod
+    def build_query(query: str = '', type_filter: str = '', tags: list = None):
         """
-        Busca recursos en Wagtail (Documentos, Imágenes, Embeds).
+        Construye el `UNION ALL` ordenado por fecha descendente.
+
+        Cada rama solo selecciona (tipo, id, título, fecha), así que ordenar y
+        paginar ocurre en PostgreSQL sin traer ningún objeto a memoria.
         """
-        results = []
         tags = [t.strip().lower() for t in (tags or []) if t.strip()]
+        columns = ('res_type', 'res_id', 'res_title', 'res_created')
 
-        # 1. Search Documents (PDFs, Audios)
+        branches = []
         if not type_filter or type_filter == 'document':
-            docs = Document.objects.all()
-            if query:
-                docs = docs.filter(title__icontains=query)
-            if tags:
-                for tag in tags:
-                    docs = docs.filter(tags__name__iexact=tag)
-            
-            for doc in docs:
-                is_audio = doc.file.name.lower().endswith(('.mp3', '.wav', '.ogg', '.m4a', '.aac', '.flac'))
-                icon = '🎵' if is_audio else '📄'
-                
+            branches.append(ResourceSearchService._documents(query, tags))
+        if not type_filter or type_filter == 'image':
+            branches.append(ResourceSearchService._images(query, tags))
+        if not type_filter or type_filter == 'embed':
+            branches.append(ResourceSearchService._embeds(query, tags))
+
+        if not branches:
+            return Document.objects.none().values_list('id')
+
+        branches = [qs.order_by().values_list(*columns) for qs in branches]
+        union = branches[0].union(*branches[1:], all=True) if len(branches) > 1 else branches[0]
+        # Desempate estable para que LIMIT/OFFSET no repita ni salte filas
+        return union.order_by('-res_created', 'res_type', '-res_id')
+
+    @staticmethod
+    def hydrate(rows) -> List[Dict[str, Any]]:
+        """
+        Convierte filas (tipo, id, título, fecha) en los dicts que pinta la
+        plantilla, con una consulta por tipo para la página visible.
+        """
+        ids = {'document': [], 'image': [], 'embed': []}
+        for res_type, res_id, _title, _created in rows:
+            ids[res_type].append(res_id)
+
+        objects = {
+            'document': Document.objects.prefetch_related('tags').in_bulk(ids['document']) if ids['document'] else {},
+            'image': Image.objects.prefetch_related('tags').in_bulk(ids['image']) if ids['image'] else {},
+            'embed': Embed.objects.in_bulk(ids['embed']) if ids['embed'] else {},
+        }
+
+        results = []
+        for res_type, res_id, title, created_at in rows:
+            obj = objects[res_type].get(res_id)
+            if obj is None:
+                # Borrado entre el UNION y la hidratación
+                continue
+
+            if res_type == 'document':
+                is_audio = obj.file.name.lower().endswith(AUDIO_EXTENSIONS)
                 results.append({
-                    'id': f"doc_{doc.id}",
-                    'content_object': doc,
-                    'title': doc.title,
+                    'id': f"doc_{obj.id}",
+                    'content_object': obj,
+                    'title': title,
                     'type': 'document',
-                    'icon': icon,
-                    'url': doc.url,
-                    'created_at': doc.created_at,
+                    'icon': '🎵' if is_audio else '📄',
+                    'url': obj.url,
+                    'created_at': created_at,
                 })
-
-        # 2. Search Images
-        if not type_filter or type_filter == 'image':
-            images = Image.objects.all()
-            if query:
-                images = images.filter(title__icontains=query)
-            if tags:
-                for tag in tags:
-                    images = images.filter(tags__name__iexact=tag)
-            
-            for img in images:
+            elif res_type == 'image':
                 results.append({
-                    'id': f"img_{img.id}",
-                    'content_object': img,
-                    'title': img.title,
+                    'id': f"img_{obj.id}",
+                    'content_object': obj,
+                    'title': title,
                     'type': 'image',
                     'icon': '🖼️',
-                    'url': img.file.url if img.file else '',
-                    'created_at': img.created_at,
+                    'url': obj.file.url if obj.file else '',
+                    'created_at': created_at,
                 })
-
-        # 3. Search Embeds
-        if not type_filter or type_filter == 'embed':
-            embeds = Embed.objects.all()
-            if query:
-                # Embed doesn't have title field explicitly in the same way, but it has `title` from oEmbed usually
-                embeds = embeds.filter(url__icontains=query) | embeds.filter(title__icontains=query)
-            
-            # Embeds don't have tags in Wagtail by default. 
-            if tags:
-                embeds = embeds.none()
-
-            for emb in embeds:
+            else:
                 results.append({
-                    'id': f"emb_{emb.id}",
-                    'content_object': emb,
-                    'title': getattr(emb, 'title', None) or emb.url,
+                    'id': f"emb_{obj.id}",
+                    'content_object': obj,
+                    'title': title,
                     'type': 'embed',
                     'icon': '▶️',
-                    'url': emb.url,
-                    'created_at': getattr(emb, 'last_updated', timezone.now()),
+                    'url': obj.url,
+                    'created_at': created_at,
                 })
 
-        # Sort combined results by created_at descending
-        results.sort(key=lambda x: x.get('created_at') or timezone.now(), reverse=True)
-
         return results
+
+    @staticmethod
+    def search(query: str = '', type_filter: str = '', tags: list = None, user=None) -> ResourceSearchResults:
+        """
+        Busca recursos en Wagtail (Documentos, Imágenes, Embeds).
+
+        Devuelve un `ResourceSearchResults` perezoso: ordenación, recuento y
+        paginación se hacen en la BD y solo se hidrata la página pedida.
+        """
+        return ResourceSearchResults(ResourceSearchService.build_query(query, type_filter, tags))
+
+    @staticmethod
+    def tag_facets(query: str = '', type_filter: str = '', tags: list = None) -> List[Dict[str, Any]]:
+        """
+        Tags de documentos e imágenes con su número de recursos.
+
+        Sin filtros se leen los contadores precalculados de `TagUsage`. Con
+        filtros se cuenta solo dentro del conjunto de resultados actual, en
+        una única agregación, para que la barra lateral estreche las opciones.
+        Las tags seleccionadas siempre aparecen, aunque su recuento sea 0.
+        """
+        selected = [t.strip() for t in (tags or []) if t.strip()]
+        lowered = [t.lower() for t in selected]
+
+        content_types = {}
+        if not type_filter or type_filter == 'document':
+            content_types['document'] = ContentType.objects.get_for_model(Document)
+        if not type_filter or type_filter == 'image':
+            content_types['image'] = ContentType.objects.get_for_model(Image)
+
+        facets = []
+        if content_types and not query and not selected:
+            facets = list(
+                TagUsage.objects.filter(content_type__in=content_types.values(), count__gt=0)
+                .values(name=F('tag__name'))
+                .annotate(count=Sum('count'))
+                .order_by('name')
+            )
+        elif content_types:
+            in_results = Q()
+            if 'document' in content_types:
+                in_results |= Q(
+                    content_type=content_types['document'],
+                    object_id__in=ResourceSearchService._documents(query, lowered).values('id'),
+                )
+            if 'image' in content_types:
+                in_results |= Q(
+                    content_type=content_types['image'],
+                    object_id__in=ResourceSearchService._images(query, lowered).values('id'),
+                )
+            facets = list(
+                TaggedItem.objects.filter(in_results)
+                .values(name=F('tag__name'))
+                .annotate(count=Count('id'))
+                .order_by('name')
+            )
+
+        present = {f['name'].lower() for f in facets}
+        missing = [{'name': t, 'count': 0} for t in selected if t.lower() not in present]
+        if missing:
+            facets = sorted(facets + missing, key=lambda f: f['name'].lower())
+        return facets
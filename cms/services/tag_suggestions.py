@@ -0,0 +1,151 @@
+"""
+Autocompletado de tags compartido por todos los selectores de etiquetas.
+
+El vocabulario (tags de taggit + `MusicTag`) se carga una vez por proceso en
+listas ordenadas y se busca con `bisect`, así que cada pulsación no toca la
+BD. Para que todos los workers vean los cambios, las señales de
+`cms/signals.py` suben una versión en la caché compartida; cada proceso la
+compara antes de responder y recarga solo cuando ha cambiado.
+
+No usamos `pg_trgm`: con unos pocos miles de tags un índice en memoria
+responde en microsegundos y no exige instalar extensiones en PostgreSQL.
+"""
+
+import bisect
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from my_library import facets
+
+VERSION_CACHE_KEY = "cms:tag_vocabulary:version"
+
+
+class _Vocabulary:
+    """Índices inmutables de un snapshot del vocabulario."""
+
+    def __init__(self, taggit_names, music_names):
+        # taggit manda: si el mismo nombre existe en ambos, gana su grafía
+        canonical = {}
+        for name in list(taggit_names) + list(music_names):
+            canonical.setdefault(name.lower(), name)
+
+        self.taggit_exact = {name.lower(): name for name in taggit_names}
+        self.names = sorted(canonical.items())
+        self.keys = [key for key, _name in self.names]
+
+        # (faceta, valor) → para que "guit" encuentre "instrumento:guitarra"
+        values = []
+        for key, name in self.names:
+            faceta, valor = facets.parse(key)
+            if faceta is not None:
+                values.append((valor, faceta, name))
+        values.sort()
+        self.facet_values = values
+        self.facet_value_keys = [v[0] for v in values]
+
+
+class TagSuggestionService:
+    _lock = threading.Lock()
+    _vocabulary = None
+    _version = None
+
+    @classmethod
+    def invalidate(cls):
+        """Marca el vocabulario como caducado en todos los procesos."""
+        cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        cls._version = None
+
+    @classmethod
+    def invalidate_on_commit(cls):
+        """Invalida ya (para este proceso) y otra vez cuando la transacción se confirme."""
+        cls.invalidate()
+        transaction.on_commit(cls.invalidate)
+
+    @classmethod
+    def _load(cls):
+        from cms.models import MusicTag
+        from taggit.models import Tag
+
+        return _Vocabulary(
+            Tag.objects.values_list("name", flat=True),
+            MusicTag.objects.values_list("name", flat=True),
+        )
+
+    @classmethod
+    def vocabulary(cls) -> _Vocabulary:
+        version = cache.get(VERSION_CACHE_KEY)
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.add(VERSION_CACHE_KEY, version, None)
+            version = cache.get(VERSION_CACHE_KEY, version)
+
+        if cls._vocabulary is None or cls._version != version:
+            with cls._lock:
+                if cls._vocabulary is None or cls._version != version:
+                    cls._vocabulary = cls._load()
+                    cls._version = version
+        return cls._vocabulary
+
+    @staticmethod
+    def _prefix_range(keys, prefix):
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + "\uffff")
+        return range(start, end)
+
+    @classmethod
+    def suggest(cls, query: str, limit: int = 20) -> list[str]:
+        """
+        Nombres de tags que encajan con `query`, mejores primero:
+
+        1. el nombre completo empieza por `query` (`"instr"` → `instrumento:…`);
+        2. el valor de una faceta empieza por `query` (`"guit"` → `instrumento:guitarra`);
+        3. `query` aparece en cualquier parte del nombre.
+
+        Si `query` es `faceta:valor` con una faceta conocida, solo se buscan
+        valores de esa faceta.
+        """
+        q = query.strip().lower()
+        if not q:
+            return []
+
+        vocab = cls.vocabulary()
+        seen = set()
+        results = []
+
+        def push(name):
+            if name not in seen:
+                seen.add(name)
+                results.append(name)
+            return len(results) >= limit
+
+        faceta, valor = facets.parse(q)
+        if faceta is None and q.endswith(facets.SEPARADOR) and q[:-1] in facets.FACETAS:
+            faceta, valor = q[:-1], ""
+
+        if faceta is not None:
+            for i in cls._prefix_range(vocab.keys, f"{faceta}{facets.SEPARADOR}{valor}"):
+                if push(vocab.names[i][1]):
+                    return results
+            for valor_tag, faceta_tag, name in vocab.facet_values:
+                if faceta_tag == faceta and valor in valor_tag and push(name):
+                    return results
+            return results
+
+        for i in cls._prefix_range(vocab.keys, q):
+            if push(vocab.names[i][1]):
+                return results
+        for i in cls._prefix_range(vocab.facet_value_keys, q):
+            if push(vocab.facet_values[i][2]):
+                return results
+        for key, name in vocab.names:
+            if q in key and push(name):
+                return results
+        return results
+
+    @classmethod
+    def find_existing(cls, tag_name: str) -> str | None:
+        """Nombre canónico de la tag de taggit que coincide sin distinguir mayúsculas."""
+        return cls.vocabulary().taggit_exact.get(tag_name.strip().lower())
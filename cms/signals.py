@@ -0,0 +1,31 @@
+"""
+Señales: mantener `TagUsage` al día cuando se añaden o quitan tags de taggit,
+y caducar el vocabulario del autocompletado cuando se crean, renombran o
+borran tags.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from taggit.models import Tag, TaggedItem
+
+from .models import MusicTag, TagUsage
+from .services.tag_suggestions import TagSuggestionService
+
+
+@receiver(post_save, sender=TaggedItem, dispatch_uid="cms_tag_usage_added")
+def on_tagged_item_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        TagUsage.bump(instance.tag_id, instance.content_type_id, 1)
+
+
+@receiver(post_delete, sender=TaggedItem, dispatch_uid="cms_tag_usage_removed")
+def on_tagged_item_deleted(sender, instance, **kwargs):
+    TagUsage.bump(instance.tag_id, instance.content_type_id, -1)
+
+
+@receiver(post_save, sender=Tag, dispatch_uid="cms_tag_vocabulary_tag_saved")
+@receiver(post_delete, sender=Tag, dispatch_uid="cms_tag_vocabulary_tag_deleted")
+@receiver(post_save, sender=MusicTag, dispatch_uid="cms_tag_vocabulary_musictag_saved")
+@receiver(post_delete, sender=MusicTag, dispatch_uid="cms_tag_vocabulary_musictag_deleted")
+def on_tag_vocabulary_changed(sender, **kwargs):
+    TagSuggestionService.invalidate_on_commit()
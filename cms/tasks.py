@@ -0,0 +1,21 @@
+"""
+Huey tasks for the cms app.
+"""
+
+import logging
+
+from huey.contrib.djhuey import db_task
+
+logger = logging.getLogger(__name__)
+
+
+@db_task()
+def run_ai_publish_job(job_id: str):
+    """Extrae la metadata con IA y crea la página de un AIPublishJob."""
+    from cms.services.ai_publish_jobs import run_job
+
+    job = run_job(job_id)
+    if job is None:
+        logger.warning("AIPublishJob %s no encontrado", job_id)
+        return
+    logger.info("AIPublishJob %s terminado con estado %s", job_id, job.status)
@@ -0,0 +1,114 @@
+"""Tests para la publicación con IA en segundo plano (POST /api/cms/ai-publish)."""
+
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from wagtail.models import Page
+
+from cms.models import AIPublishJob, MusicLibraryIndexPage, ScorePage
+from cms.services import ai_publish_jobs
+
+User = get_user_model()
+
+METADATA = {
+    "title": "Suite en Re",
+    "composer": "",
+    "categories": [],
+    "tags": [],
+}
+
+
+class AIPublishJobTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_superuser(
+            email="ai-admin@example.com",
+            password="testpassword123",
+        )
+        self.client.force_login(self.user)
+
+        root_page = Page.objects.filter(depth=1).first()
+        self.index = MusicLibraryIndexPage(title="Biblioteca", slug="biblioteca-ai")
+        root_page.add_child(instance=self.index)
+        self.index.save_revision().publish()
+
+    def _post(self):
+        pdf = SimpleUploadedFile("suite.pdf", b"%PDF-1.4 test", content_type="application/pdf")
+        with mock.patch("cms.tasks.run_ai_publish_job") as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    "/api/cms/ai-publish",
+                    data={"description": "Suite en Re para guitarra", "pdf_files": [pdf]},
+                )
+        return response, task
+
+    def test_post_encola_el_job_y_responde_202(self):
+        response, task = self._post()
+
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        job = AIPublishJob.objects.get(pk=data["job_id"])
+        self.assertEqual(data["status"], AIPublishJob.Status.PENDING)
+        self.assertEqual(data["status_url"], f"/api/cms/ai-publish/jobs/{job.pk}")
+        task.assert_called_once_with(str(job.pk))
+        self.assertEqual([entry["name"] for entry in job.files], ["suite.pdf"])
+        self.assertTrue(default_storage.exists(job.files[0]["path"]))
+        self.assertFalse(ScorePage.objects.exists())
+
+    def test_post_sin_archivos_devuelve_400(self):
+        response = self.client.post("/api/cms/ai-publish", data={"description": "Algo"})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(AIPublishJob.objects.exists())
+
+    def test_el_job_crea_la_pagina_y_expone_el_resultado(self):
+        response, _ = self._post()
+        job_id = response.json()["job_id"]
+
+        with mock.patch("cms.services.ai_publish_jobs.AIMetadataExtractor") as extractor:
+            extractor.return_value.extract_metadata.return_value = dict(METADATA)
+            ai_publish_jobs.run_job(job_id)
+
+        job = AIPublishJob.objects.get(pk=job_id)
+        self.assertEqual(job.status, AIPublishJob.Status.DONE)
+        self.assertEqual(job.progress, 100)
+        page = ScorePage.objects.get(pk=job.result["score_page_id"])
+        self.assertEqual(page.title, "Suite en Re")
+        self.assertEqual(page.get_parent().pk, self.index.pk)
+        self.assertFalse(default_storage.exists(job.files[0]["path"]))
+
+        status = self.client.get(f"/api/cms/ai-publish/jobs/{job_id}").json()
+        self.assertEqual(status["status"], "done")
+        self.assertEqual(status["result"]["title"], "Suite en Re")
+        self.assertEqual(status["result"]["edit_url"], f"/cms/pages/{page.pk}/edit/")
+
+    def test_error_de_la_ia_queda_registrado_en_el_job(self):
+        response, _ = self._post()
+        job_id = response.json()["job_id"]
+
+        with mock.patch("cms.services.ai_publish_jobs.AIMetadataExtractor") as extractor:
+            extractor.return_value.extract_metadata.side_effect = RuntimeError("cuota agotada")
+            ai_publish_jobs.run_job(job_id)
+
+        status = self.client.get(f"/api/cms/ai-publish/jobs/{job_id}").json()
+        self.assertEqual(status["status"], "error")
+        self.assertIn("cuota agotada", status["error"])
+        self.assertIsNone(status["result"])
+        self.assertFalse(ScorePage.objects.exists())
+
+    def test_no_se_ve_el_job_de_otro_usuario(self):
+        response, _ = self._post()
+        job_id = response.json()["job_id"]
+
+        other = User.objects.create_superuser(email="otro@example.com", password="testpassword123")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f"/api/cms/ai-publish/jobs/{job_id}").status_code, 404)
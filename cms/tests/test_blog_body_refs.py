@@ -0,0 +1,71 @@
+"""Tests para las referencias del body de BlogPage extraídas al guardar."""
+
+from django.test import TestCase
+from wagtail.images.models import Image
+from wagtail.images.tests.utils import get_test_image_file
+from wagtail.models import Collection, Page
+
+from cms.models import BlogIndexPage, BlogPage
+from cms.richtext_refs import extract_body_refs
+
+
+class ExtractBodyRefsTest(TestCase):
+    def test_extrae_imagenes_y_media_en_orden(self):
+        body = (
+            '<p>Intro</p>'
+            '<embed alt="uno" embedtype="image" format="fullwidth" id="12"/>'
+            '<embed embedtype="media" url="https://www.youtube.com/watch?v=abc&amp;t=5"/>'
+            '<embed id="7" embedtype="image" format="left"/>'
+        )
+        self.assertEqual(
+            extract_body_refs(body),
+            {"images": [12, 7], "embeds": ["https://www.youtube.com/watch?v=abc&t=5"]},
+        )
+
+    def test_body_vacio_o_sin_embeds(self):
+        self.assertEqual(extract_body_refs(""), {"images": [], "embeds": []})
+        self.assertEqual(extract_body_refs("<p>texto</p>"), {"images": [], "embeds": []})
+
+
+class BlogPageBodyRefsTest(TestCase):
+    def setUp(self):
+        if not Collection.objects.exists():
+            Collection.add_root(name="Root")
+        root = Page.objects.filter(depth=1).first()
+        self.blog_index = BlogIndexPage(title="Libro", slug="libro-body-refs")
+        root.add_child(instance=self.blog_index)
+
+        self.image = Image.objects.create(title="Figura 1", file=get_test_image_file())
+        self.page = BlogPage(
+            title="Capítulo 1",
+            slug="capitulo-1-body-refs",
+            date="2026-01-01",
+            intro="intro",
+            body=(
+                f'<embed alt="" embedtype="image" format="fullwidth" id="{self.image.pk}"/>'
+                '<embed embedtype="media" url="https://youtu.be/xyz"/>'
+            ),
+        )
+        self.blog_index.add_child(instance=self.page)
+
+    def test_guardar_rellena_body_refs(self):
+        page = BlogPage.objects.get(pk=self.page.pk)
+        self.assertEqual(page.body_refs, {"images": [self.image.pk], "embeds": ["https://youtu.be/xyz"]})
+
+        page.body = "<p>sin imágenes</p>"
+        page.save(update_fields=["body"])
+        page.refresh_from_db()
+        self.assertEqual(page.body_refs, {"images": [], "embeds": []})
+
+    def test_get_images_y_get_embeds_no_parsean_ni_repiten_consultas(self):
+        page = BlogPage.objects.get(pk=self.page.pk)
+        self.assertEqual(page.get_images(), [self.image])
+        with self.assertNumQueries(0):
+            self.assertEqual(page.get_images(), [self.image])
+            self.assertEqual([e.url for e in page.get_embeds()], ["https://youtu.be/xyz"])
+
+    def test_filas_antiguas_sin_body_refs_usan_la_regex(self):
+        BlogPage.objects.filter(pk=self.page.pk).update(body_refs={})
+        page = BlogPage.objects.get(pk=self.page.pk)
+        self.assertEqual(page.get_body_image_ids(), [self.image.pk])
+        self.assertEqual(page.get_body_embed_urls(), ["https://youtu.be/xyz"])
@@ -0,0 +1,136 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from wagtail.documents.models import Document
+from wagtail.embeds.models import Embed
+from wagtail.images.models import Image
+from wagtail.images.tests.utils import get_test_image_file
+from wagtail.models import Collection
+
+from cms.models import TagUsage
+from cms.services.resource_search import ResourceSearchService
+
+
+class ResourceSearchServiceTest(TestCase):
+    def setUp(self):
+        if not Collection.objects.exists():
+            Collection.add_root(name="Root")
+        now = timezone.now()
+
+        self.doc_old = self._doc("Partitura antigua", "antigua.pdf", now - datetime.timedelta(days=3))
+        self.audio = self._doc("Audio ensayo", "ensayo.mp3", now - datetime.timedelta(days=1))
+        self.image = Image.objects.create(
+            title="Foto partitura",
+            file=get_test_image_file(),
+        )
+        Image.objects.filter(pk=self.image.pk).update(created_at=now - datetime.timedelta(days=2))
+        self.embed = Embed.objects.create(
+            url="https://youtu.be/partitura",
+            max_width=None,
+            hash="abc",
+            type="video",
+            html="<iframe></iframe>",
+            title="",
+            last_updated=now,
+        )
+        self.doc_old.tags.add("Jazz")
+
+    def _doc(self, title, name, created_at):
+        doc = Document.objects.create(title=title, file=SimpleUploadedFile(name, b"fake"))
+        Document.objects.filter(pk=doc.pk).update(created_at=created_at)
+        return doc
+
+    def test_results_are_ordered_by_date_across_types(self):
+        results = list(ResourceSearchService.search())
+        self.assertEqual(
+            [r["id"] for r in results],
+            [f"emb_{self.embed.pk}", f"doc_{self.audio.pk}", f"img_{self.image.pk}", f"doc_{self.doc_old.pk}"],
+        )
+        self.assertEqual(results[0]["title"], self.embed.url)
+        self.assertEqual(results[1]["icon"], "🎵")
+
+    def test_count_and_slice_run_in_the_database(self):
+        results = ResourceSearchService.search(query="partitura")
+        with self.assertNumQueries(1):
+            self.assertEqual(results.count(), 3)
+
+        # UNION paginado + (objetos, tags) por cada tipo presente en la página
+        with self.assertNumQueries(5):
+            page = results[1:3]
+        self.assertEqual([r["type"] for r in page], ["image", "document"])
+
+    def test_type_and_tag_filters(self):
+        self.assertEqual(ResourceSearchService.search(type_filter="image").count(), 1)
+        results = list(ResourceSearchService.search(tags=["jazz"]))
+        self.assertEqual([r["id"] for r in results], [f"doc_{self.doc_old.pk}"])
+
+    def test_view_reports_total_results(self):
+        user = get_user_model().objects.create_user(email="teacher@example.com", password="x")
+        self.client.force_login(user)
+        response = self.client.get(reverse("resource_library"), {"q": "partitura"}, HTTP_HX_REQUEST="true")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["total_results"], 3)
+        self.assertEqual(len(response.context["results"]), 3)
+
+
+class TagUsageTest(TestCase):
+    def setUp(self):
+        if not Collection.objects.exists():
+            Collection.add_root(name="Root")
+        self.doc = Document.objects.create(title="Blues en Mi", file=SimpleUploadedFile("blues.pdf", b"fake"))
+        self.other = Document.objects.create(title="Escala", file=SimpleUploadedFile("escala.pdf", b"fake"))
+        self.image = Image.objects.create(title="Blues foto", file=get_test_image_file())
+
+    def _usage(self, name, model):
+        usage = TagUsage.objects.filter(tag__name=name, content_type__model=model).first()
+        return usage.count if usage else 0
+
+    def test_signals_keep_counters_current(self):
+        self.doc.tags.add("blues", "guitarra")
+        self.other.tags.add("blues")
+        self.image.tags.add("blues")
+        self.assertEqual(self._usage("blues", "document"), 2)
+        self.assertEqual(self._usage("blues", "image"), 1)
+
+        self.doc.tags.remove("blues")
+        self.other.tags.clear()
+        self.assertEqual(self._usage("blues", "document"), 0)
+        self.assertEqual(self._usage("guitarra", "document"), 1)
+
+        self.doc.delete()
+        self.assertEqual(self._usage("guitarra", "document"), 0)
+
+    def test_rebuild_matches_signal_counts(self):
+        self.doc.tags.add("blues", "guitarra")
+        self.image.tags.add("blues")
+        before = sorted(TagUsage.objects.values_list("tag__name", "content_type__model", "count"))
+        TagUsage.objects.update(count=99)
+        TagUsage.rebuild()
+        after = sorted(TagUsage.objects.values_list("tag__name", "content_type__model", "count"))
+        self.assertEqual(before, after)
+
+    def test_unfiltered_facets_read_counters(self):
+        self.doc.tags.add("blues")
+        self.image.tags.add("blues")
+        self.other.tags.add("escalas")
+        facets = ResourceSearchService.tag_facets()
+        self.assertEqual(facets, [{"name": "blues", "count": 2}, {"name": "escalas", "count": 1}])
+
+    def test_filtered_facets_narrow_to_results(self):
+        self.doc.tags.add("blues", "guitarra")
+        self.other.tags.add("escalas")
+        self.image.tags.add("blues")
+
+        facets = ResourceSearchService.tag_facets(query="blues", type_filter="document")
+        self.assertEqual(facets, [{"name": "blues", "count": 1}, {"name": "guitarra", "count": 1}])
+
+        facets = ResourceSearchService.tag_facets(tags=["escalas"])
+        self.assertEqual(facets, [{"name": "escalas", "count": 1}])
+
+        # Las tags seleccionadas se mantienen visibles aunque no queden resultados
+        facets = ResourceSearchService.tag_facets(tags=["escalas", "piano"])
+        self.assertEqual(facets, [{"name": "escalas", "count": 0}, {"name": "piano", "count": 0}])
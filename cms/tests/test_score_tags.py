@@ -0,0 +1,73 @@
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from wagtail.documents.models import Document
+from wagtail.images.models import Image
+from wagtail.images.tests.utils import get_test_image_file
+from wagtail.models import Collection, Page
+
+from cms.models import MusicLibraryIndexPage, MusicTag, ScorePage
+
+
+class ScorePageAllTagsTest(TestCase):
+    def setUp(self):
+        if not Collection.objects.exists():
+            Collection.add_root(name="Root")
+        root = Page.objects.get(id=2)
+        self.index = MusicLibraryIndexPage(title="Biblioteca", slug="biblioteca-tags")
+        root.add_child(instance=self.index)
+
+        self.pdf = Document.objects.create(title="Partitura", file=SimpleUploadedFile("p.pdf", b"pdf"))
+        self.pdf.tags.add("lectura", "3/4")
+        self.audio = Document.objects.create(title="Audio", file=SimpleUploadedFile("a.mp3", b"mp3"))
+        self.audio.tags.add("Lectura", "escucha")
+        self.image = Image.objects.create(title="Foto", file=get_test_image_file())
+        self.image.tags.add("portada")
+        self.jazz = MusicTag.objects.create(name="Jazz")
+
+        self.scores = [self._score(f"Pieza {i}") for i in range(3)]
+
+    def _score(self, title):
+        content = [
+            {"type": "pdf_score", "value": {"title": "PDF", "pdf_file": self.pdf.pk}},
+            {"type": "audio", "value": {"title": "Audio", "audio_file": self.audio.pk}},
+            {"type": "image", "value": {"title": "Img", "image": self.image.pk}},
+        ]
+        score = ScorePage(title=title, content=json.dumps(content))
+        self.index.add_child(instance=score)
+        score.tags.add(self.jazz)
+        score.save()
+        return score
+
+    def test_get_all_tags_merges_and_deduplicates(self):
+        score = ScorePage.objects.get(pk=self.scores[0].pk)
+        names = [tag.name for tag in score.get_all_tags()]
+        self.assertEqual(names, ["Jazz", "3/4", "lectura", "escucha", "portada"])
+        self.assertEqual([t.name for t in score.get_media_tags()], ["3/4", "lectura", "escucha", "portada"])
+
+    def test_bulk_prefetch_uses_constant_queries(self):
+        for extra in range(3):
+            self._score(f"Extra {extra}")
+        pages = list(ScorePage.objects.all())
+        self.assertEqual(len(pages), 6)
+
+        with self.assertNumQueries(2):
+            ScorePage.prefetch_all_tags(pages)
+        with self.assertNumQueries(0):
+            for page in pages:
+                self.assertEqual(len(page.all_tags), 5)
+
+    def test_prefetched_direct_tags_are_reused(self):
+        pages = list(ScorePage.objects.prefetch_related("tags"))
+        with self.assertNumQueries(1):
+            ScorePage.prefetch_all_tags(pages)
+
+    def test_filtered_scores_by_document_tags(self):
+        lonely = ScorePage(title="Sin medios", content="[]")
+        self.index.add_child(instance=lonely)
+
+        response = self.client.get(reverse("filtered_scores"), {"document_tags": "ESCUCHA,otra"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["total_results"], 3)
@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from taggit.models import Tag
+
+from cms.models import MusicTag
+from cms.services.tag_suggestions import TagSuggestionService
+
+
+class TagSuggestionServiceTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for name in ("guitarra", "instrumento:guitarra", "instrumento:piano", "estilo:blues", "Blues Rock", "3/4"):
+            Tag.objects.create(name=name)
+        MusicTag.objects.create(name="Blues")
+        MusicTag.objects.create(name="Bajo eléctrico")
+
+    def test_prefix_matches_rank_first(self):
+        self.assertEqual(
+            TagSuggestionService.suggest("blu"),
+            ["Blues", "Blues Rock", "estilo:blues"],
+        )
+
+    def test_facet_values_are_prefix_matches(self):
+        self.assertEqual(
+            TagSuggestionService.suggest("guit"),
+            ["guitarra", "instrumento:guitarra"],
+        )
+
+    def test_facet_query_restricts_to_the_facet(self):
+        self.assertEqual(
+            TagSuggestionService.suggest("instrumento:"),
+            ["instrumento:guitarra", "instrumento:piano"],
+        )
+        self.assertEqual(TagSuggestionService.suggest("instrumento:pi"), ["instrumento:piano"])
+
+    def test_merges_music_tags(self):
+        self.assertEqual(TagSuggestionService.suggest("bajo"), ["Bajo eléctrico"])
+
+    def test_substring_matches_come_last(self):
+        self.assertEqual(TagSuggestionService.suggest("/4"), ["3/4"])
+
+    def test_served_from_memory_until_tags_change(self):
+        TagSuggestionService.suggest("pia")
+        with self.assertNumQueries(0):
+            self.assertEqual(TagSuggestionService.suggest("pia"), ["instrumento:piano"])
+
+        Tag.objects.create(name="piano")
+        self.assertEqual(TagSuggestionService.suggest("pia"), ["piano", "instrumento:piano"])
+
+        MusicTag.objects.filter(name="Blues").delete()
+        MusicTag.objects.create(name="Piano solo")
+        self.assertEqual(TagSuggestionService.suggest("pia"), ["piano", "Piano solo", "instrumento:piano"])
+
+    def test_find_existing_is_case_insensitive(self):
+        self.assertEqual(TagSuggestionService.find_existing("BLUES ROCK"), "Blues Rock")
+        self.assertIsNone(TagSuggestionService.find_existing("bajo eléctrico"))
+
+    def test_suggest_tags_endpoint(self):
+        staff = get_user_model().objects.create_user(email="staff@example.com", password="x", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse("my_library:suggest_tags"), {"q": "guit"})
+        self.assertEqual(response.json(), ["guitarra", "instrumento:guitarra"])
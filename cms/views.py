@@ -36,7 +36,7 @@ def filtered_scores_view(request):
     category_names = [name.strip() for name in category_names if name.strip()]
 
     # Comenzar con todas las ScorePages publicadas
-    scores = ScorePage.objects.live().order_by("-first_published_at")
+    scores = ScorePage.objects.live().prefetch_related("tags").order_by("-first_published_at")
 
     # Filtrar por etiquetas de página
     if tag_names:
@@ -57,80 +57,16 @@ def filtered_scores_view(request):
     document_tag_names = [name.strip() for name in document_tag_names if name.strip()]
 
     if document_tag_names:
-        # Filtrar scores que tengan documentos con las etiquetas especificadas
-        filtered_score_ids = []
-        for score in scores:
-            has_matching_tags = False
-
-            # Verificar PDFs
-            pdf_blocks = score.get_pdf_blocks()
-            audio_blocks = score.get_audios()
-
-            # Buscar en PDFs
-            for pdf_block in pdf_blocks:
-                # Acceder al archivo PDF usando la clave del diccionario
-                if "pdf_file" in pdf_block and pdf_block["pdf_file"]:
-                    try:
-                        pdf_document = pdf_block["pdf_file"]
-                        if hasattr(pdf_document, "tags"):
-                            pdf_tags = [
-                                tag.name.lower() for tag in pdf_document.tags.all()
-                            ]
-                            # Verificar si CUALQUIERA de las etiquetas buscadas está presente
-                            if any(
-                                tag_name.lower() in pdf_tags
-                                for tag_name in document_tag_names
-                            ):
-                                has_matching_tags = True
-                                break
-                    except AttributeError:
-                        continue
-
-            # Buscar en Audios si no se encontró en PDFs
-            if not has_matching_tags:
-                for audio_block in audio_blocks:
-                    if "audio_file" in audio_block and audio_block["audio_file"]:
-                        try:
-                            audio_document = audio_block["audio_file"]
-                            if hasattr(audio_document, "tags"):
-                                audio_tags = [
-                                    tag.name.lower()
-                                    for tag in audio_document.tags.all()
-                                ]
-                                # Verificar si CUALQUIERA de las etiquetas buscadas está presente
-                                if any(
-                                    tag_name.lower() in audio_tags
-                                    for tag_name in document_tag_names
-                                ):
-                                    has_matching_tags = True
-                                    break
-                        except AttributeError:
-                            continue
-
-            # Buscar en Imágenes si no se encontró en PDFs ni Audios
-            if not has_matching_tags:
-                image_blocks = score.get_images()
-                for image_block in image_blocks:
-                    if "image" in image_block and image_block["image"]:
-                        try:
-                            image_document = image_block["image"]
-                            if hasattr(image_document, "tags"):
-                                image_tags = [
-                                    tag.name.lower()
-                                    for tag in image_document.tags.all()
-                                ]
-                                # Verificar si CUALQUIERA de las etiquetas buscadas está presente
-                                if any(
-                                    tag_name.lower() in image_tags
-                                    for tag_name in document_tag_names
-                                ):
-                                    has_matching_tags = True
-                                    break
-                        except AttributeError:
-                            continue
-
-            if has_matching_tags:
-                filtered_score_ids.append(score.id)
+        # Filtrar scores que tengan PDFs, audios o imágenes con CUALQUIERA de
+        # las etiquetas buscadas. Las tags de todos los medios se cargan en
+        # bloque, no documento a documento.
+        wanted = {tag_name.lower() for tag_name in document_tag_names}
+        candidates = ScorePage.prefetch_all_tags(scores)
+        filtered_score_ids = [
+            score.id
+            for score in candidates
+            if wanted & {tag.name.lower() for tag in score.get_media_tags()}
+        ]
 
         scores = scores.filter(id__in=filtered_score_ids)
 
@@ -162,6 +98,7 @@ def filtered_scores_view(request):
     paginator = Paginator(scores, 12)  # 12 scores por página
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
+    ScorePage.prefetch_all_tags(page_obj.object_list)
 
     # Preparar contexto
     context = {
@@ -353,9 +290,8 @@ def update_scores_order(request):
 
 
 from .services.resource_search import ResourceSearchService
+from .services.tag_suggestions import TagSuggestionService
 from .models import SavedResourceFilter
-from taggit.models import Tag as TaggitTag
-from django.db.models import Q
 
 
 def _parse_tag_list(tags: list) -> list:
@@ -375,10 +311,7 @@ def resource_library_view(request):
 
     # Handle sidebar tags partial refresh
     if request.GET.get('_partial') == 'sidebar_tags':
-        all_tags = TaggitTag.objects.filter(
-            Q(taggit_taggeditem_items__content_type__model='document') |
-            Q(taggit_taggeditem_items__content_type__model='image')
-        ).distinct().order_by('name')
+        all_tags = ResourceSearchService.tag_facets(query=query, type_filter=type_filter, tags=tags)
         return render(request, "cms/resource_library/partials/sidebar_tags.html", {
             'all_tags': all_tags,
             'current_tags': tags,
@@ -398,19 +331,18 @@ def resource_library_view(request):
         'current_type': type_filter,
         'current_tags': tags,
         'saved_filters': saved_filters,
-        'total_results': len(results),
+        'total_results': paginator.count,
         'page_title': 'Biblioteca de Recursos'
     }
 
+    # Facetas: contadores de tags restringidos a los resultados actuales
+    context['all_tags'] = ResourceSearchService.tag_facets(query=query, type_filter=type_filter, tags=tags)
+
     if is_htmx:
+        # La barra lateral se actualiza fuera de banda junto con los resultados
+        context['sidebar_tags_oob'] = True
         return render(request, "cms/resource_library/results.html", context)
 
-    # Solo calcular all_tags para la página completa (no HTMX partials)
-    context['all_tags'] = TaggitTag.objects.filter(
-        Q(taggit_taggeditem_items__content_type__model='document') |
-        Q(taggit_taggeditem_items__content_type__model='image')
-    ).distinct().order_by('name')
-
     return render(request, "cms/resource_library/index.html", context)
 
 
@@ -482,9 +414,7 @@ def tag_suggestions(request):
     item_type = request.GET.get('item_type', '')
     item_pk = request.GET.get('item_pk', '')
 
-    suggestions = []
-    if q:
-        suggestions = TaggitTag.objects.filter(name__icontains=q)[:10]
+    suggestions = TagSuggestionService.suggest(q, limit=10) if q else []
 
     return render(request, "cms/resource_library/partials/tag_suggestions.html", {
         'suggestions': suggestions,
@@ -510,7 +440,7 @@ def add_resource_tag(request):
     obj = _get_resource_object(item_type, item_pk)
 
     # Check if this is a new tag
-    is_new_tag = not TaggitTag.objects.filter(name__iexact=tag_name).exists()
+    is_new_tag = TagSuggestionService.find_existing(tag_name) is None
 
     obj.tags.add(tag_name)
 
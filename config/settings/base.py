@@ -68,6 +68,7 @@ DJANGO_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.humanize", # Handy template tags
+    "django.contrib.postgres", # Trigram lookups (búsqueda de incidencias)
     "django.contrib.admin",
     "django.forms",
 ]
@@ -443,6 +444,10 @@ GEMINI_API_KEY = env("GEMINI_API_KEY", default="")
 # ------------------------------------------------------------------------------
 GEMINI_RATE_LIMIT_HOURLY = env.int("GEMINI_RATE_LIMIT_HOURLY", default=2)
 GEMINI_ALERT_EMAIL = env("GEMINI_ALERT_EMAIL", default="")
+# Presupuesto por caller dentro del límite global, ej: "email_parser=1,card_ocr=1"
+GEMINI_RATE_LIMIT_CALLERS = env.dict("GEMINI_RATE_LIMIT_CALLERS", default={})
+# Respuestas cacheadas por contenido (martina_bescos_app/utils/llm_cache.py)
+GEMINI_CACHE_TTL = env.int("GEMINI_CACHE_TTL", default=60 * 60 * 24 * 7)
 
 # django-mailbox (Email → Incidencia)
 # ------------------------------------------------------------------------------
@@ -5,3 +5,6 @@ class IncidenciasConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "incidencias"
     verbose_name = "Incidencias Informáticas"
+
+    def ready(self):
+        from . import signals  # noqa: F401
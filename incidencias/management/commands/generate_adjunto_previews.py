@@ -0,0 +1,33 @@
+"""
+Enqueue thumbnail/preview generation for attachments that do not have them
+(e.g. uploaded before the preview pipeline existed).
+
+Usage:
+    python manage.py generate_adjunto_previews [--all]
+"""
+
+from django.core.management.base import BaseCommand
+
+from incidencias.models import Adjunto
+from incidencias.tasks import generate_adjunto_previews
+
+
+class Command(BaseCommand):
+    help = "Encola la generación de miniaturas y vistas previas de los adjuntos de incidencias"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Regenerar también las de los adjuntos que ya las tienen",
+        )
+
+    def handle(self, *args, **options):
+        adjuntos = Adjunto.objects.all()
+        if not options["all"]:
+            adjuntos = adjuntos.filter(miniatura="")
+        count = 0
+        for pk in adjuntos.values_list("pk", flat=True).iterator():
+            generate_adjunto_previews(pk)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"✓ {count} adjuntos encolados"))
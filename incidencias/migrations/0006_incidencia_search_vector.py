@@ -0,0 +1,43 @@
+# Generated by Django 5.0.11 on 2026-10-18 23:54
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Mismo documento que incidencias.services.search._search_vector
+BACKFILL_SQL = """
+UPDATE incidencias_incidencia AS i SET search_vector =
+    setweight(to_tsvector('spanish', coalesce(i.titulo, '')), 'A')
+    || setweight(to_tsvector('spanish', coalesce((
+        SELECT string_agg(e.nombre, ' ')
+        FROM incidencias_etiqueta e
+        JOIN incidencias_incidencia_etiquetas ie ON ie.etiqueta_id = e.id
+        WHERE ie.incidencia_id = i.id
+    ), '')), 'B')
+    || setweight(to_tsvector('spanish', coalesce(u.nombre, '')), 'B')
+    || setweight(to_tsvector('spanish', coalesce(u.grupo, '')), 'B')
+    || setweight(to_tsvector('spanish', coalesce(i.descripcion, '')), 'C')
+FROM incidencias_incidencia AS i2
+LEFT JOIN incidencias_ubicacion u ON u.id = i2.ubicacion_id
+WHERE i2.id = i.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('incidencias', '0005_adjunto_comentario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='incidencia',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='incidencia',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='incidencia_search_gin'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.11 on 2026-10-19 00:02
+
+import incidencias.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('incidencias', '0006_incidencia_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adjunto',
+            name='miniatura',
+            field=models.ImageField(blank=True, editable=False, upload_to=incidencias.models.adjunto_preview_path, verbose_name='Miniatura'),
+        ),
+        migrations.AddField(
+            model_name='adjunto',
+            name='vista_previa',
+            field=models.ImageField(blank=True, editable=False, upload_to=incidencias.models.adjunto_preview_path, verbose_name='Vista previa'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.11 on 2026-10-19 00:31
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+# Mismo texto que incidencias.services.search._search_text
+BACKFILL_SQL = """
+UPDATE incidencias_incidencia AS i SET search_document = concat_ws(' ',
+    i.titulo,
+    (
+        SELECT string_agg(e.nombre, ' ')
+        FROM incidencias_etiqueta e
+        JOIN incidencias_incidencia_etiquetas ie ON ie.etiqueta_id = e.id
+        WHERE ie.incidencia_id = i.id
+    ),
+    u.nombre,
+    u.grupo,
+    i.descripcion
+)
+FROM incidencias_incidencia AS i2
+LEFT JOIN incidencias_ubicacion u ON u.id = i2.ubicacion_id
+WHERE i2.id = i.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('incidencias', '0007_adjunto_previews'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='incidencia',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='incidencia',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='incidencia_search_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -1,5 +1,7 @@
 # ruff: noqa: ERA001, E501
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import FileExtensionValidator
 from django.db import models
 from django.utils.translation import gettext_lazy as _
@@ -104,11 +106,20 @@ class Incidencia(models.Model):
     )
     created_at = models.DateTimeField(_("Fecha de creación"), auto_now_add=True)
     updated_at = models.DateTimeField(_("Última actualización"), auto_now=True)
+    # Documento de búsqueda (título, etiquetas, ubicación, descripción) como
+    # tsvector y como texto plano para los trigramas; lo mantiene
+    # incidencias/services/search.py vía señales
+    search_vector = SearchVectorField(null=True, editable=False)
+    search_document = models.TextField(blank=True, default="", editable=False)
 
     class Meta:
         verbose_name = _("Incidencia")
         verbose_name_plural = _("Incidencias")
         ordering = ["-created_at"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="incidencia_search_gin"),
+            GinIndex(fields=["search_document"], name="incidencia_search_trgm", opclasses=["gin_trgm_ops"]),
+        ]
 
     def __str__(self):
         return f"[{self.get_urgencia_display()}] {self.titulo}"
@@ -145,6 +156,10 @@ def adjunto_upload_path(instance, filename):
     return f"incidencias/{instance.incidencia_id}/{filename}"
 
 
+def adjunto_preview_path(instance, filename):
+    return f"incidencias/{instance.incidencia_id}/previews/{filename}"
+
+
 class Adjunto(models.Model):
     """Archivo adjunto (foto o vídeo) de una incidencia."""
 
@@ -180,6 +195,19 @@ class Adjunto(models.Model):
             ]),
         ],
     )
+    # Generadas en segundo plano (incidencias.tasks.generate_adjunto_previews)
+    miniatura = models.ImageField(
+        _("Miniatura"),
+        upload_to=adjunto_preview_path,
+        blank=True,
+        editable=False,
+    )
+    vista_previa = models.ImageField(
+        _("Vista previa"),
+        upload_to=adjunto_preview_path,
+        blank=True,
+        editable=False,
+    )
     created_at = models.DateTimeField(_("Fecha"), auto_now_add=True)
 
     class Meta:
@@ -204,6 +232,20 @@ class Adjunto(models.Model):
         ext = self.archivo.name.rsplit(".", 1)[-1].lower()
         return ext == "pdf"
 
+    @property
+    def thumbnail_url(self):
+        """Miniatura, o el original si es una imagen sin miniatura todavía ("" si no hay)."""
+        if self.miniatura:
+            return self.miniatura.url
+        return self.archivo.url if self.is_image else ""
+
+    @property
+    def preview_url(self):
+        """Vista previa mediana (o póster/primera página), o el original si no se ha generado."""
+        if self.vista_previa:
+            return self.vista_previa.url
+        return self.archivo.url
+
 
 class Tecnico(models.Model):
     """Técnico/encargado que gestiona incidencias."""
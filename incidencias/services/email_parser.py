@@ -15,6 +15,8 @@ from django.conf import settings
 from google import genai
 
 from incidencias.services.gemini_rate_limiter import GeminiRateLimiter
+from incidencias.services.vocabulary import get_vocabulary
+from martina_bescos_app.utils import llm_cache
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +33,7 @@ class EmailIncidenciaParser:
 
     MODEL_ID = "gemini-2.0-flash"
     CALLER_NAME = "email_parser"
+    RATE_LIMIT_WAIT = 30  # seconds
 
     PROMPT_TEMPLATE = """Eres un asistente que extrae datos estructurados de emails para crear incidencias
 en un sistema de gestión de incidencias informáticas de un centro educativo (IES Martina Bescós).
@@ -94,46 +97,57 @@ REGLAS:
         subject: str,
         body: str,
         sender: str,
+        vocabulary=None,
     ) -> dict[str, Any]:
         """
         Parse an email and extract structured data for creating an Incidencia.
 
+        `vocabulary` is the ubicaciones/etiquetas snapshot to use in the prompt
+        (a fetch run passes the same one for all its messages); by default the
+        cached one.
+
         Returns a dict with keys:
             titulo, descripcion, reportero_nombre, urgencia,
             ubicacion_nombre, etiquetas, etiquetas_nuevas, es_privada
         """
-        # Check rate limit before calling Gemini
-        if not self.rate_limiter.can_call():
+        prompt = self._build_prompt(subject, body, sender, vocabulary)
+
+        # Un email ya procesado (reenvíos duplicados, reimportaciones) no gasta cuota
+        cache_key = llm_cache.make_key(self.CALLER_NAME, self.MODEL_ID, prompt)
+        cached = llm_cache.lookup(cache_key)
+        if cached is not None:
+            return cached
+
+        # Reserve a rate limit slot before calling Gemini (waits briefly if one is about to free up)
+        token = self.rate_limiter.reserve(self.CALLER_NAME, wait=self.RATE_LIMIT_WAIT)
+        if token is None:
             logger.warning("Gemini rate limit exceeded, using fallback parsing")
             return self._fallback_parse(subject, body, sender)
 
         try:
-            prompt = self._build_prompt(subject, body, sender)
-            result = self._call_gemini(prompt)
+            result = self._validate_result(self._call_gemini(prompt))
             self.rate_limiter.register_call(
                 caller=self.CALLER_NAME,
                 success=True,
             )
-            return self._validate_result(result)
+            llm_cache.store(cache_key, result)
+            return result
         except Exception:
             logger.exception("Gemini parsing failed, using fallback")
             self.rate_limiter.register_call(
                 caller=self.CALLER_NAME,
                 success=False,
                 error_message="Gemini parsing failed",
+                token=token,
             )
             return self._fallback_parse(subject, body, sender)
 
-    def _build_prompt(self, subject: str, body: str, sender: str) -> str:
+    def _build_prompt(self, subject: str, body: str, sender: str, vocabulary=None) -> str:
         """Build the Gemini prompt with context from existing data."""
-        from incidencias.models import Etiqueta, Ubicacion
-
-        ubicaciones = list(
-            Ubicacion.objects.values_list("nombre", flat=True).order_by("nombre")
-        )
-        etiquetas = list(
-            Etiqueta.objects.values_list("nombre", flat=True).order_by("nombre")
-        )
+        if vocabulary is None:
+            vocabulary = get_vocabulary()
+        ubicaciones = vocabulary.ubicaciones
+        etiquetas = vocabulary.etiquetas
 
         return self.PROMPT_TEMPLATE.format(
             subject=subject,
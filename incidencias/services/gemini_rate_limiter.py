@@ -2,51 +2,220 @@
 """
 Gemini API Rate Limiter — project-wide.
 
-Tracks and limits Gemini API calls across the entire Django project.
-Sends email alerts when usage exceeds configured thresholds.
+Limits Gemini API calls across the entire Django project with a sliding
+window of one hour kept in Redis: every call reserves a slot (a member of a
+sorted set scored by its timestamp) through a Lua script, so checking and
+reserving is a single atomic round trip shared by all Huey workers. Besides
+the global `GEMINI_RATE_LIMIT_HOURLY`, each caller can have its own budget
+in `GEMINI_RATE_LIMIT_CALLERS`.
+
+`GeminiAPIUsage` is kept as an audit log, written by a Huey task outside the
+hot path. Sends email alerts when usage exceeds the configured limit.
+
+Without a Redis cache (local development, tests) the window is kept in
+process memory.
 """
 
 import logging
+import threading
+import time
+import uuid
 from datetime import timedelta
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import send_mail
+from django.db import transaction
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
+WINDOW_SECONDS = 60 * 60
+GLOBAL_KEY = "gemini:ratelimit"
+CALLER_KEY = "gemini:ratelimit:{caller}"
+ALERT_KEY = "gemini:ratelimit:alert"
+ALERT_CALLER = "rate_limiter_alert"
+
+# KEYS: ventana global, ventana del caller
+# ARGV: ahora, ventana, límite global, límite del caller (0 = sin límite), miembro, reservar (0/1)
+# Devuelve {concedido, segundos hasta que se libere un hueco, usadas}
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local caller_limit = tonumber(ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now - window)
+local used = redis.call('ZCARD', KEYS[1])
+local caller_used = redis.call('ZCARD', KEYS[2])
+local full = false
+if used >= limit then
+  full = KEYS[1]
+elseif caller_limit > 0 and caller_used >= caller_limit then
+  full = KEYS[2]
+end
+if full then
+  local oldest = redis.call('ZRANGE', full, 0, 0, 'WITHSCORES')[2]
+  local retry = window
+  if oldest then retry = tonumber(oldest) + window - now end
+  return {0, tostring(retry), used}
+end
+if ARGV[6] == '1' then
+  redis.call('ZADD', KEYS[1], now, ARGV[5])
+  redis.call('ZADD', KEYS[2], now, ARGV[5])
+  redis.call('EXPIRE', KEYS[1], math.ceil(window))
+  redis.call('EXPIRE', KEYS[2], math.ceil(window))
+end
+return {1, '0', used}
+"""
+
+
+class _RedisWindow:
+    """Sliding window stored in Redis sorted sets."""
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+
+        self.client = get_redis_connection("default")
+        self.script = self.client.register_script(ACQUIRE_SCRIPT)
+
+    def acquire(self, keys, now, limit, caller_limit, member, reserve=True):
+        granted, retry_after, used = self.script(
+            keys=keys,
+            args=[now, WINDOW_SECONDS, limit, caller_limit, member, "1" if reserve else "0"],
+        )
+        return bool(granted), float(retry_after), int(used)
+
+    def release(self, keys, member):
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.zrem(key, member)
+        pipe.execute()
+
+
+class _LocalWindow:
+    """Same sliding window in process memory, for setups without Redis."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows = {}
+
+    def acquire(self, keys, now, limit, caller_limit, member, reserve=True):
+        with self.lock:
+            windows = []
+            for key in keys:
+                window = [entry for entry in self.windows.get(key, []) if entry[0] > now - WINDOW_SECONDS]
+                self.windows[key] = window
+                windows.append(window)
+            used = len(windows[0])
+            full = None
+            if used >= limit:
+                full = windows[0]
+            elif caller_limit > 0 and len(windows[1]) >= caller_limit:
+                full = windows[1]
+            if full is not None:
+                oldest = min((entry[0] for entry in full), default=now)
+                return False, oldest + WINDOW_SECONDS - now, used
+            if reserve:
+                for window in windows:
+                    window.append((now, member))
+            return True, 0.0, used
+
+    def release(self, keys, member):
+        with self.lock:
+            for key in keys:
+                self.windows[key] = [entry for entry in self.windows.get(key, []) if entry[1] != member]
+
+
+_local_window = _LocalWindow()
+
+
+def _window():
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend.startswith("django_redis"):
+        return _RedisWindow()
+    return _local_window
+
 
 class GeminiRateLimiter:
     """
     Centralized rate limiter for Gemini API calls.
 
-    Tracks usage via the GeminiAPIUsage model and enforces hourly limits.
-    When limits are exceeded, sends an alert email to the configured address.
+    Usage:
+        token = limiter.reserve("email_parser", wait=30)
+        if token is None:
+            ...  # sin cuota: fallback
+        try:
+            ...  # llamada a Gemini
+            limiter.register_call("email_parser", success=True)
+        except Exception:
+            limiter.register_call("email_parser", success=False, token=token)
+
+    Failed calls give their slot back, so only successful calls count toward
+    the limit.
     """
 
     def __init__(self):
         self.hourly_limit = getattr(settings, "GEMINI_RATE_LIMIT_HOURLY", 2)
+        self.caller_limits = {
+            caller: int(limit)
+            for caller, limit in getattr(settings, "GEMINI_RATE_LIMIT_CALLERS", {}).items()
+        }
         self.alert_email = getattr(settings, "GEMINI_ALERT_EMAIL", "")
+        self.window = _window()
 
-    def can_call(self) -> bool:
-        """Check if a Gemini API call is allowed within the rate limit."""
-        from incidencias.models import GeminiAPIUsage
+    def _keys(self, caller):
+        return [GLOBAL_KEY, CALLER_KEY.format(caller=caller)]
 
-        one_hour_ago = timezone.now() - timedelta(hours=1)
-        recent_calls = GeminiAPIUsage.objects.filter(
-            timestamp__gte=one_hour_ago,
-            success=True,
-        ).count()
-
-        if recent_calls >= self.hourly_limit:
+    def _acquire(self, caller, member, reserve):
+        granted, retry_after, used = self.window.acquire(
+            self._keys(caller),
+            time.time(),
+            self.hourly_limit,
+            self.caller_limits.get(caller, 0),
+            member,
+            reserve=reserve,
+        )
+        if not granted:
             logger.warning(
-                "Gemini API rate limit reached: %d/%d calls in the last hour",
-                recent_calls,
+                "Gemini API rate limit reached for %s: %d/%d calls in the last hour",
+                caller,
+                used,
                 self.hourly_limit,
             )
-            self._send_alert_if_needed(recent_calls)
-            return False
-        return True
+            self._send_alert_if_needed(used)
+        return granted, retry_after
+
+    def reserve(self, caller: str, wait: float = 0) -> str | None:
+        """
+        Reserve a slot for one Gemini call.
+
+        If there is no quota but a slot frees up within `wait` seconds, block
+        until then instead of failing.
+
+        Returns:
+            Reservation token (pass it to `register_call` / `release`), or
+            None if there is no quota.
+        """
+        member = uuid.uuid4().hex
+        deadline = time.monotonic() + wait
+        while True:
+            granted, retry_after = self._acquire(caller, member, reserve=True)
+            if granted:
+                return member
+            remaining = deadline - time.monotonic()
+            if retry_after > remaining:
+                return None
+            time.sleep(max(retry_after, 0.05))
+
+    def release(self, caller: str, token: str):
+        """Give back a reserved slot (the call was not made or failed)."""
+        self.window.release(self._keys(caller), token)
+
+    def can_call(self, caller: str = "") -> bool:
+        """Check, without reserving, if a Gemini API call is allowed within the rate limit."""
+        granted, _ = self._acquire(caller, "", reserve=False)
+        return granted
 
     def register_call(
         self,
@@ -54,19 +223,25 @@ class GeminiRateLimiter:
         success: bool = True,
         tokens_used: int = 0,
         error_message: str = "",
+        token: str | None = None,
     ):
-        """Register a Gemini API call for tracking."""
-        from incidencias.models import GeminiAPIUsage
+        """
+        Record a Gemini API call in the audit log (asynchronously). A failed
+        call releases its reservation.
+        """
+        if not success and token:
+            self.release(caller, token)
+        self._audit(caller, success, tokens_used, error_message)
 
-        GeminiAPIUsage.objects.create(
-            caller=caller,
-            success=success,
-            tokens_used=tokens_used,
-            error_message=error_message,
+    def _audit(self, caller, success, tokens_used, error_message):
+        from incidencias.tasks import record_gemini_usage
+
+        transaction.on_commit(
+            lambda: record_gemini_usage(caller, success, tokens_used, error_message)
         )
 
     def get_recent_usage(self, hours: int = 1) -> int:
-        """Get the number of successful calls in the last N hours."""
+        """Get the number of successful calls in the last N hours (from the audit log)."""
         from incidencias.models import GeminiAPIUsage
 
         since = timezone.now() - timedelta(hours=hours)
@@ -81,16 +256,8 @@ class GeminiRateLimiter:
             logger.warning("GEMINI_ALERT_EMAIL not configured, skipping alert.")
             return
 
-        from incidencias.models import GeminiAPIUsage
-
-        one_hour_ago = timezone.now() - timedelta(hours=1)
-        # Check if we already sent an alert in the last hour (avoid spam)
-        recent_alerts = GeminiAPIUsage.objects.filter(
-            timestamp__gte=one_hour_ago,
-            caller="rate_limiter_alert",
-        ).exists()
-
-        if recent_alerts:
+        # Avoid spam: one alert per hour across all workers
+        if not cache.add(ALERT_KEY, 1, WINDOW_SECONDS):
             logger.info("Alert already sent in the last hour, skipping.")
             return
 
@@ -107,13 +274,7 @@ class GeminiRateLimiter:
                 recipient_list=[self.alert_email],
                 fail_silently=True,
             )
-            # Register the alert as a special call to avoid re-sending
-            GeminiAPIUsage.objects.create(
-                caller="rate_limiter_alert",
-                success=True,
-                tokens_used=0,
-                error_message=f"Alert sent: {current_count} calls/hour",
-            )
+            self._audit(ALERT_CALLER, True, 0, f"Alert sent: {current_count} calls/hour")
             logger.info("Rate limit alert sent to %s", self.alert_email)
         except Exception:
             logger.exception("Failed to send rate limit alert email")
@@ -0,0 +1,155 @@
+# ruff: noqa: E501
+"""
+Thumbnails and previews for incidencia attachments.
+
+For every Adjunto two small images are stored next to the original (in
+`incidencias/<id>/previews/`):
+
+- `miniatura`: a small thumbnail (within 320×320) for the attachment grids;
+- `vista_previa`: a medium-size version (images), a poster frame (videos,
+  via ffmpeg) or the first page (PDFs, via pdftoppm from poppler-utils).
+
+Photos and posters are encoded as WebP; PDF pages as PNG, which keeps text
+sharp. Generation runs in a Huey task (`incidencias.tasks.generate_adjunto_previews`);
+if a tool is missing or the file cannot be read, the fields stay empty and
+the templates fall back to the original file or an icon.
+"""
+
+import io
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from contextlib import contextmanager
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (320, 320)
+PREVIEW_SIZE = (1280, 1280)
+WEBP_QUALITY = 75
+# Segundos: ffmpeg o pdftoppm colgados no deben bloquear el worker
+TOOL_TIMEOUT = 60
+# Fotograma del póster (el primero suele ser negro); si el vídeo es más corto, se usa el primero
+POSTER_AT = "1"
+
+
+@contextmanager
+def _local_path(field_file):
+    """Path of `field_file` on disk, copying it to a temporary file if the storage is remote."""
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        path = None
+    if path:
+        yield path
+        return
+    suffix = os.path.splitext(field_file.name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+        with field_file.open("rb") as source:
+            shutil.copyfileobj(source, tmp)
+        tmp.flush()
+        yield tmp.name
+
+
+def _run(command):
+    """stdout of `command`, or None if the tool is missing or fails."""
+    if shutil.which(command[0]) is None:
+        logger.warning("%s not installed, skipping preview", command[0])
+        return None
+    try:
+        result = subprocess.run(command, check=False, capture_output=True, timeout=TOOL_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        logger.warning("%s timed out after %ds", command[0], TOOL_TIMEOUT)
+        return None
+    if result.returncode != 0:
+        logger.warning("%s failed (%d): %s", command[0], result.returncode, result.stderr.decode(errors="replace")[-500:])
+        return None
+    return result.stdout
+
+
+def _open_image(data):
+    image = Image.open(io.BytesIO(data) if isinstance(data, bytes) else data)
+    # Decodifica JPEG ya reducido (mucho más rápido con fotos de móvil)
+    image.draft("RGB", PREVIEW_SIZE)
+    return ImageOps.exif_transpose(image)
+
+
+def _image_source(adjunto):
+    with adjunto.archivo.open("rb") as f:
+        image = _open_image(f)
+        image.load()
+    return image
+
+
+def _video_source(adjunto):
+    with _local_path(adjunto.archivo) as path:
+        for seek in (["-ss", POSTER_AT], []):
+            frame = _run([
+                "ffmpeg", "-v", "error", *seek, "-i", path,
+                "-frames:v", "1", "-f", "image2pipe", "-vcodec", "png", "-",
+            ])
+            if frame:
+                return _open_image(frame)
+    return None
+
+
+def _pdf_source(adjunto):
+    with _local_path(adjunto.archivo) as path, tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "page")
+        if _run([
+            "pdftoppm", "-png", "-f", "1", "-l", "1", "-singlefile",
+            "-scale-to", str(max(PREVIEW_SIZE)), path, root,
+        ]) is None:
+            return None
+        with open(f"{root}.png", "rb") as f:
+            return _open_image(f.read())
+
+
+def _encode(image, size, fmt):
+    image = image.copy()
+    image.thumbnail(size, Image.Resampling.LANCZOS)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+    buffer = io.BytesIO()
+    if fmt == "PNG":
+        image.save(buffer, "PNG", optimize=True)
+    else:
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def generate_previews(adjunto) -> bool:
+    """
+    Build and save `miniatura` and `vista_previa` for `adjunto`.
+
+    Returns:
+        True if both were saved, False if the attachment type is not
+        supported or its source image could not be produced.
+    """
+    if adjunto.is_image:
+        source, fmt = _image_source, "WEBP"
+    elif adjunto.is_video:
+        source, fmt = _video_source, "WEBP"
+    elif adjunto.is_pdf:
+        source, fmt = _pdf_source, "PNG"
+    else:
+        return False
+
+    try:
+        image = source(adjunto)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        logger.warning("Could not read attachment %s for previews", adjunto.pk, exc_info=True)
+        return False
+    if image is None:
+        return False
+
+    base = os.path.splitext(os.path.basename(adjunto.archivo.name))[0]
+    ext = fmt.lower()
+    adjunto.miniatura.save(f"{base}_thumb.{ext}", ContentFile(_encode(image, THUMBNAIL_SIZE, fmt)), save=False)
+    adjunto.vista_previa.save(f"{base}_preview.{ext}", ContentFile(_encode(image, PREVIEW_SIZE, fmt)), save=False)
+    adjunto.save(update_fields=["miniatura", "vista_previa"])
+    return True
@@ -0,0 +1,167 @@
+# ruff: noqa: E501
+"""
+Trigram similarity search over incidencias.
+
+Each Incidencia keeps its search document (título, etiquetas, ubicación and
+descripción) twice: as plain text in `search_document`, indexed with GIN
+`gin_trgm_ops` (pg_trgm), and as a weighted `search_vector` (Spanish
+full-text, título A, etiquetas and ubicación B, descripción C).
+
+Searches are ranked by `TrigramWordSimilarity`: how well the typed text
+matches some stretch of the document, so misspellings and glued words
+("proyeccor aula12") still find "Proyector del aula 12 no enciende". The
+full-text match (stems, last word as prefix) is kept as a second signal and
+breaks ties.
+
+Both are refreshed by `incidencias/signals.py` when an incidencia, its
+etiquetas or its ubicación change.
+"""
+
+import re
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchRank
+from django.contrib.postgres.search import SearchVector
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import F
+from django.db.models import Func
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models import Subquery
+from django.db.models import TextField
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+SEARCH_CONFIG = "spanish"
+WORD_RE = re.compile(r"\w+")
+MAX_TERMS = 30
+# word_similarity mínima para aparecer en la búsqueda (pg_trgm usa 0.6 por
+# defecto, demasiado para erratas; con 0.3 basta compartir un prefijo de 3 letras)
+MIN_SEARCH_SIMILARITY = 0.4
+# Por debajo, solo coinciden la ubicación o palabras sueltas de la descripción
+MIN_DUPLICATE_SIMILARITY = 0.5
+
+
+def _document_parts():
+    """(expression, full-text weight) of each part of the search document."""
+    from incidencias.models import Etiqueta
+    from incidencias.models import Ubicacion
+
+    etiquetas = (
+        Etiqueta.objects.filter(incidencias=OuterRef("pk"))
+        .order_by()
+        .values("incidencias")
+        .annotate(nombres=StringAgg("nombre", " "))
+        .values("nombres")
+    )
+    ubicacion = Ubicacion.objects.filter(pk=OuterRef("ubicacion_id")).values("nombre")
+    grupo = Ubicacion.objects.filter(pk=OuterRef("ubicacion_id")).values("grupo")
+    # Subconsultas: UPDATE no admite joins
+    return [
+        (F("titulo"), "A"),
+        (Coalesce(Subquery(etiquetas), Value(""), output_field=TextField()), "B"),
+        (Coalesce(Subquery(ubicacion), Value(""), output_field=TextField()), "B"),
+        (Coalesce(Subquery(grupo), Value(""), output_field=TextField()), "B"),
+        (F("descripcion"), "C"),
+    ]
+
+
+def _search_vector(parts):
+    vector = SearchVector(parts[0][0], weight=parts[0][1], config=SEARCH_CONFIG)
+    for expression, weight in parts[1:]:
+        vector += SearchVector(expression, weight=weight, config=SEARCH_CONFIG)
+    return vector
+
+
+def _search_text(parts):
+    return Func(Value(" "), *(expression for expression, _ in parts), function="CONCAT_WS", output_field=TextField())
+
+
+def update_search_vectors(queryset):
+    """Recompute `search_vector` and `search_document` for every incidencia in `queryset` with one UPDATE."""
+    from incidencias.models import Incidencia
+
+    parts = _document_parts()
+    return Incidencia.objects.filter(
+        pk__in=queryset.values("pk"),
+    ).update(search_vector=_search_vector(parts), search_document=_search_text(parts))
+
+
+def _words(text):
+    return WORD_RE.findall(text or "")[:MAX_TERMS]
+
+
+def build_query(text):
+    """
+    SearchQuery matching any word of `text` (the last one also as a prefix,
+    since it may be half typed), or None if `text` has no words.
+    """
+    words = [word.lower() for word in _words(text)]
+    if not words:
+        return None
+    terms = [f"'{word}'" for word in words[:-1]] + [f"'{words[-1]}':*"]
+    return SearchQuery(" | ".join(terms), search_type="raw", config=SEARCH_CONFIG)
+
+
+def _set_word_similarity_threshold(connection, threshold):
+    """
+    Threshold of the `%>` operator, which is what lets Postgres use the
+    trigram index. It is a setting, not part of the query: set it local to
+    the current transaction (the request's, with ATOMIC_REQUESTS) so it does
+    not stay on a reused connection.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", [str(threshold)])
+
+
+def search(queryset, text, min_similarity=MIN_SEARCH_SIMILARITY):
+    """
+    Incidencias of `queryset` similar to `text` (trigram word similarity of
+    at least `min_similarity`, or a full-text match), annotated with
+    `similarity` (0 to 1, higher = more similar) and the full-text `rank`.
+    Empty queryset if `text` has no words.
+    """
+    words = _words(text)
+    if not words:
+        return queryset.none()
+    text = " ".join(words)
+    query = build_query(text)
+    connection = connections[queryset.db]
+    if connection.in_atomic_block:
+        _set_word_similarity_threshold(connection, min_similarity)
+        similar = Q(search_document__trigram_word_similar=text)
+    else:
+        # Sin transacción el umbral no llegaría a la consulta: se filtra sin índice
+        similar = Q(similarity__gte=min_similarity)
+    return queryset.annotate(
+        similarity=TrigramWordSimilarity(text, "search_document"),
+        rank=SearchRank(F("search_vector"), query),
+    ).filter(similar | Q(search_vector=query))
+
+
+def legacy_search(queryset, text):
+    """Substring search, used when the similarity search finds nothing (e.g. very short fragments)."""
+    return queryset.filter(
+        Q(titulo__icontains=text)
+        | Q(descripcion__icontains=text)
+        | Q(etiquetas__nombre__icontains=text)
+        | Q(ubicacion__nombre__icontains=text)
+        | Q(ubicacion__grupo__icontains=text),
+    ).distinct()
+
+
+def find_similar(queryset, text, limit=5):
+    """
+    Open incidencias of `queryset` most similar to `text` (título and
+    descripción of a new report), best match first.
+    """
+    from incidencias.models import Incidencia
+
+    return list(
+        search(queryset.exclude(estado=Incidencia.Estado.RESUELTA), text, MIN_DUPLICATE_SIMILARITY)
+        .filter(similarity__gte=MIN_DUPLICATE_SIMILARITY)
+        .select_related("ubicacion")
+        .order_by("-similarity", "-rank", "-created_at")[:limit],
+    )
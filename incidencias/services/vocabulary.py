@@ -0,0 +1,144 @@
+# ruff: noqa: E501
+"""
+Vocabulary snapshot for email-to-incidencia processing.
+
+The Gemini prompt lists every Ubicacion and Etiqueta name, and every parsed
+email has to map the names Gemini answers back to rows. The snapshot holds
+both lists plus normalized name → id maps; it is kept in the cache
+(invalidated by `incidencias/signals.py` when an Ubicacion or Etiqueta is
+saved or deleted) and a fetch run reuses a single snapshot for all its
+messages.
+"""
+
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = "incidencias:vocabulary"
+
+
+def normalize(name) -> str:
+    """Lookup form of a name (case and surrounding spaces ignored, like `iexact`)."""
+    return str(name or "").strip().casefold()
+
+
+class Vocabulary:
+    """Ubicacion and Etiqueta names and their normalized lookup maps."""
+
+    def __init__(self, ubicaciones, etiquetas):
+        """
+        Args:
+            ubicaciones: (id, nombre) pairs in the model's default ordering
+            etiquetas: (id, nombre) pairs in the model's default ordering
+        """
+        self.ubicaciones = sorted(nombre for _, nombre in ubicaciones)
+        self.etiquetas = sorted(nombre for _, nombre in etiquetas)
+        self.ubicacion_ids = {}
+        for pk, nombre in ubicaciones:
+            self.ubicacion_ids.setdefault(normalize(nombre), pk)
+        self.etiqueta_ids = {}
+        for pk, nombre in etiquetas:
+            self.etiqueta_ids.setdefault(normalize(nombre), pk)
+
+    def ubicacion_id(self, nombre):
+        """Id of the Ubicacion called `nombre` (first one, like `.filter(nombre__iexact=...).first()`)."""
+        return self.ubicacion_ids.get(normalize(nombre)) if nombre else None
+
+
+def build_vocabulary() -> Vocabulary:
+    from incidencias.models import Etiqueta, Ubicacion
+
+    return Vocabulary(
+        ubicaciones=list(Ubicacion.objects.values_list("pk", "nombre")),
+        etiquetas=list(Etiqueta.objects.values_list("pk", "nombre")),
+    )
+
+
+def get_vocabulary() -> Vocabulary:
+    """Cached snapshot, built on first use after an invalidation."""
+    vocabulary = cache.get(CACHE_KEY)
+    if vocabulary is None:
+        vocabulary = build_vocabulary()
+        cache.set(CACHE_KEY, vocabulary, None)
+    return vocabulary
+
+
+def invalidate_vocabulary():
+    """
+    Drop the cached snapshot now (this transaction sees its own changes) and
+    again once it commits (another process may have rebuilt it meanwhile).
+    """
+    cache.delete(CACHE_KEY)
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+
+
+def _unique_slugs(nombres):
+    from incidencias.models import Etiqueta
+
+    base = {nombre: slugify(nombre)[:90] or "etiqueta" for nombre in nombres}
+    condition = Q()
+    for slug in set(base.values()):
+        condition |= Q(slug__startswith=slug)
+    taken = set(Etiqueta.objects.filter(condition).values_list("slug", flat=True))
+    slugs = {}
+    for nombre, slug in base.items():
+        candidate, n = slug, 1
+        while candidate in taken:
+            n += 1
+            candidate = f"{slug}-{n}"
+        taken.add(candidate)
+        slugs[nombre] = candidate
+    return slugs
+
+
+def resolve_etiquetas(vocabulary: Vocabulary, existing, new=(), created=None):
+    """
+    Ids of the etiquetas named in `existing` (unknown names are ignored) and
+    `new` (created in bulk if they do not exist yet).
+
+    Created etiquetas are recorded in `created` (normalized name → id), not in
+    `vocabulary`: the caller merges them into the snapshot once its
+    transaction is saved, so a rolled-back message leaves no dangling ids.
+
+    Returns:
+        list of Etiqueta ids, without duplicates
+    """
+    from incidencias.models import Etiqueta
+
+    ids = []
+    for nombre in existing:
+        pk = vocabulary.etiqueta_ids.get(normalize(nombre))
+        if pk is not None and pk not in ids:
+            ids.append(pk)
+
+    missing = {}
+    for nombre in new:
+        nombre = str(nombre or "").strip()[:100]
+        key = normalize(nombre)
+        if not key:
+            continue
+        pk = vocabulary.etiqueta_ids.get(key)
+        if pk is None:
+            missing.setdefault(key, nombre)
+        elif pk not in ids:
+            ids.append(pk)
+
+    if missing:
+        slugs = _unique_slugs(missing.values())
+        etiquetas = Etiqueta.objects.bulk_create(
+            [Etiqueta(nombre=nombre, slug=slugs[nombre]) for nombre in missing.values()]
+        )
+        for etiqueta in etiquetas:
+            if created is not None:
+                created[normalize(etiqueta.nombre)] = etiqueta.pk
+            ids.append(etiqueta.pk)
+        # bulk_create no envía post_save
+        invalidate_vocabulary()
+        logger.info("Created %d etiqueta(s): %s", len(etiquetas), ", ".join(missing.values()))
+
+    return ids
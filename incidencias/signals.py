@@ -0,0 +1,61 @@
+"""
+Señales:
+- invalidar el vocabulario cacheado (ubicaciones y etiquetas) que usa el
+  procesado de emails cuando cambia alguna ubicación o etiqueta;
+- mantener el documento de búsqueda (`Incidencia.search_vector` y
+  `search_document`) al día;
+- encolar la generación de miniaturas de cada adjunto nuevo.
+"""
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Adjunto, Etiqueta, Incidencia, Ubicacion
+from .services.search import update_search_vectors
+from .services.vocabulary import invalidate_vocabulary
+
+
+@receiver(post_save, sender=Ubicacion, dispatch_uid="incidencias_ubicacion_saved")
+@receiver(post_delete, sender=Ubicacion, dispatch_uid="incidencias_ubicacion_deleted")
+@receiver(post_save, sender=Etiqueta, dispatch_uid="incidencias_etiqueta_saved")
+@receiver(post_delete, sender=Etiqueta, dispatch_uid="incidencias_etiqueta_deleted")
+def on_vocabulary_changed(sender, **kwargs):
+    invalidate_vocabulary()
+
+
+@receiver(post_save, sender=Incidencia, dispatch_uid="incidencias_search_incidencia_saved")
+def on_incidencia_saved(sender, instance, **kwargs):
+    update_search_vectors(Incidencia.objects.filter(pk=instance.pk))
+
+
+@receiver(m2m_changed, sender=Incidencia.etiquetas.through, dispatch_uid="incidencias_search_etiquetas_changed")
+def on_incidencia_etiquetas_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # instance es una Etiqueta; en post_clear pk_set es None
+        incidencias = Incidencia.objects.filter(pk__in=pk_set) if pk_set else Incidencia.objects.none()
+    else:
+        incidencias = Incidencia.objects.filter(pk=instance.pk)
+    update_search_vectors(incidencias)
+
+
+@receiver(post_save, sender=Ubicacion, dispatch_uid="incidencias_search_ubicacion_saved")
+def on_ubicacion_saved(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vectors(instance.incidencias.all())
+
+
+@receiver(post_save, sender=Etiqueta, dispatch_uid="incidencias_search_etiqueta_saved")
+def on_etiqueta_saved(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vectors(instance.incidencias.all())
+
+
+@receiver(post_save, sender=Adjunto, dispatch_uid="incidencias_adjunto_created")
+def on_adjunto_created(sender, instance, created, **kwargs):
+    if created and not instance.miniatura:
+        from .tasks import generate_adjunto_previews
+
+        transaction.on_commit(lambda: generate_adjunto_previews(instance.pk))
@@ -6,20 +6,25 @@ Fetches emails from the configured IMAP mailbox, processes them with Gemini AI,
 and creates Incidencia objects automatically.
 """
 
+import email
 import imaplib
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from zoneinfo import ZoneInfo
 
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.mail import send_mail
+from django.db import connection, transaction
 from django.template.loader import render_to_string
 from django.utils import timezone
 from huey import crontab
 from huey.contrib.djhuey import db_periodic_task, lock_task, db_task
 
 from incidencias.services.email_parser import EmailIncidenciaParser
+from incidencias.services.vocabulary import get_vocabulary, resolve_etiquetas
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +34,11 @@ MADRID_TZ = ZoneInfo("Europe/Madrid")
 # Cache the last fetch timestamp (Huey worker-level)
 _last_fetch_timestamp = None
 
+# Messages per IMAP FETCH command
+FETCH_BATCH_SIZE = 25
+# Emails parsed with Gemini at the same time (each call still reserves a rate limit slot)
+PARSE_WORKERS = 4
+
 
 def _is_business_hours() -> bool:
     """Check if current time is within business hours (L-V 8:00-14:30 Europe/Madrid)."""
@@ -70,11 +80,12 @@ def _should_fetch_now() -> bool:
     return elapsed >= timedelta(minutes=60)
 
 
-def _move_to_processed_gmail(message):
+def _move_to_processed_gmail(messages):
     """
-    Move processed email in Gmail: remove 'INBOX' label, add 'Procesados' label.
+    Move processed emails in Gmail: remove 'INBOX' label, add 'Procesados' label.
 
-    Uses IMAP STORE commands with Gmail X-GM-LABELS extension.
+    Uses IMAP STORE commands with Gmail X-GM-LABELS extension, with a single
+    IMAP session for all the messages.
     """
     if not all([
         settings.MAILBOX_IMAP_HOST,
@@ -83,31 +94,38 @@ def _move_to_processed_gmail(message):
     ]):
         return
 
-    try:
-        # Get the message_id to find it on the server
-        message_id = message.message_id
-        if not message_id:
-            return
+    message_ids = [message.message_id for message in messages if message.message_id]
+    if not message_ids:
+        return
 
+    try:
         mail = imaplib.IMAP4_SSL(
             settings.MAILBOX_IMAP_HOST,
             settings.MAILBOX_IMAP_PORT,
         )
         mail.login(settings.MAILBOX_IMAP_USER, settings.MAILBOX_IMAP_PASSWORD)
         mail.select("INBOX")
+    except Exception:
+        logger.exception("Error connecting to Gmail to move %d email(s) to 'Procesados'", len(message_ids))
+        return
 
-        # Search for the message by Message-ID header
-        status, data = mail.search(None, f'HEADER Message-ID "{message_id}"')
-        if status == "OK" and data[0]:
-            uid = data[0].split()[0]
-            # Add "Procesados" label (Gmail will create it if it doesn't exist)
-            mail.store(uid, "+X-GM-LABELS", "Procesados")
-            # Remove from Inbox
-            mail.store(uid, "-X-GM-LABELS", "\\Inbox")
+    for message_id in message_ids:
+        try:
+            # Search for the message by Message-ID header
+            status, data = mail.search(None, f'HEADER Message-ID "{message_id}"')
+            if status == "OK" and data[0]:
+                uid = data[0].split()[0]
+                # Add "Procesados" label (Gmail will create it if it doesn't exist)
+                mail.store(uid, "+X-GM-LABELS", "Procesados")
+                # Remove from Inbox
+                mail.store(uid, "-X-GM-LABELS", "\\Inbox")
+        except Exception:
+            logger.exception("Error moving email to 'Procesados' in Gmail: %s", message_id)
 
+    try:
         mail.logout()
     except Exception:
-        logger.exception("Error moving email to 'Procesados' in Gmail: %s", message_id)
+        logger.debug("IMAP logout failed", exc_info=True)
 
 
 def _extract_message_body(message) -> str:
@@ -118,111 +136,116 @@ def _extract_message_body(message) -> str:
     # If HTML body is available and text body is empty, use HTML
     if not body.strip() and hasattr(message, "html") and message.html:
         # Basic HTML stripping (Gemini can handle some HTML too)
-        import re
         body = re.sub(r"<[^>]+>", " ", message.html)
         body = re.sub(r"\s+", " ", body).strip()
 
     return body
 
 
-def _process_single_email(message, parser: EmailIncidenciaParser):
-    """Process a single email message and create an Incidencia if new."""
-    from incidencias.models import (
-        Adjunto,
-        Etiqueta,
-        Incidencia,
-        ProcessedEmail,
-        Ubicacion,
-    )
-
-    message_id = message.message_id or ""
-
-    # Deduplication check
-    if ProcessedEmail.objects.filter(message_id=message_id).exists():
-        logger.info("Skipping duplicate email: %s", message_id)
-        return
-
+def _parse_email(message, parser: EmailIncidenciaParser, vocabulary=None) -> dict:
+    """Parse a message with Gemini (or fallback). Touches no incidencia data."""
     subject = message.subject or ""
     sender = message.from_address[0] if message.from_address else ""
-    body = _extract_message_body(message)
-
     logger.info("Processing email: '%s' from %s", subject[:60], sender)
 
-    # Parse with Gemini (or fallback)
-    parsed = parser.parse_email(
+    return parser.parse_email(
         subject=subject,
-        body=body,
+        body=_extract_message_body(message),
         sender=sender,
+        vocabulary=vocabulary,
     )
 
-    # Resolve ubicacion
-    ubicacion = None
-    if parsed.get("ubicacion_nombre"):
-        ubicacion = Ubicacion.objects.filter(
-            nombre__iexact=parsed["ubicacion_nombre"]
-        ).first()
-
-    # Create the Incidencia
-    incidencia = Incidencia.objects.create(
-        titulo=parsed["titulo"][:200],
-        descripcion=parsed["descripcion"],
-        reportero_nombre=parsed["reportero_nombre"][:100],
-        urgencia=parsed["urgencia"],
-        ubicacion=ubicacion,
-        es_privada=parsed.get("es_privada", True),
-    )
 
-    # Handle existing etiquetas
-    for etiqueta_nombre in parsed.get("etiquetas", []):
-        etiqueta = Etiqueta.objects.filter(nombre__iexact=etiqueta_nombre).first()
-        if etiqueta:
-            incidencia.etiquetas.add(etiqueta)
+def _parse_in_thread(message, parser: EmailIncidenciaParser, vocabulary) -> dict:
+    """`_parse_email` for the thread pool: the thread's DB connection is closed at the end."""
+    try:
+        return _parse_email(message, parser, vocabulary)
+    finally:
+        connection.close()
 
-    # Handle new etiquetas
-    for etiqueta_nombre in parsed.get("etiquetas_nuevas", []):
-        etiqueta, _ = Etiqueta.objects.get_or_create(
-            nombre=etiqueta_nombre,
-        )
-        incidencia.etiquetas.add(etiqueta)
 
-    # Process attachments
-    if hasattr(message, "attachments") and message.attachments:
-        for attachment in message.attachments.all():
-            try:
-                filename = attachment.headers.get("Content-Disposition", "attachment")
-                # Extract filename from Content-Disposition if available
-                import re
-                fname_match = re.search(r'filename="?([^";\n]+)"?', filename)
-                fname = fname_match.group(1) if fname_match else f"adjunto_{attachment.pk}"
-
-                # Check extension
-                ext = fname.rsplit(".", 1)[-1].lower() if "." in fname else ""
-                allowed = {e.lower() for e in Adjunto.ALLOWED_EXTENSIONS}
-                if ext in allowed:
-                    content = ContentFile(attachment.document.read(), name=fname)
-                    if content.size <= Adjunto.MAX_FILE_SIZE:
-                        Adjunto.objects.create(
-                            incidencia=incidencia,
-                            archivo=content,
-                        )
-                        logger.info("Attached file: %s", fname)
-                    else:
-                        logger.warning("Attachment too large: %s (%d bytes)", fname, content.size)
+def _save_attachments(message, incidencia):
+    from incidencias.models import Adjunto
+
+    if not (hasattr(message, "attachments") and message.attachments):
+        return
+    allowed = {e.lower() for e in Adjunto.ALLOWED_EXTENSIONS}
+    for attachment in message.attachments.all():
+        try:
+            filename = attachment.headers.get("Content-Disposition", "attachment")
+            # Extract filename from Content-Disposition if available
+            fname_match = re.search(r'filename="?([^";\n]+)"?', filename)
+            fname = fname_match.group(1) if fname_match else f"adjunto_{attachment.pk}"
+
+            # Check extension
+            ext = fname.rsplit(".", 1)[-1].lower() if "." in fname else ""
+            if ext in allowed:
+                content = ContentFile(attachment.document.read(), name=fname)
+                if content.size <= Adjunto.MAX_FILE_SIZE:
+                    Adjunto.objects.create(
+                        incidencia=incidencia,
+                        archivo=content,
+                    )
+                    logger.info("Attached file: %s", fname)
                 else:
-                    logger.info("Skipping attachment with unsupported extension: %s", fname)
-            except Exception:
-                logger.exception("Error processing attachment")
-
-    # Record as processed
-    ProcessedEmail.objects.create(
-        message_id=message_id,
-        incidencia=incidencia,
-        raw_subject=subject[:512],
-        raw_sender=sender[:254] if sender else "",
-    )
+                    logger.warning("Attachment too large: %s (%d bytes)", fname, content.size)
+            else:
+                logger.info("Skipping attachment with unsupported extension: %s", fname)
+        except Exception:
+            logger.exception("Error processing attachment")
+
+
+def _save_incidencia(message, parsed: dict, vocabulary=None):
+    """
+    Create the Incidencia, its etiquetas and attachments and the
+    ProcessedEmail record of one message, in its own transaction.
+
+    Ubicacion and etiquetas are resolved against `vocabulary` (by default the
+    cached snapshot) instead of one query per name.
+    """
+    from incidencias.models import Incidencia, ProcessedEmail
+
+    if vocabulary is None:
+        vocabulary = get_vocabulary()
+
+    message_id = message.message_id or ""
+    subject = message.subject or ""
+    sender = message.from_address[0] if message.from_address else ""
+
+    created_etiquetas = {}
+    with transaction.atomic():
+        # Create the Incidencia
+        incidencia = Incidencia.objects.create(
+            titulo=parsed["titulo"][:200],
+            descripcion=parsed["descripcion"],
+            reportero_nombre=parsed["reportero_nombre"][:100],
+            urgencia=parsed["urgencia"],
+            ubicacion_id=vocabulary.ubicacion_id(parsed.get("ubicacion_nombre")),
+            es_privada=parsed.get("es_privada", True),
+        )
+
+        # Existing etiquetas + new ones (created in bulk), added at once
+        etiqueta_ids = resolve_etiquetas(
+            vocabulary,
+            parsed.get("etiquetas", []),
+            parsed.get("etiquetas_nuevas", []),
+            created=created_etiquetas,
+        )
+        if etiqueta_ids:
+            incidencia.etiquetas.add(*etiqueta_ids)
+
+        _save_attachments(message, incidencia)
 
-    # Move email in Gmail
-    _move_to_processed_gmail(message)
+        # Record as processed (unique message_id: a concurrent run rolls back here)
+        ProcessedEmail.objects.create(
+            message_id=message_id,
+            incidencia=incidencia,
+            raw_subject=subject[:512],
+            raw_sender=sender[:254] if sender else "",
+        )
+
+    # Only now: if the message rolled back, its new etiquetas no longer exist
+    vocabulary.etiqueta_ids.update(created_etiquetas)
 
     logger.info(
         "Created incidencia #%d: '%s' from email %s",
@@ -230,6 +253,122 @@ def _process_single_email(message, parser: EmailIncidenciaParser):
         incidencia.titulo,
         message_id,
     )
+    return incidencia
+
+
+def _process_emails(messages, parser: EmailIncidenciaParser):
+    """
+    Process a batch of messages: Gemini parsing runs in a bounded thread pool
+    (the rate limiter is shared, so workers wait for free slots); each
+    Incidencia is saved in its own transaction and the processed emails are
+    moved in Gmail in one IMAP session.
+
+    Returns:
+        int: number of incidencias created
+    """
+    from incidencias.models import ProcessedEmail
+
+    # Deduplication: already processed or repeated in this batch
+    processed = set(
+        ProcessedEmail.objects.filter(
+            message_id__in=[message.message_id or "" for message in messages]
+        ).values_list("message_id", flat=True)
+    )
+    pending = []
+    for message in messages:
+        message_id = message.message_id or ""
+        if message_id in processed:
+            logger.info("Skipping duplicate email: %s", message_id)
+            continue
+        processed.add(message_id)
+        pending.append(message)
+
+    if not pending:
+        return 0
+
+    # Same vocabulary snapshot for every message of the run
+    vocabulary = get_vocabulary()
+
+    # Un solo email (o sin pool): se procesa en el hilo actual
+    executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS) if len(pending) > 1 and PARSE_WORKERS > 1 else None
+    try:
+        if executor is not None:
+            futures = [(message, executor.submit(_parse_in_thread, message, parser, vocabulary)) for message in pending]
+        else:
+            futures = [(message, None) for message in pending]
+
+        saved = []
+        for message, future in futures:
+            subject = message.subject[:60] if message.subject else "no-subject"
+            try:
+                parsed = future.result() if future is not None else _parse_email(message, parser, vocabulary)
+                _save_incidencia(message, parsed, vocabulary)
+                saved.append(message)
+            except Exception:
+                logger.exception("Error processing email '%s'", subject)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    _move_to_processed_gmail(saved)
+    return len(saved)
+
+
+def _fetch_batch(mail, email_ids):
+    """
+    Fetch several messages with one FETCH command.
+
+    Returns:
+        list of raw message bytes
+    """
+    status, msg_data = mail.fetch(b",".join(email_ids), "(RFC822)")
+    if status != "OK" or not msg_data:
+        logger.error("Failed to fetch email IDs %s", b",".join(email_ids))
+        return []
+    # Response: [(b'1 (RFC822 {size}', raw), b')', (b'2 (RFC822 {size}', raw), b')', ...]
+    return [part[1] for part in msg_data if isinstance(part, tuple) and len(part) > 1]
+
+
+def _fetch_unseen(mailbox):
+    """
+    Download the UNSEEN messages of the INBOX in batched FETCH ranges and
+    store them with django-mailbox.
+
+    Returns:
+        list of django_mailbox Message
+    """
+    new_messages = []
+    # Connect directly with imaplib
+    mail = imaplib.IMAP4_SSL(settings.MAILBOX_IMAP_HOST, settings.MAILBOX_IMAP_PORT)
+    mail.login(settings.MAILBOX_IMAP_USER, settings.MAILBOX_IMAP_PASSWORD)
+    mail.select("INBOX")
+
+    # Search for unread emails
+    status, search_data = mail.search(None, "UNSEEN")
+    if status == "OK" and search_data[0]:
+        email_ids = search_data[0].split()
+        logger.info("Found %d unread email(s)", len(email_ids))
+
+        for start in range(0, len(email_ids), FETCH_BATCH_SIZE):
+            batch = email_ids[start:start + FETCH_BATCH_SIZE]
+            try:
+                raw_messages = _fetch_batch(mail, batch)
+            except Exception:
+                logger.exception("Error fetching email IDs %s", b",".join(batch))
+                continue
+
+            for raw_email_bytes in raw_messages:
+                try:
+                    # Parse raw bytes into email.message.Message
+                    msg_object = email.message_from_bytes(raw_email_bytes)
+                    # Process using django-mailbox utility to create DB object
+                    # This parses headers/attachments correctly
+                    new_messages.append(mailbox.process_incoming_message(msg_object))
+                except Exception:
+                    logger.exception("Error parsing fetched email")
+
+    mail.logout()
+    return new_messages
 
 
 @db_periodic_task(crontab(minute="*/5"))
@@ -275,43 +414,8 @@ def fetch_and_process_emails():
             logger.info("Created mailbox: %s", mailbox.name)
 
         # Custom manual fetch to handle passwords with spaces (django-mailbox URI parsing issue)
-        import email
-        new_messages = []
-        
         try:
-            # Connect directly with imaplib
-            mail = imaplib.IMAP4_SSL(settings.MAILBOX_IMAP_HOST, settings.MAILBOX_IMAP_PORT)
-            mail.login(settings.MAILBOX_IMAP_USER, settings.MAILBOX_IMAP_PASSWORD)
-            mail.select("INBOX")
-            
-            # Search for unread emails
-            status, search_data = mail.search(None, "UNSEEN")
-            if status == "OK" and search_data[0]:
-                email_ids = search_data[0].split()
-                logger.info("Found %d unread email(s)", len(email_ids))
-                
-                for e_id in email_ids:
-                    try:
-                        # Fetch the raw email
-                        status, msg_data = mail.fetch(e_id, "(RFC822)")
-                        if status != "OK" or not msg_data:
-                            logger.error("Failed to fetch email ID %s", e_id)
-                            continue
-                            
-                        # Parse raw bytes into email.message.Message
-                        raw_email_bytes = msg_data[0][1]
-                        msg_object = email.message_from_bytes(raw_email_bytes)
-                        
-                        # Process using django-mailbox utility to create DB object
-                        # This parses headers/attachments correctly
-                        db_msg = mailbox.process_incoming_message(msg_object)
-                        new_messages.append(db_msg)
-                        
-                    except Exception:
-                        logger.exception("Error fetching/parsing email ID %s", e_id)
-            
-            mail.logout()
-            
+            new_messages = _fetch_unseen(mailbox)
         except Exception as e:
             logger.exception("IMAP connection error: %s", str(e))
             return
@@ -331,20 +435,26 @@ def fetch_and_process_emails():
             logger.error("Cannot initialize EmailIncidenciaParser — GEMINI_API_KEY not set")
             return
 
-        # Process each message
-        for message in new_messages:
-            try:
-                _process_single_email(message, parser)
-            except Exception:
-                logger.exception(
-                    "Error processing email '%s'",
-                    message.subject[:60] if message.subject else "no-subject",
-                )
+        created = _process_emails(new_messages, parser)
+        logger.info("Created %d incidencia(s) from %d email(s)", created, len(new_messages))
 
     except Exception:
         logger.exception("Error in fetch_and_process_emails task")
 
 
+@db_task()
+def record_gemini_usage(caller: str, success: bool, tokens_used: int = 0, error_message: str = ""):
+    """Guarda una llamada a Gemini en el registro de auditoría (GeminiAPIUsage)."""
+    from incidencias.models import GeminiAPIUsage
+
+    GeminiAPIUsage.objects.create(
+        caller=caller,
+        success=success,
+        tokens_used=tokens_used,
+        error_message=error_message,
+    )
+
+
 @db_task()
 def send_estado_changed_notification(incidencia_id: int, old_estado: str, new_estado: str):
     """Envía un email a los participantes notificando el cambio de estado."""
@@ -430,3 +540,19 @@ def send_new_comment_notification(incidencia_id: int, comentario_id: int):
         fail_silently=True,
     )
     logger.info(f"Notificación de nuevo comentario enviada a {len(emails)} participantes para incidencia #{incidencia.pk}")
+
+
+@db_task()
+def generate_adjunto_previews(adjunto_id: int):
+    """Genera la miniatura y la vista previa de un adjunto (imagen, vídeo o PDF)."""
+    from incidencias.models import Adjunto
+    from incidencias.services.previews import generate_previews
+
+    try:
+        adjunto = Adjunto.objects.select_related("incidencia").get(pk=adjunto_id)
+    except Adjunto.DoesNotExist:
+        logger.warning(f"Adjunto {adjunto_id} no encontrado para generar vistas previas.")
+        return
+
+    if generate_previews(adjunto):
+        logger.info(f"Vistas previas generadas para adjunto #{adjunto.pk}")
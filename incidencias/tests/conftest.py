@@ -0,0 +1,8 @@
+import pytest
+from django.core.cache import cache
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    """Cached data (vocabulary, Gemini responses) must not leak between tests."""
+    cache.clear()
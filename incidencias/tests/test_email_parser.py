@@ -27,7 +27,7 @@ def parser():
             p = EmailIncidenciaParser.__new__(EmailIncidenciaParser)
             p.client = MagicMock()
             p.rate_limiter = MagicMock()
-            p.rate_limiter.can_call.return_value = True
+            p.rate_limiter.reserve.return_value = "token"
             return p
 
 
@@ -95,7 +95,7 @@ class TestEmailParserFallback:
 
     def test_fallback_on_rate_limit(self, parser):
         """When rate limit is exceeded, fallback parsing should be used."""
-        parser.rate_limiter.can_call.return_value = False
+        parser.rate_limiter.reserve.return_value = None
 
         result = parser.parse_email(
             subject="Fwd: Re: Wifi caído",
@@ -121,10 +121,12 @@ class TestEmailParserFallback:
         assert result["titulo"] == "Problema con el ordenador"
         assert result["urgencia"] == "media"
         assert result["descripcion"] != ""
+        # The failed call gives its reserved slot back
+        assert parser.rate_limiter.register_call.call_args.kwargs["token"] == "token"
 
     def test_fallback_cleans_multiple_prefixes(self, parser):
         """Fallback should clean multiple Re:/Fwd: prefixes."""
-        parser.rate_limiter.can_call.return_value = False
+        parser.rate_limiter.reserve.return_value = None
 
         result = parser.parse_email(
             subject="Fwd: Re: Fwd: RV: Teclado roto",
@@ -218,3 +220,48 @@ class TestEmailParserValidation:
         )
 
         assert result["titulo"] == "Test"
+
+
+@pytest.mark.django_db
+class TestEmailParserCache:
+    """Test the content-addressed Gemini response cache."""
+
+    GEMINI_DATA = {
+        "titulo": "Pizarra digital sin sonido",
+        "descripcion": "La pizarra del aula 101 no tiene sonido.",
+        "reportero_nombre": "Luis Gil",
+        "urgencia": "baja",
+        "ubicacion_nombre": None,
+        "etiquetas": [],
+        "etiquetas_nuevas": [],
+        "es_privada": True,
+    }
+
+    def _parse(self, parser, body="La pizarra del aula 101 no tiene sonido."):
+        return parser.parse_email(subject="Pizarra", body=body, sender="luis@iesmartinabescos.es")
+
+    def test_same_email_reuses_cached_response(self, parser, mock_gemini_response):
+        """A repeated email should not call Gemini nor consume rate limit quota."""
+        parser.client.models.generate_content.return_value = mock_gemini_response(self.GEMINI_DATA)
+
+        first = self._parse(parser)
+        parser.rate_limiter.reserve.return_value = None
+        second = self._parse(parser)
+
+        assert second == first
+        assert parser.client.models.generate_content.call_count == 1
+        assert parser.rate_limiter.register_call.call_count == 1
+
+        different = self._parse(parser, body="Otro problema distinto.")
+        assert different["urgencia"] == "media"  # fallback: sin cuota y sin caché
+
+    def test_failed_calls_are_not_cached(self, parser, mock_gemini_response):
+        """Fallback results must not be stored: the next attempt calls Gemini again."""
+        parser.client.models.generate_content.side_effect = Exception("API Error")
+        self._parse(parser)
+
+        parser.client.models.generate_content.side_effect = None
+        parser.client.models.generate_content.return_value = mock_gemini_response(self.GEMINI_DATA)
+        result = self._parse(parser)
+
+        assert result["reportero_nombre"] == "Luis Gil"
@@ -0,0 +1,144 @@
+# ruff: noqa: E501
+"""Tests for the attachment thumbnail/preview pipeline."""
+
+import io
+from unittest.mock import patch
+
+import pytest
+from django.core.files.base import ContentFile
+from django.urls import reverse
+from PIL import Image
+
+from incidencias.models import Adjunto
+from incidencias.services import previews
+from incidencias.services.previews import generate_previews
+from incidencias.tasks import generate_adjunto_previews
+
+from .factories import AdjuntoFactory
+from .factories import IncidenciaFactory
+
+
+def _image_bytes(size=(2000, 1500), fmt="JPEG", mode="RGB"):
+    buffer = io.BytesIO()
+    Image.new(mode, size, "red").save(buffer, fmt)
+    return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def _media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+@pytest.mark.django_db
+class TestGeneratePreviews:
+    def test_image_thumbnail_and_preview(self):
+        adjunto = AdjuntoFactory(archivo=ContentFile(_image_bytes(), name="foto.jpg"))
+
+        assert generate_previews(adjunto) is True
+
+        adjunto.refresh_from_db()
+        assert adjunto.miniatura.name == f"incidencias/{adjunto.incidencia_id}/previews/foto_thumb.webp"
+        with Image.open(adjunto.miniatura) as thumb:
+            assert thumb.format == "WEBP"
+            assert max(thumb.size) == max(previews.THUMBNAIL_SIZE)
+        with Image.open(adjunto.vista_previa) as preview:
+            assert preview.size == (1280, 960)
+
+    def test_transparent_png(self):
+        adjunto = AdjuntoFactory(archivo=ContentFile(_image_bytes((400, 400), "PNG", "P"), name="captura.png"))
+
+        assert generate_previews(adjunto) is True
+        with Image.open(adjunto.miniatura) as thumb:
+            assert thumb.mode in ("RGB", "RGBA")
+
+    def test_video_poster(self):
+        adjunto = AdjuntoFactory(archivo=ContentFile(b"not really a video", name="clip.mp4"))
+
+        with patch("incidencias.services.previews._run", return_value=_image_bytes(fmt="PNG")) as run:
+            assert generate_previews(adjunto) is True
+
+        assert run.call_args.args[0][0] == "ffmpeg"
+        assert adjunto.vista_previa.name.endswith("clip_preview.webp")
+
+    def test_short_video_falls_back_to_first_frame(self):
+        adjunto = AdjuntoFactory(archivo=ContentFile(b"video", name="clip.mp4"))
+
+        with patch("incidencias.services.previews._run", side_effect=[b"", _image_bytes(fmt="PNG")]) as run:
+            assert generate_previews(adjunto) is True
+
+        assert "-ss" in run.call_args_list[0].args[0]
+        assert "-ss" not in run.call_args_list[1].args[0]
+
+    def test_pdf_first_page_png(self):
+        adjunto = AdjuntoFactory(archivo=ContentFile(b"%PDF-1.4", name="parte.pdf"))
+
+        def fake_pdftoppm(command):
+            with open(f"{command[-1]}.png", "wb") as f:
+                f.write(_image_bytes((1280, 1810), "PNG"))
+            return b""
+
+        with patch("incidencias.services.previews._run", side_effect=fake_pdftoppm):
+            assert generate_previews(adjunto) is True
+
+        assert adjunto.miniatura.name.endswith("parte_thumb.png")
+        with Image.open(adjunto.vista_previa) as preview:
+            assert preview.format == "PNG"
+
+    def test_missing_tool_leaves_fields_empty(self):
+        adjunto = AdjuntoFactory(archivo=ContentFile(b"video", name="clip.webm"))
+
+        with patch("incidencias.services.previews.shutil.which", return_value=None):
+            assert generate_previews(adjunto) is False
+
+        adjunto.refresh_from_db()
+        assert not adjunto.miniatura
+        assert adjunto.thumbnail_url == ""
+
+    def test_unreadable_image(self):
+        adjunto = AdjuntoFactory(archivo=ContentFile(b"garbage", name="rota.jpg"))
+
+        assert generate_previews(adjunto) is False
+        assert adjunto.thumbnail_url == adjunto.archivo.url
+
+
+@pytest.mark.django_db
+class TestPreviewTask:
+    def test_new_adjunto_enqueues_previews(self, django_capture_on_commit_callbacks):
+        with patch("incidencias.tasks.generate_adjunto_previews") as task:
+            with django_capture_on_commit_callbacks(execute=True):
+                adjunto = AdjuntoFactory()
+                task.assert_not_called()
+
+        task.assert_called_once_with(adjunto.pk)
+
+    def test_saving_previews_does_not_enqueue_again(self, django_capture_on_commit_callbacks):
+        adjunto = AdjuntoFactory(archivo=ContentFile(_image_bytes(), name="foto.jpg"))
+        with patch("incidencias.tasks.generate_adjunto_previews") as task:
+            with django_capture_on_commit_callbacks(execute=True):
+                generate_previews(adjunto)
+
+        task.assert_not_called()
+
+    def test_task_generates_previews(self):
+        adjunto = AdjuntoFactory(archivo=ContentFile(_image_bytes(), name="foto.jpg"))
+
+        generate_adjunto_previews.call_local(adjunto.pk)
+
+        assert Adjunto.objects.get(pk=adjunto.pk).miniatura
+
+    def test_task_ignores_missing_adjunto(self):
+        generate_adjunto_previews.call_local(999999)
+
+
+@pytest.mark.django_db
+class TestDetalleUsesPreviews:
+    def test_grid_shows_thumbnail_and_links_preview(self, client):
+        incidencia = IncidenciaFactory()
+        adjunto = AdjuntoFactory(incidencia=incidencia, archivo=ContentFile(_image_bytes(), name="foto.jpg"))
+        generate_previews(adjunto)
+
+        content = client.get(reverse("incidencias:detalle", args=[incidencia.pk])).content.decode()
+
+        assert adjunto.miniatura.url in content
+        assert adjunto.vista_previa.url in content
+        assert f'src="{adjunto.archivo.url}"' not in content
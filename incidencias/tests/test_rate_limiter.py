@@ -8,70 +8,119 @@ import pytest
 from django.utils import timezone
 
 from incidencias.models import GeminiAPIUsage
+from incidencias.services import gemini_rate_limiter
 from incidencias.services.gemini_rate_limiter import GeminiRateLimiter
+from incidencias.tasks import record_gemini_usage
+
+
+@pytest.fixture(autouse=True)
+def _empty_window():
+    """Each test starts with an empty in-memory window."""
+    gemini_rate_limiter._local_window.windows.clear()
 
 
 @pytest.fixture
 def rate_limiter(settings):
     """Create a rate limiter with test settings."""
     settings.GEMINI_RATE_LIMIT_HOURLY = 3
+    settings.GEMINI_RATE_LIMIT_CALLERS = {}
     settings.GEMINI_ALERT_EMAIL = "alert@test.com"
     return GeminiRateLimiter()
 
 
+@pytest.fixture
+def audit_task():
+    """The audit log task, patched (Huey is not running in tests)."""
+    with patch("incidencias.tasks.record_gemini_usage") as task:
+        yield task
+
+
 @pytest.mark.django_db
-class TestGeminiRateLimiterCanCall:
-    """Test rate limit checking."""
+class TestGeminiRateLimiterReserve:
+    """Test slot reservation."""
 
     def test_can_call_when_under_limit(self, rate_limiter):
         """Should allow calls when under the hourly limit."""
         assert rate_limiter.can_call() is True
 
-    def test_cannot_call_when_at_limit(self, rate_limiter):
-        """Should block calls when at the hourly limit."""
-        # Create 3 usage records in the last hour
-        for _ in range(3):
-            GeminiAPIUsage.objects.create(caller="test", success=True)
+    def test_cannot_reserve_when_at_limit(self, rate_limiter):
+        """Should block reservations once the hourly limit is used."""
+        tokens = [rate_limiter.reserve("test") for _ in range(3)]
 
+        assert all(tokens)
+        assert len(set(tokens)) == 3
+        assert rate_limiter.reserve("test") is None
         assert rate_limiter.can_call() is False
 
+    def test_can_call_does_not_reserve(self, rate_limiter):
+        """Checking the limit must not consume quota."""
+        for _ in range(5):
+            rate_limiter.can_call()
+
+        assert rate_limiter.reserve("test") is not None
+
     def test_old_calls_dont_count(self, rate_limiter):
         """Calls older than 1 hour should not count toward the limit."""
-        old_time = timezone.now() - timedelta(hours=2)
-        for _ in range(5):
-            usage = GeminiAPIUsage.objects.create(caller="test", success=True)
-            GeminiAPIUsage.objects.filter(pk=usage.pk).update(timestamp=old_time)
+        two_hours_ago = timezone.now().timestamp() - 2 * 60 * 60
+        with patch("incidencias.services.gemini_rate_limiter.time.time", return_value=two_hours_ago):
+            for _ in range(3):
+                rate_limiter.reserve("test")
 
-        assert rate_limiter.can_call() is True
+        assert rate_limiter.reserve("test") is not None
 
-    def test_failed_calls_dont_count(self, rate_limiter):
-        """Failed calls should not count toward the limit."""
+    def test_released_slots_dont_count(self, rate_limiter, audit_task):
+        """Failed calls give their slot back and should not count toward the limit."""
         for _ in range(5):
-            GeminiAPIUsage.objects.create(caller="test", success=False)
+            token = rate_limiter.reserve("test")
+            rate_limiter.register_call(caller="test", success=False, token=token)
 
         assert rate_limiter.can_call() is True
 
+    def test_caller_budget(self, settings):
+        """A caller cannot use more than its own budget, leaving the rest to others."""
+        settings.GEMINI_RATE_LIMIT_HOURLY = 3
+        settings.GEMINI_RATE_LIMIT_CALLERS = {"email_parser": "1"}
+        limiter = GeminiRateLimiter()
+
+        assert limiter.reserve("email_parser") is not None
+        assert limiter.reserve("email_parser") is None
+        assert limiter.reserve("card_ocr") is not None
+
+    def test_reserve_waits_for_a_free_slot(self, rate_limiter):
+        """If a slot frees up within `wait`, reserve blocks instead of failing."""
+        start = timezone.now().timestamp() - 60 * 60 + 0.2
+        with patch("incidencias.services.gemini_rate_limiter.time.time", return_value=start):
+            for _ in range(3):
+                rate_limiter.reserve("test")
+
+        assert rate_limiter.reserve("test", wait=0) is None
+        assert rate_limiter.reserve("test", wait=5) is not None
+
 
 @pytest.mark.django_db
 class TestGeminiRateLimiterRegister:
-    """Test call registration."""
+    """Test call registration in the audit log."""
 
-    def test_register_successful_call(self, rate_limiter):
-        """Should create a usage record for a successful call."""
-        rate_limiter.register_call(caller="email_parser", success=True, tokens_used=100)
+    def test_register_enqueues_audit_record(self, rate_limiter, audit_task, django_capture_on_commit_callbacks):
+        """Registering a call should write the audit log after commit, not inline."""
+        with django_capture_on_commit_callbacks(execute=True):
+            rate_limiter.register_call(caller="email_parser", success=True, tokens_used=100)
+            audit_task.assert_not_called()
+
+        audit_task.assert_called_once_with("email_parser", True, 100, "")
+
+    def test_register_successful_call(self):
+        """The audit task should create a usage record for a successful call."""
+        record_gemini_usage.call_local("email_parser", True, 100, "")
 
         usage = GeminiAPIUsage.objects.latest("timestamp")
         assert usage.caller == "email_parser"
         assert usage.success is True
         assert usage.tokens_used == 100
 
-    def test_register_failed_call(self, rate_limiter):
-        """Should create a usage record for a failed call."""
-        rate_limiter.register_call(
-            caller="email_parser",
-            success=False,
-            error_message="Connection timeout",
-        )
+    def test_register_failed_call(self):
+        """The audit task should create a usage record for a failed call."""
+        record_gemini_usage.call_local("email_parser", False, 0, "Connection timeout")
 
         usage = GeminiAPIUsage.objects.latest("timestamp")
         assert usage.success is False
@@ -83,11 +132,11 @@ class TestGeminiRateLimiterAlert:
     """Test email alert functionality."""
 
     @patch("incidencias.services.gemini_rate_limiter.send_mail")
-    def test_sends_alert_when_limit_exceeded(self, mock_send_mail, rate_limiter):
+    def test_sends_alert_when_limit_exceeded(self, mock_send_mail, rate_limiter, audit_task):
         """Should send an email alert when the rate limit is exceeded."""
         # Exceed the limit
         for _ in range(3):
-            GeminiAPIUsage.objects.create(caller="test", success=True)
+            rate_limiter.reserve("test")
 
         rate_limiter.can_call()  # This should trigger the alert
 
@@ -97,16 +146,16 @@ class TestGeminiRateLimiterAlert:
         assert "alert@test.com" in (call_args[1].get("recipient_list") or call_args[0][3])
 
     @patch("incidencias.services.gemini_rate_limiter.send_mail")
-    def test_does_not_resend_alert_within_hour(self, mock_send_mail, rate_limiter):
+    def test_does_not_resend_alert_within_hour(self, mock_send_mail, rate_limiter, audit_task):
         """Should not send duplicate alerts within the same hour."""
         for _ in range(3):
-            GeminiAPIUsage.objects.create(caller="test", success=True)
-        # Mark an alert as already sent
-        GeminiAPIUsage.objects.create(caller="rate_limiter_alert", success=True)
+            rate_limiter.reserve("test")
 
         rate_limiter.can_call()
+        rate_limiter.can_call()
+        GeminiRateLimiter().reserve("test")
 
-        mock_send_mail.assert_not_called()
+        mock_send_mail.assert_called_once()
 
     def test_no_alert_when_email_not_configured(self, settings):
         """Should not crash when GEMINI_ALERT_EMAIL is not set."""
@@ -114,7 +163,7 @@ class TestGeminiRateLimiterAlert:
         settings.GEMINI_RATE_LIMIT_HOURLY = 1
         limiter = GeminiRateLimiter()
 
-        GeminiAPIUsage.objects.create(caller="test", success=True)
+        limiter.reserve("test")
 
         # Should not raise, just log a warning
         assert limiter.can_call() is False
@@ -129,5 +178,7 @@ class TestGeminiRateLimiterUsage:
         GeminiAPIUsage.objects.create(caller="test", success=True)
         GeminiAPIUsage.objects.create(caller="test", success=True)
         GeminiAPIUsage.objects.create(caller="test", success=False)
+        old = GeminiAPIUsage.objects.create(caller="test", success=True)
+        GeminiAPIUsage.objects.filter(pk=old.pk).update(timestamp=timezone.now() - timedelta(hours=2))
 
         assert rate_limiter.get_recent_usage(hours=1) == 2
@@ -106,12 +106,12 @@ class TestDeduplication:
 
 @pytest.mark.django_db
 class TestProcessSingleEmail:
-    """Test the _process_single_email function."""
+    """Test _process_emails with a single message (no thread pool)."""
 
     @patch("incidencias.services.email_parser.genai")
     def test_creates_incidencia_with_etiquetas(self, mock_genai):
         """Processing should create an Incidencia and assign existing etiquetas."""
-        from incidencias.tasks import _process_single_email
+        from incidencias.tasks import _process_emails
 
         # Setup test data
         ubi = Ubicacion.objects.create(nombre="Aula 101")
@@ -140,8 +140,10 @@ class TestProcessSingleEmail:
             "es_privada": True,
         }
 
-        with patch("incidencias.tasks._move_to_processed_gmail"):
-            _process_single_email(message, parser)
+        with patch("incidencias.tasks._move_to_processed_gmail") as move:
+            assert _process_emails([message], parser) == 1
+
+        move.assert_called_once_with([message])
 
         # Verify incidencia was created
         inc = Incidencia.objects.get(titulo="Monitor roto")
@@ -159,7 +161,7 @@ class TestProcessSingleEmail:
     @patch("incidencias.services.email_parser.genai")
     def test_creates_new_etiquetas_if_suggested(self, mock_genai):
         """Processing should create new etiquetas when Gemini suggests them."""
-        from incidencias.tasks import _process_single_email
+        from incidencias.tasks import _process_emails
 
         message = MagicMock()
         message.message_id = "<test-new-tag@gmail.com>"
@@ -183,7 +185,7 @@ class TestProcessSingleEmail:
         }
 
         with patch("incidencias.tasks._move_to_processed_gmail"):
-            _process_single_email(message, parser)
+            assert _process_emails([message], parser) == 1
 
         inc = Incidencia.objects.get(titulo="Impresora 3D averiada")
         assert Etiqueta.objects.filter(nombre="impresora-3d").exists()
@@ -192,7 +194,7 @@ class TestProcessSingleEmail:
     @patch("incidencias.services.email_parser.genai")
     def test_skips_duplicate_message(self, mock_genai):
         """Should skip an email if its message_id is already processed."""
-        from incidencias.tasks import _process_single_email
+        from incidencias.tasks import _process_emails
 
         # Pre-create a processed record
         ProcessedEmail.objects.create(
@@ -209,9 +211,210 @@ class TestProcessSingleEmail:
 
         parser = MagicMock()
 
-        _process_single_email(message, parser)
+        with patch("incidencias.tasks._move_to_processed_gmail") as move:
+            assert _process_emails([message], parser) == 0
 
+        move.assert_not_called()
         # Parser should NOT have been called
         parser.parse_email.assert_not_called()
         # No new incidencia
         assert Incidencia.objects.count() == 0
+
+
+def _mock_message(message_id, subject):
+    message = MagicMock()
+    message.message_id = message_id
+    message.subject = subject
+    message.from_address = ["cofotap@iesmartinabescos.es"]
+    message.text = f"{subject}: no funciona."
+    message.html = ""
+    message.attachments = MagicMock()
+    message.attachments.all.return_value = []
+    return message
+
+
+def _parsed(subject):
+    return {
+        "titulo": subject,
+        "descripcion": f"{subject}: no funciona",
+        "reportero_nombre": "Prof. López",
+        "urgencia": "media",
+        "ubicacion_nombre": None,
+        "etiquetas": [],
+        "etiquetas_nuevas": [],
+        "es_privada": True,
+    }
+
+
+class TestBatchedFetch:
+    """Test IMAP FETCH batching."""
+
+    def test_fetch_batch_parses_every_message(self):
+        """One FETCH command returns several messages."""
+        from incidencias.tasks import _fetch_batch
+
+        mail = MagicMock()
+        mail.fetch.return_value = (
+            "OK",
+            [(b"1 (RFC822 {3}", b"uno"), b")", (b"2 (RFC822 {3}", b"dos"), b")"],
+        )
+
+        assert _fetch_batch(mail, [b"1", b"2"]) == [b"uno", b"dos"]
+        mail.fetch.assert_called_once_with(b"1,2", "(RFC822)")
+
+    @patch("incidencias.tasks.FETCH_BATCH_SIZE", 2)
+    @patch("incidencias.tasks.imaplib.IMAP4_SSL")
+    def test_fetch_unseen_uses_batched_ranges(self, mock_imap):
+        """Unseen messages are fetched in ranges of FETCH_BATCH_SIZE."""
+        from incidencias.tasks import _fetch_unseen
+
+        mail = mock_imap.return_value
+        mail.search.return_value = ("OK", [b"1 2 3"])
+        mail.fetch.side_effect = lambda ids, _: (
+            "OK",
+            [(b"x (RFC822)", f"Subject: {i}\r\n\r\nbody".encode()) for i in ids.split(b",")],
+        )
+        mailbox = MagicMock()
+
+        messages = _fetch_unseen(mailbox)
+
+        assert [c.args[0] for c in mail.fetch.call_args_list] == [b"1,2", b"3"]
+        assert len(messages) == 3
+        assert mailbox.process_incoming_message.call_count == 3
+
+
+@pytest.mark.django_db
+class TestProcessEmails:
+    """Test the batch processing of fetched emails."""
+
+    def test_processes_batch_in_pool_and_moves_once(self):
+        """Each new email creates its incidencia; duplicates and failures don't stop the rest."""
+        from incidencias.tasks import _process_emails
+
+        ProcessedEmail.objects.create(message_id="<old@gmail.com>", raw_subject="Old", raw_sender="old@test.com")
+        messages = [
+            _mock_message("<a@gmail.com>", "Proyector"),
+            _mock_message("<old@gmail.com>", "Ya procesado"),
+            _mock_message("<b@gmail.com>", "Falla Gemini"),
+            _mock_message("<c@gmail.com>", "Impresora"),
+            _mock_message("<a@gmail.com>", "Proyector"),  # repetido en el lote
+        ]
+
+        def parse_email(subject, body, sender, **kwargs):
+            if subject == "Falla Gemini":
+                raise RuntimeError("boom")
+            return _parsed(subject)
+
+        parser = MagicMock()
+        parser.parse_email.side_effect = parse_email
+
+        with patch("incidencias.tasks._move_to_processed_gmail") as move:
+            created = _process_emails(messages, parser)
+
+        assert created == 2
+        assert set(Incidencia.objects.values_list("titulo", flat=True)) == {"Proyector", "Impresora"}
+        assert parser.parse_email.call_count == 3
+        moved = move.call_args.args[0]
+        assert [m.message_id for m in moved] == ["<a@gmail.com>", "<c@gmail.com>"]
+
+    def test_failed_save_rolls_back_only_that_email(self):
+        """A message whose save fails leaves no partial incidencia behind."""
+        from incidencias.tasks import _process_emails
+
+        messages = [_mock_message("<a@gmail.com>", "Proyector"), _mock_message("<b@gmail.com>", "Impresora")]
+        parser = MagicMock()
+        parser.parse_email.side_effect = lambda subject, body, sender, **kwargs: _parsed(subject)
+
+        with patch("incidencias.tasks._save_attachments", side_effect=[None, RuntimeError("disco lleno")]), \
+                patch("incidencias.tasks._move_to_processed_gmail"):
+            created = _process_emails(messages, parser)
+
+        assert created == 1
+        assert list(Incidencia.objects.values_list("titulo", flat=True)) == ["Proyector"]
+        assert not ProcessedEmail.objects.filter(message_id="<b@gmail.com>").exists()
+
+
+@pytest.mark.django_db
+class TestVocabulary:
+    """Test the cached ubicaciones/etiquetas snapshot."""
+
+    def test_batch_builds_vocabulary_once(self):
+        """Vocabulary lookups happen once per run, not once per message."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from incidencias.tasks import _process_emails
+
+        Ubicacion.objects.create(nombre="Aula 101", planta="PB")
+        Etiqueta.objects.create(nombre="hardware", slug="hardware")
+        messages = [_mock_message(f"<v{i}@gmail.com>", f"Monitor {i}") for i in range(4)]
+
+        def parse_email(subject, body, sender, **kwargs):
+            data = _parsed(subject)
+            data.update(ubicacion_nombre="aula 101", etiquetas=["Hardware"], etiquetas_nuevas=["monitor"])
+            return data
+
+        parser = MagicMock()
+        parser.parse_email.side_effect = parse_email
+
+        with patch("incidencias.tasks._move_to_processed_gmail"), CaptureQueriesContext(connection) as ctx:
+            assert _process_emails(messages, parser) == 4
+
+        vocabulary_queries = [
+            q["sql"] for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT") and ('FROM "incidencias_ubicacion"' in q["sql"] or 'FROM "incidencias_etiqueta"' in q["sql"])
+        ]
+        # Una lectura de ubicaciones, una de etiquetas y la comprobación de slugs al crear "monitor"
+        assert len(vocabulary_queries) == 3
+        assert Etiqueta.objects.filter(nombre="monitor").count() == 1
+        for inc in Incidencia.objects.all():
+            assert inc.ubicacion.nombre == "Aula 101"
+            assert set(inc.etiquetas.values_list("nombre", flat=True)) == {"hardware", "monitor"}
+
+    def test_rolled_back_message_does_not_leave_etiqueta_in_snapshot(self):
+        """A new etiqueta created by a message that rolls back is created again by the next one."""
+        from incidencias.tasks import _process_emails
+
+        messages = [_mock_message("<a@gmail.com>", "Monitor 1"), _mock_message("<b@gmail.com>", "Monitor 2")]
+
+        def parse_email(subject, body, sender, **kwargs):
+            data = _parsed(subject)
+            data.update(etiquetas_nuevas=["monitor"])
+            return data
+
+        parser = MagicMock()
+        parser.parse_email.side_effect = parse_email
+
+        with patch("incidencias.tasks._save_attachments", side_effect=[RuntimeError("disco lleno"), None]), \
+                patch("incidencias.tasks._move_to_processed_gmail"):
+            assert _process_emails(messages, parser) == 1
+
+        inc = Incidencia.objects.get()
+        assert inc.titulo == "Monitor 2"
+        assert list(inc.etiquetas.values_list("nombre", flat=True)) == ["monitor"]
+        assert Etiqueta.objects.filter(nombre="monitor").count() == 1
+
+    def test_new_etiquetas_get_unique_slugs(self):
+        """New etiquetas are created in bulk with unique slugs, reusing existing names case-insensitively."""
+        from incidencias.services.vocabulary import get_vocabulary, resolve_etiquetas
+
+        zeta = Etiqueta.objects.create(nombre="Zeta", slug="zeta")
+        Etiqueta.objects.create(nombre="Zeta wifi antigua", slug="zeta-wifi")
+        before = Etiqueta.objects.count()
+
+        ids = resolve_etiquetas(get_vocabulary(), ["desconocida"], ["zeta", "Zeta WiFi", "zeta wifi "])
+
+        assert Etiqueta.objects.count() == before + 1
+        new = Etiqueta.objects.get(nombre="Zeta WiFi")
+        assert new.slug == "zeta-wifi-2"
+        assert ids == [zeta.pk, new.pk]
+
+    def test_saving_invalidates_snapshot(self):
+        """Creating or deleting an Ubicacion is reflected in the next snapshot."""
+        from incidencias.services.vocabulary import get_vocabulary
+
+        assert "Taller Zeta" not in get_vocabulary().ubicaciones
+        ubi = Ubicacion.objects.create(nombre="Taller Zeta", planta="PB")
+        assert get_vocabulary().ubicacion_id("taller zeta") == ubi.pk
+        ubi.delete()
+        assert "Taller Zeta" not in get_vocabulary().ubicaciones
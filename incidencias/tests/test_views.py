@@ -78,6 +78,20 @@ class TestLandingView:
         assert context["total_en_progreso"] == 1
         assert context["total_resueltas"] == 1
 
+    def test_counts_in_one_query(self, rf, django_assert_num_queries):
+        from django.contrib.auth.models import AnonymousUser
+
+        from ..views import _contar_por_estado
+        from ..views import _get_visible_qs
+
+        IncidenciaFactory(estado=Incidencia.Estado.PENDIENTE)
+        IncidenciaFactory(estado=Incidencia.Estado.PENDIENTE, es_privada=True)
+        request = rf.get("/")
+        request.user = AnonymousUser()
+        with django_assert_num_queries(1):
+            totales = _contar_por_estado(_get_visible_qs(request))
+        assert totales == {"pendiente": 1, "en_progreso": 0, "resuelta": 0}
+
 
 # =============================================================================
 # BuscarView
@@ -87,8 +101,9 @@ class TestLandingView:
 @pytest.mark.django_db
 class TestBuscarView:
     def test_search_by_titulo(self, client):
-        IncidenciaFactory(titulo="Proyector roto")
-        IncidenciaFactory(titulo="Ordenador lento")
+        # Sin descripción aleatoria: "proyecto" se parece a "proyector"
+        IncidenciaFactory(titulo="Proyector roto", descripcion="")
+        IncidenciaFactory(titulo="Ordenador lento", descripcion="")
         response = client.get(reverse("incidencias:buscar"), {"q": "Proyector"})
         assert response.status_code == 200
         content = response.content.decode()
@@ -111,6 +126,85 @@ class TestBuscarView:
         response = client.get(reverse("incidencias:buscar"), {"q": ""})
         assert "Algo" in response.content.decode()
 
+    def test_ranks_near_duplicates_first(self, client):
+        aula = UbicacionFactory(nombre="Aula 12")
+        IncidenciaFactory(titulo="Proyector del aula 12 no enciende", descripcion="", ubicacion=aula)
+        IncidenciaFactory(titulo="Proyector sin imagen", descripcion="", ubicacion=UbicacionFactory(nombre="Taller Zeta"))
+        IncidenciaFactory(titulo="Persiana rota", descripcion="", ubicacion=UbicacionFactory(nombre="Biblioteca Zeta"))
+        response = client.get(reverse("incidencias:buscar"), {"q": "proyector aula 12"})
+        titulos = [inc.titulo for inc in response.context["incidencias"]]
+        assert titulos == ["Proyector del aula 12 no enciende", "Proyector sin imagen"]
+
+    def test_tolerates_misspellings(self, client):
+        IncidenciaFactory(titulo="Proyector del aula 12 no enciende", descripcion="", ubicacion=UbicacionFactory(nombre="Aula 12"))
+        IncidenciaFactory(titulo="Proyector sin imagen", descripcion="", ubicacion=UbicacionFactory(nombre="Taller Zeta"))
+        IncidenciaFactory(titulo="Persiana rota", descripcion="", ubicacion=UbicacionFactory(nombre="Biblioteca Zeta"))
+        response = client.get(reverse("incidencias:buscar"), {"q": "proyeccor aula12"})
+        titulos = [inc.titulo for inc in response.context["incidencias"]]
+        assert titulos == ["Proyector del aula 12 no enciende"]
+
+    def test_matches_word_stems_and_prefixes(self, client):
+        IncidenciaFactory(titulo="Los proyectores no funcionan", descripcion="")
+        response = client.get(reverse("incidencias:buscar"), {"q": "proyec"})
+        assert "Los proyectores no funcionan" in response.content.decode()
+
+    def test_search_by_etiqueta_added_later(self, client):
+        inc = IncidenciaFactory(titulo="Inc etiquetada", descripcion="")
+        inc.etiquetas.add(EtiquetaFactory(nombre="Altavoces"))
+        response = client.get(reverse("incidencias:buscar"), {"q": "altavoces"})
+        assert "Inc etiquetada" in response.content.decode()
+
+    def test_falls_back_to_substring_search(self, client):
+        IncidenciaFactory(titulo="Fallo en PC-042", descripcion="")
+        response = client.get(reverse("incidencias:buscar"), {"q": "C-04"})
+        assert "Fallo en PC-042" in response.content.decode()
+
+
+# =============================================================================
+# SimilaresView
+# =============================================================================
+
+
+@pytest.mark.django_db
+class TestSimilaresView:
+    def test_lists_similar_open_incidencias(self, client):
+        IncidenciaFactory(titulo="Proyector del aula 12 no enciende", descripcion="")
+        IncidenciaFactory(titulo="Proyector aula 12 arreglado", descripcion="", estado=Incidencia.Estado.RESUELTA)
+        IncidenciaFactory(titulo="Persiana rota", descripcion="")
+        response = client.get(reverse("incidencias:similares"), {"titulo": "Proyector aula 12", "descripcion": ""})
+        titulos = [inc.titulo for inc in response.context["similares"]]
+        assert titulos == ["Proyector del aula 12 no enciende"]
+        assert "Proyector del aula 12 no enciende" in response.content.decode()
+
+    def test_hints_duplicates_with_typos(self, client):
+        IncidenciaFactory(titulo="Impresora atascada en la sala de profesores", descripcion="")
+        IncidenciaFactory(titulo="Proyector del aula 12 no enciende", descripcion="")
+        response = client.get(reverse("incidencias:similares"), {"titulo": "impresora atasacada sala profes"})
+        titulos = [inc.titulo for inc in response.context["similares"]]
+        assert titulos == ["Impresora atascada en la sala de profesores"]
+
+    def test_similarity_threshold_is_local_to_the_transaction(self, client):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        IncidenciaFactory(titulo="Impresora atascada en la sala de profesores", descripcion="")
+        with CaptureQueriesContext(connection) as ctx:
+            client.get(reverse("incidencias:similares"), {"titulo": "impresora atasacada sala profes"})
+        # is_local=true: el umbral no queda en la conexión reutilizada
+        settings = [q["sql"] for q in ctx.captured_queries if "word_similarity_threshold" in q["sql"]]
+        assert settings == ["SELECT set_config('pg_trgm.word_similarity_threshold', '0.5', true)"]
+
+    def test_hides_private_incidencias(self, client):
+        IncidenciaFactory(titulo="Proyector privado", descripcion="", es_privada=True)
+        response = client.get(reverse("incidencias:similares"), {"titulo": "proyector"})
+        assert response.context["similares"] == []
+
+    def test_empty_text(self, client):
+        IncidenciaFactory(titulo="Algo")
+        response = client.get(reverse("incidencias:similares"), {"titulo": " "})
+        assert response.status_code == 200
+        assert response.context["similares"] == []
+
 
 # =============================================================================
 # CrearIncidenciaView
@@ -309,10 +403,13 @@ class TestPanelDashboardView:
         context = response.context
         pendientes = list(context["pendientes"])
         en_progreso = list(context["en_progreso"])
-        resueltas = list(context["resueltas"])
         assert len(pendientes) == 1
         assert len(en_progreso) == 1
-        assert len(resueltas) == 1
+        assert context["totales"] == {"pendiente": 1, "en_progreso": 1, "resuelta": 1}
+        # Resueltas se cargan aparte, al llegar a la columna
+        assert "Resuelta test" not in response.content.decode()
+        response = tecnico_client.get(context["resueltas_url"])
+        assert [inc.titulo for inc in response.context["incidencias"]] == ["Resuelta test"]
 
     def test_filter_by_planta(self, tecnico_client):
         ubi_pb = UbicacionFactory(nombre="Aula PB", planta="PB")
@@ -340,6 +437,48 @@ class TestPanelDashboardView:
         assert len(mis) == 1
         assert mis[0].titulo == "Mía"
 
+    def test_counters_follow_filters(self, tecnico_client):
+        et = EtiquetaFactory(nombre="Zeta")
+        IncidenciaFactory(urgencia="critica", etiquetas=[et, EtiquetaFactory()])
+        IncidenciaFactory(urgencia="critica", estado=Incidencia.Estado.RESUELTA)
+        IncidenciaFactory(urgencia="baja", etiquetas=[et])
+        response = tecnico_client.get(reverse("incidencias:panel"), {"urgencia": "critica"})
+        assert response.context["totales"] == {"pendiente": 1, "en_progreso": 0, "resuelta": 1}
+        response = tecnico_client.get(reverse("incidencias:panel"), {"etiqueta": "Zeta"})
+        assert response.context["totales"] == {"pendiente": 2, "en_progreso": 0, "resuelta": 0}
+        assert len(response.context["pendientes"]) == 2
+
+    def test_paginates_columns(self, tecnico_client, monkeypatch):
+        monkeypatch.setattr("incidencias.views.PANEL_PAGE_SIZE", 2)
+        for n in range(5):
+            IncidenciaFactory(titulo=f"Pendiente {n}", urgencia="critica")
+        IncidenciaFactory(titulo="Otra urgencia", urgencia="baja")
+
+        response = tecnico_client.get(reverse("incidencias:panel"), {"urgencia": "critica"})
+        titulos = [inc.titulo for inc in response.context["pendientes"]]
+        next_url = response.context["pendientes_next_url"]
+        assert response.context["totales"]["pendiente"] == 5
+        assert "urgencia=critica" in next_url
+        while next_url:
+            response = tecnico_client.get(next_url)
+            titulos += [inc.titulo for inc in response.context["incidencias"]]
+            next_url = response.context["next_url"]
+
+        assert titulos == [f"Pendiente {n}" for n in reversed(range(5))]
+
+    def test_lista_rejects_unknown_estado(self, tecnico_client):
+        response = tecnico_client.get(reverse("incidencias:panel_lista"), {"estado": "otro"})
+        assert response.status_code == 404
+
+    def test_lista_ignores_invalid_cursor(self, tecnico_client):
+        IncidenciaFactory(titulo="Primera", estado=Incidencia.Estado.RESUELTA)
+        response = tecnico_client.get(reverse("incidencias:panel_lista"), {"estado": "resuelta", "cursor": "basura"})
+        assert [inc.titulo for inc in response.context["incidencias"]] == ["Primera"]
+
+    def test_lista_requires_tecnico(self, client):
+        response = client.get(reverse("incidencias:panel_lista"), {"estado": "resuelta"})
+        assert response.status_code == 302
+
     def test_card_has_overflow_visible(self, tecnico_client):
         """Cards must have overflow-visible so dropdowns are not clipped."""
         IncidenciaFactory(estado=Incidencia.Estado.PENDIENTE)
@@ -9,6 +9,7 @@ urlpatterns = [
     path("", views.LandingView.as_view(), name="landing"),
     path("buscar/", views.BuscarView.as_view(), name="buscar"),
     path("crear/", views.CrearIncidenciaView.as_view(), name="crear"),
+    path("crear/similares/", views.SimilaresView.as_view(), name="similares"),
     path("<int:pk>/", views.DetalleIncidenciaView.as_view(), name="detalle"),
     path("<int:pk>/comentar/", views.AgregarComentarioView.as_view(), name="comentar"),
     # --- API autocompletado ---
@@ -16,6 +17,7 @@ urlpatterns = [
     path("api/etiquetas/", views.ApiEtiquetasView.as_view(), name="api_etiquetas"),
     # --- Panel administración ---
     path("panel/", views.PanelDashboardView.as_view(), name="panel"),
+    path("panel/lista/", views.PanelListaView.as_view(), name="panel_lista"),
     path("panel/editar/<int:pk>/", views.EditarIncidenciaView.as_view(), name="panel_editar"),
     path("panel/asignar/<int:pk>/", views.AsignarIncidenciaView.as_view(), name="panel_asignar"),
     path("panel/estado/<int:pk>/", views.CambiarEstadoView.as_view(), name="panel_estado"),
@@ -3,14 +3,17 @@ import json
 
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db.models import Case
+from django.db.models import Count
 from django.db.models import IntegerField
 from django.db.models import Q
 from django.db.models import Value
 from django.db.models import When
+from django.http import Http404
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils.dateparse import parse_datetime
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.views import View
 from django.views.generic import CreateView
@@ -27,6 +30,9 @@ from .models import Incidencia
 from .models import Tecnico
 from .models import Ubicacion
 from .services.notification_service import IncidenciaNotificationService
+from .services.search import find_similar
+from .services.search import legacy_search
+from .services.search import search
 
 
 def _is_tecnico(user):
@@ -75,6 +81,16 @@ def _get_incidencias_ordered(queryset=None):
     ).order_by("_estado_order", "-created_at")
 
 
+def _contar_por_estado(queryset):
+    """Número de incidencias de `queryset` por estado, en una sola consulta."""
+    return queryset.aggregate(
+        **{
+            estado: Count("pk", filter=Q(estado=estado))
+            for estado in Incidencia.Estado.values
+        }
+    )
+
+
 def _get_visible_qs(request):
     """Devuelve queryset de incidencias visibles: públicas + privadas del propietario."""
     reportero = request.COOKIES.get("incidencias_reportero", "")
@@ -102,14 +118,19 @@ class LandingView(TemplateView):
         context = super().get_context_data(**kwargs)
         qs = _get_visible_qs(self.request)
         context["incidencias"] = _get_incidencias_ordered(qs)
-        context["total_pendientes"] = qs.filter(estado=Incidencia.Estado.PENDIENTE).count()
-        context["total_en_progreso"] = qs.filter(estado=Incidencia.Estado.EN_PROGRESO).count()
-        context["total_resueltas"] = qs.filter(estado=Incidencia.Estado.RESUELTA).count()
+        totales = _contar_por_estado(qs)
+        context["total_pendientes"] = totales[Incidencia.Estado.PENDIENTE]
+        context["total_en_progreso"] = totales[Incidencia.Estado.EN_PROGRESO]
+        context["total_resueltas"] = totales[Incidencia.Estado.RESUELTA]
         return context
 
 
 class BuscarView(ListView):
-    """Búsqueda HTMX por similitud (o icontains como fallback)."""
+    """
+    Búsqueda HTMX por similitud de trigramas (título, etiquetas, ubicación y
+    descripción; tolera erratas) ordenada por similitud dentro de cada
+    estado, con icontains como fallback si no hay resultados.
+    """
 
     template_name = "incidencias/partials/lista_incidencias.html"
     context_object_name = "incidencias"
@@ -118,16 +139,27 @@ class BuscarView(ListView):
         q = self.request.GET.get("q", "").strip()
         qs = _get_visible_qs(self.request)
 
-        if q:
-            qs = qs.filter(
-                Q(titulo__icontains=q)
-                | Q(descripcion__icontains=q)
-                | Q(etiquetas__nombre__icontains=q)
-                | Q(ubicacion__nombre__icontains=q)
-                | Q(ubicacion__grupo__icontains=q)
-            ).distinct()
+        if not q:
+            return _get_incidencias_ordered(qs)
 
-        return _get_incidencias_ordered(qs)
+        results = _get_incidencias_ordered(search(qs, q)).order_by("_estado_order", "-similarity", "-rank", "-created_at")
+        if results.exists():
+            return results
+        return _get_incidencias_ordered(legacy_search(qs, q))
+
+
+class SimilaresView(TemplateView):
+    """Aviso HTMX de posibles duplicados mientras se rellena una incidencia nueva."""
+
+    template_name = "incidencias/partials/similares.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        text = " ".join(
+            self.request.GET.get(field, "").strip() for field in ("titulo", "descripcion")
+        )
+        context["similares"] = find_similar(_get_visible_qs(self.request), text) if text.strip() else []
+        return context
 
 
 class CrearIncidenciaView(CreateView):
@@ -189,7 +221,7 @@ class DetalleIncidenciaView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["comentarios"] = self.object.comentarios.all()
+        context["comentarios"] = self.object.comentarios.prefetch_related("adjuntos")
         context["adjuntos"] = self.object.adjuntos.all()
         context["comentario_form"] = ComentarioForm()
         context["historial_asignaciones"] = self.object.historial_asignaciones.all()
@@ -282,46 +314,135 @@ class ApiEtiquetasView(View):
 # =============================================================================
 
 
+PANEL_PAGE_SIZE = 30
+
+PANEL_VACIO = {
+    Incidencia.Estado.PENDIENTE: "Sin incidencias pendientes",
+    Incidencia.Estado.EN_PROGRESO: "Sin incidencias en progreso",
+    Incidencia.Estado.RESUELTA: "Sin incidencias resueltas",
+}
+
+
+def _panel_qs():
+    """Incidencias con lo que necesita `panel_card.html`."""
+    return (
+        Incidencia.objects.select_related("ubicacion", "asignado_a")
+        .prefetch_related("etiquetas")
+        .annotate(num_comentarios=Count("comentarios"))
+    )
+
+
+def _filtrar_panel(request, qs):
+    """Aplica los filtros del panel (GET) y devuelve (queryset, filtros)."""
+    filtros = {
+        "ubicacion": request.GET.get("ubicacion", "").strip(),
+        "urgencia": request.GET.get("urgencia", ""),
+        "etiqueta": request.GET.get("etiqueta", "").strip(),
+        "tecnico": request.GET.get("tecnico", ""),
+    }
+
+    if filtros["ubicacion"]:
+        qs = qs.filter(
+            Q(ubicacion__nombre__icontains=filtros["ubicacion"])
+            | Q(ubicacion__grupo__icontains=filtros["ubicacion"])
+            | Q(ubicacion__planta__icontains=filtros["ubicacion"])
+        )
+    if filtros["urgencia"]:
+        qs = qs.filter(urgencia=filtros["urgencia"])
+    if filtros["etiqueta"]:
+        # Subconsulta: el join con etiquetas duplicaría filas y contadores
+        qs = qs.filter(
+            pk__in=Incidencia.objects.filter(etiquetas__nombre__icontains=filtros["etiqueta"]).values("pk")
+        )
+    if filtros["tecnico"]:
+        if filtros["tecnico"] == "sin_asignar":
+            qs = qs.filter(asignado_a__isnull=True)
+        else:
+            qs = qs.filter(asignado_a_id=filtros["tecnico"])
+
+    return qs, filtros
+
+
+def _cursor(incidencia):
+    return f"{incidencia.created_at.isoformat()}_{incidencia.pk}"
+
+
+def _parse_cursor(cursor):
+    """(created_at, pk) de un cursor de `_cursor`, o None si no es válido."""
+    created_at, _, pk = (cursor or "").rpartition("_")
+    try:
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except ValueError:
+        return None
+    if created_at is None:
+        return None
+    return created_at, pk
+
+
+def _pagina_panel(request, qs, estado, cursor=None):
+    """
+    Página (keyset, más recientes primero) de las incidencias de `qs` en
+    `estado`, a partir de `cursor`.
+
+    Returns:
+        (incidencias, URL de la página siguiente o None)
+    """
+    qs = qs.filter(estado=estado).order_by("-created_at", "-pk")
+    posicion = _parse_cursor(cursor)
+    if posicion:
+        created_at, pk = posicion
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+    incidencias = list(qs[: PANEL_PAGE_SIZE + 1])
+    if len(incidencias) <= PANEL_PAGE_SIZE:
+        return incidencias, None
+
+    incidencias = incidencias[:PANEL_PAGE_SIZE]
+    return incidencias, _panel_lista_url(request, estado, _cursor(incidencias[-1]))
+
+
+def _panel_lista_url(request, estado, cursor=""):
+    """URL de `PanelListaView` conservando los filtros activos."""
+    params = request.GET.copy()
+    params["estado"] = estado
+    params["cursor"] = cursor
+    if not cursor:
+        del params["cursor"]
+    return f"{reverse('incidencias:panel_lista')}?{params.urlencode()}"
+
+
 class PanelDashboardView(TecnicoRequiredMixin, TemplateView):
-    """Dashboard del panel de administración."""
+    """
+    Dashboard del panel de administración.
+
+    Las columnas pendientes y en progreso muestran su primera página; las
+    siguientes (y toda la columna de resueltas) se cargan con HTMX desde
+    `PanelListaView` al hacer scroll.
+    """
 
     template_name = "incidencias/panel/dashboard.html"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Filtros
-        ubicacion = self.request.GET.get("ubicacion", "").strip()
-        urgencia = self.request.GET.get("urgencia", "")
-        etiqueta = self.request.GET.get("etiqueta", "").strip()
-        tecnico_id = self.request.GET.get("tecnico", "")
+        qs, filtros = _filtrar_panel(self.request, Incidencia.objects.all())
+        context["totales"] = _contar_por_estado(qs)
 
-        qs = Incidencia.objects.select_related("ubicacion", "asignado_a").prefetch_related("etiquetas")
-
-        if ubicacion:
-            qs = qs.filter(
-                Q(ubicacion__nombre__icontains=ubicacion)
-                | Q(ubicacion__grupo__icontains=ubicacion)
-                | Q(ubicacion__planta__icontains=ubicacion)
-            )
-        if urgencia:
-            qs = qs.filter(urgencia=urgencia)
-        if etiqueta:
-            qs = qs.filter(etiquetas__nombre__icontains=etiqueta)
-        if tecnico_id:
-            if tecnico_id == "sin_asignar":
-                qs = qs.filter(asignado_a__isnull=True)
-            else:
-                qs = qs.filter(asignado_a_id=tecnico_id)
-
-        context["pendientes"] = qs.filter(estado=Incidencia.Estado.PENDIENTE).order_by("-created_at")
-        context["en_progreso"] = qs.filter(estado=Incidencia.Estado.EN_PROGRESO).order_by("-created_at")
-        context["resueltas"] = qs.filter(estado=Incidencia.Estado.RESUELTA).order_by("-created_at")[:20]
+        qs = _filtrar_panel(self.request, _panel_qs())[0]
+        context["pendientes"], context["pendientes_next_url"] = _pagina_panel(
+            self.request, qs, Incidencia.Estado.PENDIENTE
+        )
+        context["en_progreso"], context["en_progreso_next_url"] = _pagina_panel(
+            self.request, qs, Incidencia.Estado.EN_PROGRESO
+        )
+        context["resueltas_url"] = _panel_lista_url(self.request, Incidencia.Estado.RESUELTA)
+        context["vacio"] = PANEL_VACIO
 
         # Mis incidencias (assigned to current user)
         tecnico_actual = getattr(self.request.user, "perfil_tecnico", None)
         if tecnico_actual:
-            context["mis_incidencias"] = Incidencia.objects.filter(
+            context["mis_incidencias"] = _panel_qs().filter(
                 asignado_a=tecnico_actual,
             ).exclude(estado=Incidencia.Estado.RESUELTA).order_by("-created_at")
         else:
@@ -333,11 +454,30 @@ class PanelDashboardView(TecnicoRequiredMixin, TemplateView):
         context["urgencias"] = Incidencia.Urgencia.choices
 
         # Active filters for template
-        context["filtro_ubicacion"] = ubicacion
-        context["filtro_urgencia"] = urgencia
-        context["filtro_etiqueta"] = etiqueta
-        context["filtro_tecnico"] = tecnico_id
+        context["filtro_ubicacion"] = filtros["ubicacion"]
+        context["filtro_urgencia"] = filtros["urgencia"]
+        context["filtro_etiqueta"] = filtros["etiqueta"]
+        context["filtro_tecnico"] = filtros["tecnico"]
+
+        return context
 
+
+class PanelListaView(TecnicoRequiredMixin, TemplateView):
+    """Página HTMX de una columna del panel (`?estado=...&cursor=...`, con los mismos filtros)."""
+
+    template_name = "incidencias/partials/panel_pagina.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        estado = self.request.GET.get("estado", "")
+        if estado not in Incidencia.Estado.values:
+            raise Http404("Estado no válido")
+        cursor = self.request.GET.get("cursor", "")
+
+        qs = _filtrar_panel(self.request, _panel_qs())[0]
+        context["incidencias"], context["next_url"] = _pagina_panel(self.request, qs, estado, cursor)
+        context["vacio"] = "" if cursor else PANEL_VACIO[estado]
+        context["tecnicos"] = Tecnico.objects.filter(activo=True)
         return context
 
 
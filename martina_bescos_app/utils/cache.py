@@ -0,0 +1,28 @@
+"""
+Cache helpers for Martina Bescós App.
+
+Some state handed between the web processes and the Huey consumer lives in
+the default cache (debounce markers, job status). That only works when both
+see the same cache: Redis in production, but local settings use LocMemCache
+while docker-compose runs the consumer in its own container.
+"""
+from django.conf import settings
+
+# Backends que guardan los datos en la memoria de cada proceso
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def cache_is_shared(alias="default"):
+    """
+    Whether the Huey consumer sees the same `alias` cache as this process.
+
+    False for per-process backends, unless Huey runs tasks in-process
+    (`immediate` mode).
+    """
+    if getattr(settings, "HUEY", {}).get("immediate"):
+        return True
+    backend = settings.CACHES.get(alias, {}).get("BACKEND", "")
+    return backend not in PROCESS_LOCAL_BACKENDS
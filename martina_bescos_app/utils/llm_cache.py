@@ -0,0 +1,116 @@
+"""
+Content-addressed cache for Gemini responses.
+
+Gemini calls are slow and `GEMINI_RATE_LIMIT_HOURLY` leaves very little quota,
+yet the same input is often processed twice (retries, re-imports, forwarded
+duplicates). Responses are stored in the default cache (Redis in production)
+under a hash of everything that determines them: model id, prompt, digest of
+any binary input and generation config. Only successful, already parsed
+results are stored; errors are never cached.
+
+Hits and misses are counted per namespace (`stats()`, command
+`gemini_cache_stats`).
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "llm_cache"
+STATS_KEY = "llm_cache:stats:{namespace}:{event}"
+NAMESPACES = ("ai_metadata", "email_parser", "card_ocr")
+
+_MISSING = object()
+
+
+def make_key(namespace, model_id, prompt, data=None, config=None):
+    """
+    Cache key for a Gemini call.
+
+    Args:
+        namespace: caller name, keeps callers apart and groups metrics
+        model_id: Gemini model id
+        prompt: full prompt text
+        data: binary input sent with the prompt (image, PDF...), if any
+        config: JSON-serializable generation config
+
+    Returns:
+        str
+    """
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps(
+            {"model": model_id, "prompt": prompt, "config": config},
+            sort_keys=True,
+            default=str,
+        ).encode()
+    )
+    if data:
+        digest.update(hashlib.sha256(data).digest())
+    return f"{KEY_PREFIX}:{namespace}:{digest.hexdigest()}"
+
+
+def _timeout():
+    return getattr(settings, "GEMINI_CACHE_TTL", 60 * 60 * 24 * 7)
+
+
+def _count(namespace, event):
+    key = STATS_KEY.format(namespace=namespace, event=event)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # La clave no existe todavía (o ha expirado)
+        cache.add(key, 1, None)
+
+
+def lookup(key):
+    """Cached response for `key`, or None. Counts the hit or miss."""
+    namespace = key.split(":")[1]
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        _count(namespace, "miss")
+        return None
+    _count(namespace, "hit")
+    logger.info("Gemini cache hit (%s)", namespace)
+    return value
+
+
+def store(key, value):
+    """Store a successful response under `key`."""
+    cache.set(key, value, _timeout())
+
+
+def get_or_call(key, call):
+    """
+    Cached response for `key`, or the result of `call()` (stored if it does
+    not raise).
+    """
+    value = lookup(key)
+    if value is not None:
+        return value
+    value = call()
+    store(key, value)
+    return value
+
+
+def stats(namespaces=NAMESPACES):
+    """
+    Hit/miss counters per namespace.
+
+    Returns:
+        dict: namespace -> {"hit": int, "miss": int}
+    """
+    keys = {
+        (namespace, event): STATS_KEY.format(namespace=namespace, event=event)
+        for namespace in namespaces
+        for event in ("hit", "miss")
+    }
+    values = cache.get_many(list(keys.values()))
+    return {
+        namespace: {event: values.get(keys[(namespace, event)], 0) for event in ("hit", "miss")}
+        for namespace in namespaces
+    }
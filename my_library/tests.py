@@ -971,6 +971,28 @@ def test_los_numeros_pelados_siguen_siendo_elementos(client, db, user):
     assert '"section": null' in response.content.decode()
 
 
+
+def test_el_visor_no_hace_una_consulta_por_item(client, db, user):
+    """Los contenidos de la playlist se resuelven en bloque, no item a item."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    client.force_login(user)
+    pocos = [_item(user, f"corto-{n}") for n in range(2)]
+    muchos = pocos + [_item(user, f"largo-{n}") for n in range(8)]
+
+    def consultas(items):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(
+                reverse("my_library:study_session"),
+                {"items": ",".join(str(i.pk) for i in items)},
+            )
+        assert response.status_code == 200
+        return len(ctx.captured_queries)
+
+    consultas(pocos)  # calentar caché de ContentType
+    assert consultas(muchos) == consultas(pocos)
+
 # === Arranque de sesión por faceta (C18) ===
 
 
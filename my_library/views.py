@@ -13,6 +13,11 @@ from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_protect
 from django.contrib import messages
 from django.db.models import Count
+from martina_bescos_app.utils.generic_relations import (
+    media_prefetch_url,
+    prefetch_content_objects,
+)
+
 from .models import ItemSection, LibraryDeck, LibraryItem, ReviewLog, SharedNote
 from . import facets
 from .session import (
@@ -351,36 +356,16 @@ def update_item_title(request, pk):
 def suggest_tags(request):
     """
     Endpoint JSON para autocompletado de tags.
-    Devuelve tags de taggit + MusicTag que coincidan con el query.
+    Devuelve tags de taggit + MusicTag que coincidan con el query, con los
+    prefijos (también el valor de `faceta:valor`) primero.
     """
-    from taggit.models import Tag as TaggitTag
-    from cms.models import MusicTag
+    from cms.services.tag_suggestions import TagSuggestionService
 
-    q = request.GET.get("q", "").strip().lower()
+    q = request.GET.get("q", "").strip()
     if len(q) < 1:
         return JsonResponse([], safe=False)
 
-    # Combinar tags de ambos sistemas
-    taggit_tags = list(
-        TaggitTag.objects.filter(name__icontains=q)
-        .values_list("name", flat=True)
-        .order_by("name")[:15]
-    )
-    music_tags = list(
-        MusicTag.objects.filter(name__icontains=q)
-        .values_list("name", flat=True)
-        .order_by("name")[:15]
-    )
-
-    # Unir y deduplicar, mantener orden
-    seen = set()
-    combined = []
-    for tag in taggit_tags + music_tags:
-        if tag.lower() not in seen:
-            seen.add(tag.lower())
-            combined.append(tag)
-
-    return JsonResponse(combined[:20], safe=False)
+    return JsonResponse(TagSuggestionService.suggest(q, limit=20), safe=False)
 
 
 @staff_member_required
@@ -454,6 +439,11 @@ def study_session_view(request):
             pk__in=secciones_pks, item__user=request.user
         ).select_related("item")
     }
+    # Contenidos de todos los items (también los de las secciones) en una
+    # consulta por tipo de contenido, en vez de una por item.
+    prefetch_content_objects(
+        list(por_pk.values()) + [s.item for s in secciones.values()]
+    )
 
     # Se recorre `crudos` para respetar el orden que decidió el constructor.
     playlist = []
@@ -466,6 +456,7 @@ def study_session_view(request):
                     "section": seccion.pk,
                     "title": seccion.get_content_title(),
                     "type": seccion.item.get_content_type_name(),
+                    "prefetch": media_prefetch_url(seccion.item.content_object),
                 })
         elif token.isdigit():
             item = por_pk.get(int(token))
@@ -475,11 +466,14 @@ def study_session_view(request):
                     "section": None,
                     "title": item.get_content_title(),
                     "type": item.get_content_type_name(),
+                    "prefetch": media_prefetch_url(item.content_object),
                 })
 
     return render(request, "my_library/study_viewer.html", {
         "playlist_json": json.dumps(playlist),
         "total_items": len(playlist),
+        # El navegador precarga el fichero del segundo item mientras se estudia el primero
+        "next_item": playlist[1] if len(playlist) > 1 else None,
         "deck_pk": deck_pk,
     })
 
@@ -0,0 +1,28 @@
+"""
+Recalcular la cobertura de contenidos de todos los planes de programación.
+
+Usage:
+    python manage.py recompute_coverage
+    python manage.py recompute_coverage --plan 12
+"""
+from django.core.management.base import BaseCommand
+
+from programacion.models import CoursePlan
+from programacion.services import recompute_all_coverage
+
+
+class Command(BaseCommand):
+    help = "Recalcula en bloque la cobertura (ContentCoverage) de las páginas de los planes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--plan", type=int, help="Solo el plan con este id")
+
+    def handle(self, *args, **options):
+        plans = None
+        if options["plan"]:
+            plans = CoursePlan.objects.filter(pk=options["plan"])
+            if not plans.exists():
+                self.stdout.write(self.style.WARNING(f"No existe el plan {options['plan']}"))
+                return
+        total = recompute_all_coverage(plans)
+        self.stdout.write(self.style.SUCCESS(f"{total} coberturas recalculadas"))
@@ -94,9 +94,42 @@ class CoursePlan(models.Model):
                 return item
         return None
 
+    def get_next_steps(self, count):
+        """
+        Los `count` próximos items de página (recorriendo capítulos en orden)
+        no completados ni saltados. Carga items y coberturas en dos consultas.
+        """
+        items = list(self.items.select_related("content_type").order_by("order", "pk"))
+        coverage = {
+            (cov.content_type_id, cov.object_id): cov.percent
+            for cov in ContentCoverage.objects.filter(
+                group_id=self.group_id, object_id__in=[i.object_id for i in items]
+            )
+        }
+        children = {}
+        for item in items:
+            if item.parent_id:
+                children.setdefault(item.parent_id, []).append(item)
+
+        steps = []
+        for item in items:
+            if item.parent_id or item.status == PlanItem.Status.SKIPPED:
+                continue
+            for step in children.get(item.pk, [item]):
+                if len(steps) >= count:
+                    return steps
+                if step.is_book or step.status != PlanItem.Status.AUTO:
+                    continue
+                if coverage.get((step.content_type_id, step.object_id), 0) < 100:
+                    steps.append(step)
+        return steps
+
     def reorder_items(self, item_ids):
-        for index, item_id in enumerate(item_ids):
-            self.items.filter(pk=item_id).update(order=index)
+        positions = {int(item_id): index for index, item_id in enumerate(item_ids)}
+        items = list(self.items.filter(pk__in=positions).only("pk", "order", "plan"))
+        for item in items:
+            item.order = positions[item.pk]
+        PlanItem.objects.bulk_update(items, ["order"])
 
 
 class PlanItem(models.Model):
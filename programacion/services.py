@@ -8,8 +8,20 @@ el historial de sesiones existente.
 """
 
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 
 from clases.models import ClassSessionItem
+from martina_bescos_app.utils.cache import cache_is_shared
+
+# Los cambios de sesión se agrupan: un recálculo por (grupo, página) cada
+# COVERAGE_DEBOUNCE_SECONDS como mucho.
+COVERAGE_DEBOUNCE_SECONDS = 10
+COVERAGE_PENDING_KEY = "programacion:coverage:pending:{group_id}:{page_id}"
+
+PAGE_MODELS = ("blogpage", "scorepage", "dictadopage")
 
 
 def _element(obj, kind, title):
@@ -87,16 +99,50 @@ def get_page_elements(page):
     return unique
 
 
+def _elements_condition(elements):
+    """Q que selecciona los ClassSessionItem de `elements` (None si no hay)."""
+    ids_by_model = {}
+    for el in elements:
+        model, _, object_id = el["key"].partition(":")
+        ids_by_model.setdefault(model, set()).add(int(object_id))
+    if not ids_by_model:
+        return None
+
+    condition = Q()
+    for model, ids in ids_by_model.items():
+        condition |= Q(content_type__model=model, object_id__in=ids)
+    return condition
+
+
+def _seen_keys_for(group, elements):
+    """
+    Claves de `elements` que el grupo ya ha visto, con una sola consulta
+    acotada a esos elementos (no carga todo el historial del grupo).
+    """
+    condition = _elements_condition(elements)
+    if condition is None:
+        return set()
+    rows = (
+        ClassSessionItem.objects.filter(condition, session__group=group)
+        .values_list("content_type__model", "object_id")
+        .distinct()
+    )
+    return {f"{model}:{object_id}" for model, object_id in rows}
+
+
 def get_seen_keys(group, page=None):
     """
-    Claves "modelo:pk" de todos los elementos que el grupo ya ha visto en
-    sesiones de clase. Si se pasa page, no se filtra por source_page a
-    propósito: si el grupo vio ese documento en cualquier sesión, cuenta.
+    Claves "modelo:pk" de los elementos que el grupo ya ha visto en
+    sesiones de clase. Si se pasa page, solo se consultan los elementos de
+    esa página; no se filtra por source_page a propósito: si el grupo vio
+    ese documento en cualquier sesión, cuenta.
     """
-    qs = ClassSessionItem.objects.filter(session__group=group).select_related(
-        "content_type"
+    if page is not None:
+        return _seen_keys_for(group, get_page_elements(page))
+    rows = ClassSessionItem.objects.filter(session__group=group).values_list(
+        "content_type__model", "object_id"
     )
-    return {f"{item.content_type.model}:{item.object_id}" for item in qs}
+    return {f"{model}:{object_id}" for model, object_id in rows}
 
 
 def recompute_coverage(group, page):
@@ -105,7 +151,7 @@ def recompute_coverage(group, page):
 
     specific = page.specific if hasattr(page, "specific") else page
     elements = get_page_elements(specific)
-    seen_keys = get_seen_keys(group)
+    seen_keys = _seen_keys_for(group, elements)
 
     seen_elements = [el["key"] for el in elements if el["key"] in seen_keys]
 
@@ -146,28 +192,73 @@ def recompute_coverage(group, page):
     return coverage
 
 
-def update_coverage_for_session(session):
-    """Recalcular cobertura de todas las páginas de origen usadas en una sesión."""
+def _session_pages(session):
+    """Páginas de origen usadas en una sesión (y las páginas añadidas enteras)."""
     pages = set()
-    for item in session.items.select_related("source_page"):
+    for item in session.items.select_related("source_page", "content_type"):
         if item.source_page_id:
             pages.add(item.source_page)
         # El item puede SER una página (artículo completo en la sesión)
-        if item.content_type.model in ("blogpage", "scorepage", "dictadopage"):
+        if item.content_type.model in PAGE_MODELS:
             obj = item.content_object
             if obj:
                 pages.add(obj)
-    for page in pages:
-        recompute_coverage(session.group, page)
+    return pages
+
+
+def schedule_coverage(group_id, page_id):
+    """
+    Encolar en Huey el recálculo de cobertura de (grupo, página) cuando
+    termine la transacción. Si ya hay uno pendiente para ese par no se
+    encola otro: la tarea se ejecuta con retraso y recoge todos los cambios.
+    El agrupado necesita una caché compartida con el consumidor (Redis).
+    """
+    transaction.on_commit(lambda: _enqueue_coverage(group_id, page_id))
+
+
+def _enqueue_coverage(group_id, page_id):
+    from .tasks import recompute_page_coverage
+
+    key = COVERAGE_PENDING_KEY.format(group_id=group_id, page_id=page_id)
+    # Margen por si el consumidor va retrasado; la tarea borra la clave al empezar.
+    # Sin caché compartida no podría borrar la de este proceso: se encola siempre
+    if not cache_is_shared() or cache.add(key, True, COVERAGE_DEBOUNCE_SECONDS + 60):
+        recompute_page_coverage.schedule(
+            (group_id, page_id), delay=COVERAGE_DEBOUNCE_SECONDS
+        )
+
+
+def clear_coverage_pending(group_id, page_id):
+    cache.delete(COVERAGE_PENDING_KEY.format(group_id=group_id, page_id=page_id))
+
+
+def schedule_coverage_for_session(session):
+    """Encolar el recálculo de todas las páginas de origen de una sesión."""
+    for page in _session_pages(session):
+        schedule_coverage(session.group_id, page.pk)
 
 
 def get_pending_elements(group, page):
     """Elementos de una página que el grupo aún no ha visto."""
     elements = get_page_elements(page)
-    seen_keys = get_seen_keys(group)
+    seen_keys = _seen_keys_for(group, elements)
     return [el for el in elements if el["key"] not in seen_keys]
 
 
+def _session_items(session, page, elements):
+    """ClassSessionItem sin guardar para `elements`, con `page` como origen."""
+    return [
+        ClassSessionItem(
+            session=session,
+            content_type_id=el["content_type_id"],
+            object_id=el["object_id"],
+            source_page=page,
+            order=order,
+        )
+        for order, el in enumerate(elements)
+    ]
+
+
 def create_session_from_plan_item(plan_item, teacher, date, title=None):
     """
     Crear una ClassSession prellenada con los elementos pendientes del item.
@@ -176,20 +267,179 @@ def create_session_from_plan_item(plan_item, teacher, date, title=None):
     from clases.models import ClassSession
 
     page = plan_item.content_object
+    group = plan_item.plan.group
     session = ClassSession.objects.create(
         teacher=teacher,
-        group=plan_item.plan.group,
+        group=group,
         date=date,
         title=title or plan_item.get_content_title(),
         metadata={"plan_item_id": plan_item.pk, "plan_id": plan_item.plan_id},
     )
-    pending = get_pending_elements(plan_item.plan.group, page) if page else []
-    for order, el in enumerate(pending):
-        ClassSessionItem.objects.create(
-            session=session,
-            content_type_id=el["content_type_id"],
-            object_id=el["object_id"],
-            source_page=page,
-            order=order,
-        )
+    pending = get_pending_elements(group, page) if page else []
+    ClassSessionItem.objects.bulk_create(_session_items(session, page, pending))
+    # bulk_create no dispara las señales de cobertura
+    if pending:
+        schedule_coverage(group.pk, page.pk)
     return session
+
+
+def create_sessions_for_next_items(plan, teacher, start_date, count, days_between=7):
+    """
+    Crear una ClassSession por cada uno de los `count` próximos pasos del
+    plan (ver CoursePlan.get_next_steps), la primera en `start_date` y las
+    siguientes cada `days_between` días, prellenadas con sus elementos
+    pendientes. Número de consultas constante respecto a sesiones y elementos.
+
+    Returns:
+        list[ClassSession]: sesiones creadas, en orden
+    """
+    from datetime import timedelta
+
+    from wagtail.models import Page
+
+    from clases.models import ClassSession
+
+    steps = plan.get_next_steps(count)
+    pages = Page.objects.filter(pk__in=[step.object_id for step in steps]).specific().in_bulk()
+    steps = [step for step in steps if step.object_id in pages]
+    if not steps:
+        return []
+
+    elements = {step.pk: get_page_elements(pages[step.object_id]) for step in steps}
+    seen_keys = _seen_keys_for(
+        plan.group, [el for els in elements.values() for el in els]
+    )
+
+    sessions = ClassSession.objects.bulk_create(
+        [
+            ClassSession(
+                teacher=teacher,
+                group=plan.group,
+                date=start_date + timedelta(days=index * days_between),
+                title=pages[step.object_id].title,
+                metadata={"plan_item_id": step.pk, "plan_id": plan.pk},
+            )
+            for index, step in enumerate(steps)
+        ]
+    )
+
+    new_items = []
+    for session, step in zip(sessions, steps, strict=True):
+        # Lo que entra en una sesión ya no está pendiente para las siguientes
+        pending = [el for el in elements[step.pk] if el["key"] not in seen_keys]
+        seen_keys.update(el["key"] for el in pending)
+        new_items.extend(_session_items(session, pages[step.object_id], pending))
+    ClassSessionItem.objects.bulk_create(new_items, batch_size=500)
+
+    for page_id in {item.source_page_id for item in new_items}:
+        schedule_coverage(plan.group_id, page_id)
+    return sessions
+
+
+def recompute_all_coverage(plans=None):
+    """
+    Recalcular la cobertura de todas las páginas de los planes (o de `plans`)
+    con consultas por lotes: páginas, elementos vistos, páginas presentadas y
+    última sesión se cargan para todos los grupos a la vez, y las coberturas
+    se guardan con bulk_create/bulk_update.
+
+    Returns:
+        int: número de coberturas (grupo, página) recalculadas
+    """
+    from wagtail.models import Page
+
+    from .models import ContentCoverage, PlanItem
+
+    items = PlanItem.objects.exclude(content_type__model="blogindexpage")
+    if plans is not None:
+        items = items.filter(plan__in=plans)
+    pairs = set(items.values_list("plan__group_id", "object_id"))
+    if not pairs:
+        return 0
+
+    group_ids = {group_id for group_id, _ in pairs}
+    pages = {page.pk: page for page in Page.objects.filter(pk__in={pk for _, pk in pairs}).specific()}
+    elements = {pk: get_page_elements(page) for pk, page in pages.items()}
+    page_cts = {
+        pk: ContentType.objects.get_for_model(page, for_concrete_model=True)
+        for pk, page in pages.items()
+    }
+
+    # Elementos vistos por cada grupo, acotados a los elementos de las páginas
+    condition = _elements_condition([el for els in elements.values() for el in els])
+    seen = set()
+    if condition is not None:
+        seen = set(
+            ClassSessionItem.objects.filter(condition, session__group_id__in=group_ids)
+            .values_list("session__group_id", "content_type__model", "object_id")
+            .distinct()
+        )
+    seen_keys = {(group_id, f"{model}:{object_id}") for group_id, model, object_id in seen}
+
+    presented = {
+        (group_id, model, object_id)
+        for group_id, model, object_id in ClassSessionItem.objects.filter(
+            session__group_id__in=group_ids,
+            content_type__model__in={ct.model for ct in page_cts.values()} | {"page"},
+            object_id__in=pages.keys(),
+        ).values_list("session__group_id", "content_type__model", "object_id")
+    }
+
+    last_sessions = {}
+    for group_id, page_id, session_id in (
+        ClassSessionItem.objects.filter(
+            session__group_id__in=group_ids, source_page_id__in=pages.keys()
+        )
+        .order_by("session__date")
+        .values_list("session__group_id", "source_page_id", "session_id")
+    ):
+        last_sessions[(group_id, page_id)] = session_id
+
+    existing = {
+        (cov.group_id, cov.content_type_id, cov.object_id): cov
+        for cov in ContentCoverage.objects.filter(
+            group_id__in=group_ids, object_id__in=pages.keys()
+        )
+    }
+    now = timezone.now()
+    to_create, to_update = [], []
+    for group_id, page_id in pairs:
+        if page_id not in pages:
+            continue
+        ct = page_cts[page_id]
+        seen_elements = [
+            el["key"] for el in elements[page_id] if (group_id, el["key"]) in seen_keys
+        ]
+        values = {
+            "elements_total": len(elements[page_id]),
+            "elements_seen": len(seen_elements),
+            "seen_element_keys": seen_elements,
+            "page_presented": (group_id, ct.model, page_id) in presented
+            or (group_id, "page", page_id) in presented,
+            "last_session_id": last_sessions.get((group_id, page_id)),
+        }
+        coverage = existing.get((group_id, ct.pk, page_id))
+        if coverage is None:
+            to_create.append(
+                ContentCoverage(group_id=group_id, content_type=ct, object_id=page_id, **values)
+            )
+        else:
+            for field, value in values.items():
+                setattr(coverage, field, value)
+            coverage.updated_at = now  # bulk_update no aplica auto_now
+            to_update.append(coverage)
+
+    ContentCoverage.objects.bulk_create(to_create, batch_size=500)
+    ContentCoverage.objects.bulk_update(
+        to_update,
+        [
+            "elements_total",
+            "elements_seen",
+            "seen_element_keys",
+            "page_presented",
+            "last_session",
+            "updated_at",
+        ],
+        batch_size=500,
+    )
+    return len(to_create) + len(to_update)
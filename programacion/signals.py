@@ -1,6 +1,7 @@
 """
 Señales: mantener ContentCoverage al día cuando se añaden o quitan
-elementos de sesiones de clase.
+elementos de sesiones de clase. El recálculo se hace en segundo plano
+(programacion.tasks) para no bloquear la edición de la sesión.
 """
 
 from django.db.models.signals import post_delete, post_save
@@ -10,20 +11,19 @@ from clases.models import ClassSessionItem
 
 
 def _recompute_for_item(item):
-    from .services import recompute_coverage
+    """Encolar el recálculo (diferido y agrupado) de las páginas del item."""
+    from .services import PAGE_MODELS, schedule_coverage
 
     try:
-        group = item.session.group
+        group_id = item.session.group_id
     except Exception:
         return
     # Página de origen del elemento
-    if item.source_page_id and item.source_page:
-        recompute_coverage(group, item.source_page)
+    if item.source_page_id:
+        schedule_coverage(group_id, item.source_page_id)
     # El propio item puede ser una página completa
-    if item.content_type.model in ("blogpage", "scorepage", "dictadopage"):
-        obj = item.content_object
-        if obj:
-            recompute_coverage(group, obj)
+    if item.content_type.model in PAGE_MODELS:
+        schedule_coverage(group_id, item.object_id)
 
 
 @receiver(post_save, sender=ClassSessionItem, dispatch_uid="programacion_item_saved")
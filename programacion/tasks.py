@@ -0,0 +1,28 @@
+"""
+Tareas Huey de la programación didáctica.
+"""
+
+import logging
+
+from huey.contrib.djhuey import db_task
+
+logger = logging.getLogger(__name__)
+
+
+@db_task()
+def recompute_page_coverage(group_id: int, page_id: int):
+    """Recalcula la cobertura de una página para un grupo (encolada por services.schedule_coverage)."""
+    from wagtail.models import Page
+
+    from clases.models import Group
+    from programacion.services import clear_coverage_pending, recompute_coverage
+
+    # Los cambios que lleguen a partir de aquí encolan un nuevo recálculo
+    clear_coverage_pending(group_id, page_id)
+
+    group = Group.objects.filter(pk=group_id).first()
+    page = Page.objects.filter(pk=page_id).first()
+    if group is None or page is None:
+        logger.info("Cobertura no recalculada: grupo %s o página %s ya no existen", group_id, page_id)
+        return
+    recompute_coverage(group, page.specific)
@@ -10,6 +10,7 @@ import json
 import pytest
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from wagtail.documents.models import Document
 from wagtail.models import Page
@@ -21,12 +22,19 @@ from programacion.services import (
     create_session_from_plan_item,
     get_page_elements,
     get_pending_elements,
+    get_seen_keys,
     recompute_coverage,
 )
 
 User = get_user_model()
 
 
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    """Las claves de recálculo pendiente no deben pasar de un test a otro."""
+    cache.clear()
+
+
 @pytest.fixture
 def teacher(db):
     return User.objects.create_user(
@@ -86,6 +94,22 @@ def article(db, root_page):
     return article, doc1, doc2
 
 
+@pytest.fixture
+def run_coverage_tasks(monkeypatch, django_capture_on_commit_callbacks):
+    """
+    Ejecutar al momento los recálculos de cobertura que las señales encolan
+    tras el commit. Uso: `with run_coverage_tasks(): ...`
+    """
+    from programacion.tasks import recompute_page_coverage
+
+    monkeypatch.setattr(
+        recompute_page_coverage,
+        "schedule",
+        lambda args, delay=None: recompute_page_coverage.call_local(*args),
+    )
+    return lambda: django_capture_on_commit_callbacks(execute=True)
+
+
 @pytest.mark.django_db
 class TestCoverage:
     def test_get_page_elements(self, article):
@@ -94,20 +118,23 @@ class TestCoverage:
         assert len(elements) == 2
         assert {el["object_id"] for el in elements} == {doc1.pk, doc2.pk}
 
-    def test_coverage_updates_when_session_items_added(self, article, group, teacher):
+    def test_coverage_updates_when_session_items_added(
+        self, article, group, teacher, run_coverage_tasks
+    ):
         page, doc1, doc2 = article
         session = ClassSession.objects.create(
             teacher=teacher, group=group, date="2026-01-10", title="Clase 1"
         )
         doc_ct = ContentType.objects.get_for_model(Document)
-        # Señal post_save recalcula cobertura
-        ClassSessionItem.objects.create(
-            session=session,
-            content_type=doc_ct,
-            object_id=doc1.pk,
-            source_page=page,
-            order=0,
-        )
+        # Señal post_save encola el recálculo de cobertura tras el commit
+        with run_coverage_tasks():
+            ClassSessionItem.objects.create(
+                session=session,
+                content_type=doc_ct,
+                object_id=doc1.pk,
+                source_page=page,
+                order=0,
+            )
         coverage = ContentCoverage.objects.get(
             group=group,
             content_type=ContentType.objects.get_for_model(BlogPage),
@@ -140,10 +167,165 @@ class TestCoverage:
         coverage = recompute_coverage(group, page)
         assert coverage.percent == 100
 
+    def test_seen_keys_only_for_page_elements(self, article, group, teacher):
+        """get_seen_keys(page) solo devuelve elementos de esa página."""
+        page, doc1, doc2 = article
+        other = _make_doc("otro.pdf")
+        session = ClassSession.objects.create(
+            teacher=teacher, group=group, date="2026-01-10", title="Clase 1"
+        )
+        doc_ct = ContentType.objects.get_for_model(Document)
+        for i, doc in enumerate([doc1, other]):
+            ClassSessionItem.objects.create(
+                session=session, content_type=doc_ct, object_id=doc.pk, order=i
+            )
+        assert get_seen_keys(group, page) == {f"document:{doc1.pk}"}
+        assert f"document:{other.pk}" in get_seen_keys(group)
+
+    def test_recompute_queries_do_not_grow_with_history(self, article, group, teacher):
+        """El historial del grupo no aumenta las consultas del recálculo."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        page, doc1, doc2 = article
+        session = ClassSession.objects.create(
+            teacher=teacher, group=group, date="2026-01-10", title="Clase 1"
+        )
+        doc_ct = ContentType.objects.get_for_model(Document)
+
+        def count_queries():
+            fresh = BlogPage.objects.get(pk=page.pk)
+            with CaptureQueriesContext(connection) as ctx:
+                recompute_coverage(group, fresh)
+            return len(ctx.captured_queries)
+
+        count_queries()  # calentar caché de ContentType
+        before = count_queries()
+        ClassSessionItem.objects.bulk_create(
+            [
+                ClassSessionItem(
+                    session=session, content_type=doc_ct, object_id=10_000 + i, order=i
+                )
+                for i in range(50)
+            ]
+        )
+        assert count_queries() == before
+
+    def test_session_changes_are_debounced_per_group_and_page(
+        self, article, group, teacher, monkeypatch, django_capture_on_commit_callbacks
+    ):
+        """Varios cambios de la misma página encolan un único recálculo."""
+        from programacion import services
+        from programacion.tasks import recompute_page_coverage
+
+        page, doc1, doc2 = article
+        monkeypatch.setattr(services, "cache_is_shared", lambda: True)
+        scheduled = []
+        monkeypatch.setattr(
+            recompute_page_coverage,
+            "schedule",
+            lambda args, delay=None: scheduled.append((args, delay)),
+        )
+        session = ClassSession.objects.create(
+            teacher=teacher, group=group, date="2026-01-10", title="Clase 1"
+        )
+        doc_ct = ContentType.objects.get_for_model(Document)
+        with django_capture_on_commit_callbacks(execute=True):
+            for i, doc in enumerate([doc1, doc2]):
+                ClassSessionItem.objects.create(
+                    session=session,
+                    content_type=doc_ct,
+                    object_id=doc.pk,
+                    source_page=page,
+                    order=i,
+                )
+        assert scheduled == [((group.pk, page.pk), 10)]
+        assert not ContentCoverage.objects.filter(group=group).exists()
+
+        # La tarea libera el par: el siguiente cambio vuelve a encolar
+        recompute_page_coverage.call_local(group.pk, page.pk)
+        assert ContentCoverage.objects.get(group=group, object_id=page.pk).percent == 100
+        with django_capture_on_commit_callbacks(execute=True):
+            session.items.first().delete()
+        assert len(scheduled) == 2
+
+    def test_every_change_is_enqueued_without_a_shared_cache(
+        self, article, group, teacher, monkeypatch, django_capture_on_commit_callbacks
+    ):
+        """Con LocMemCache la tarea no ve la clave del proceso web: no se agrupa."""
+        from programacion import services
+        from programacion.tasks import recompute_page_coverage
+
+        page, doc1, doc2 = article
+        monkeypatch.setattr(services, "cache_is_shared", lambda: False)
+        scheduled = []
+        monkeypatch.setattr(
+            recompute_page_coverage,
+            "schedule",
+            lambda args, delay=None: scheduled.append((args, delay)),
+        )
+        session = ClassSession.objects.create(
+            teacher=teacher, group=group, date="2026-01-10", title="Clase 1"
+        )
+        doc_ct = ContentType.objects.get_for_model(Document)
+        for i, doc in enumerate([doc1, doc2]):
+            with django_capture_on_commit_callbacks(execute=True):
+                ClassSessionItem.objects.create(
+                    session=session,
+                    content_type=doc_ct,
+                    object_id=doc.pk,
+                    source_page=page,
+                    order=i,
+                )
+        assert scheduled == [((group.pk, page.pk), 10)] * 2
+
+    def test_recompute_all_coverage_matches_single_recompute(self, article, group, teacher):
+        from programacion.services import recompute_all_coverage
+
+        page, doc1, doc2 = article
+        plan = CoursePlan.objects.create(teacher=teacher, group=group, name="Plan")
+        PlanItem.objects.create(
+            plan=plan,
+            content_type=ContentType.objects.get_for_model(BlogPage),
+            object_id=page.pk,
+        )
+        session = ClassSession.objects.create(
+            teacher=teacher, group=group, date="2026-01-10", title="Clase 1"
+        )
+        ClassSessionItem.objects.create(
+            session=session,
+            content_type=ContentType.objects.get_for_model(Document),
+            object_id=doc1.pk,
+            source_page=page,
+            order=0,
+        )
+        expected = recompute_coverage(group, page)
+        ContentCoverage.objects.all().delete()
+
+        assert recompute_all_coverage() == 1
+        coverage = ContentCoverage.objects.get(group=group, object_id=page.pk)
+        assert coverage.seen_element_keys == expected.seen_element_keys
+        assert coverage.last_session_id == session.pk
+        assert coverage.percent == 50
+
+        # Segunda pasada: actualiza la fila existente
+        ClassSessionItem.objects.create(
+            session=session,
+            content_type=ContentType.objects.get_for_model(Document),
+            object_id=doc2.pk,
+            source_page=page,
+            order=1,
+        )
+        assert recompute_all_coverage() == 1
+        coverage.refresh_from_db()
+        assert coverage.percent == 100
+
 
 @pytest.mark.django_db
 class TestPlan:
-    def test_plan_progress_and_next_step(self, article, group, teacher):
+    def test_plan_progress_and_next_step(
+        self, article, group, teacher, run_coverage_tasks
+    ):
         page, doc1, doc2 = article
         plan = CoursePlan.objects.create(
             teacher=teacher, group=group, name="1er Trimestre"
@@ -160,13 +342,14 @@ class TestPlan:
         session = ClassSession.objects.create(
             teacher=teacher, group=group, date="2026-01-10", title="Clase 1"
         )
-        ClassSessionItem.objects.create(
-            session=session,
-            content_type=ContentType.objects.get_for_model(Document),
-            object_id=doc1.pk,
-            source_page=page,
-            order=0,
-        )
+        with run_coverage_tasks():
+            ClassSessionItem.objects.create(
+                session=session,
+                content_type=ContentType.objects.get_for_model(Document),
+                object_id=doc1.pk,
+                source_page=page,
+                order=0,
+            )
         assert plan.get_progress() == 50
         assert plan.get_next_step() == item
 
@@ -210,6 +393,91 @@ class TestPlan:
         assert all(i.source_page_id == page.pk for i in session.items.all())
         assert session.metadata["plan_item_id"] == item.pk
 
+    def test_create_sessions_for_next_items(self, root_page, group, teacher):
+        """Una clase por cada capítulo pendiente, con consultas constantes."""
+        import datetime
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from programacion.services import create_sessions_for_next_items
+
+        book = BlogIndexPage(title="Libro de flauta", slug="libro-flauta")
+        root_page.add_child(instance=book)
+        chapters = []
+        for n in range(3):
+            docs = [_make_doc(f"cap{n}-{i}.pdf") for i in range(n + 1)]
+            chapter = BlogPage(
+                title=f"Capitulo {n + 1}",
+                slug=f"cap-{n + 1}",
+                date="2026-01-01",
+                intro="x",
+                attachments=json.dumps(
+                    [{"type": "pdf_score", "value": {"pdf_file": d.pk}} for d in docs]
+                ),
+            )
+            book.add_child(instance=chapter)
+            chapters.append(chapter)
+
+        plan = CoursePlan.objects.create(teacher=teacher, group=group, name="Plan")
+        book_item = PlanItem.objects.create(
+            plan=plan,
+            content_type=ContentType.objects.get_for_model(BlogIndexPage),
+            object_id=book.pk,
+        )
+        book_item.sync_chapters()
+        first = book_item.children.order_by("order").first()
+        first.status = PlanItem.Status.DONE
+        first.save()
+
+        start = datetime.date(2026, 2, 2)
+        with CaptureQueriesContext(connection) as ctx:
+            sessions = create_sessions_for_next_items(plan, teacher, start, 5)
+        assert [s.title for s in sessions] == ["Capitulo 2", "Capitulo 3"]
+        assert [s.date for s in sessions] == [start, start + datetime.timedelta(days=7)]
+        assert [s.items.count() for s in sessions] == [2, 3]
+        assert all(
+            i.source_page_id == chapters[2].pk for i in sessions[1].items.all()
+        )
+        # Sesiones e items en un bulk_create cada uno, no una consulta por item
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+        assert len(inserts) == 2
+
+    def test_create_sessions_view(self, client, article, group, teacher):
+        page, doc1, doc2 = article
+        plan = CoursePlan.objects.create(teacher=teacher, group=group, name="Plan")
+        PlanItem.objects.create(
+            plan=plan,
+            content_type=ContentType.objects.get_for_model(BlogPage),
+            object_id=page.pk,
+        )
+        client.force_login(teacher)
+        response = client.post(
+            f"/programacion/{plan.pk}/create-sessions/",
+            {"count": "3", "start_date": "2026-03-02", "days_between": "2"},
+        )
+        assert response.status_code == 302
+        session = ClassSession.objects.get(group=group)
+        assert str(session.date) == "2026-03-02"
+        assert session.metadata == {"plan_item_id": plan.items.get().pk, "plan_id": plan.pk}
+        assert session.items.count() == 2
+
+    def test_reorder_items_in_bulk(self, group, teacher, django_assert_num_queries):
+        session = ClassSession.objects.create(
+            teacher=teacher, group=group, date="2026-01-10", title="Clase"
+        )
+        doc_ct = ContentType.objects.get_for_model(Document)
+        items = ClassSessionItem.objects.bulk_create(
+            [
+                ClassSessionItem(session=session, content_type=doc_ct, object_id=i, order=i)
+                for i in range(4)
+            ]
+        )
+        new_order = [str(items[3].pk), items[1].pk, items[0].pk, items[2].pk]
+        with django_assert_num_queries(2):
+            session.reorder_items(new_order)
+        assert list(session.items.order_by("order").values_list("object_id", flat=True)) == [3, 1, 0, 2]
+
 
 @pytest.mark.django_db
 class TestSessionClose:
@@ -36,5 +36,10 @@ urlpatterns = [
         views.create_session_from_item,
         name="create_session_from_item",
     ),
+    path(
+        "<int:pk>/create-sessions/",
+        views.create_sessions_for_next_items,
+        name="create_sessions_for_next_items",
+    ),
     path("<int:pk>/reorder/", views.plan_reorder, name="plan_reorder"),
 ]
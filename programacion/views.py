@@ -9,12 +9,19 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.contenttypes.models import ContentType
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.views.decorators.http import require_http_methods
 
 from clases.models import Group, GroupLibraryItem
 
 from .models import CoursePlan, PlanItem
-from .services import create_session_from_plan_item, recompute_coverage
+from .services import (
+    create_session_from_plan_item,
+    create_sessions_for_next_items as create_sessions_for_next_plan_items,
+    recompute_coverage,
+)
+
+MAX_BULK_SESSIONS = 30
 
 
 def is_staff(user):
@@ -112,6 +119,7 @@ def plan_detail(request, pk):
             "book_choices": book_choices,
             "next_step": next_step,
             "pending_elements": pending_elements,
+            "max_bulk_sessions": MAX_BULK_SESSIONS,
             "today": timezone.localdate,
         },
     )
@@ -255,6 +263,32 @@ def create_session_from_item(request, pk, item_id):
     return redirect("clases:class_session_edit", pk=session.pk)
 
 
+@login_required
+@user_passes_test(is_staff)
+@require_http_methods(["POST"])
+def create_sessions_for_next_items(request, pk):
+    """Crear de una vez las clases de los próximos N pasos del plan."""
+    plan = _get_plan(request, pk)
+    try:
+        count = min(max(int(request.POST.get("count", 5)), 1), MAX_BULK_SESSIONS)
+        days_between = min(max(int(request.POST.get("days_between", 7)), 1), 31)
+        start_date = (
+            parse_date(request.POST.get("start_date", "")) or timezone.localdate()
+        )
+    except ValueError:
+        messages.error(request, "Número de clases, fecha o días no válidos.")
+        return redirect("programacion:plan_detail", pk=plan.pk)
+
+    sessions = create_sessions_for_next_plan_items(
+        plan, request.user, start_date, count, days_between=days_between
+    )
+    if sessions:
+        messages.success(request, f"{len(sessions)} clases creadas a partir del plan.")
+    else:
+        messages.info(request, "No quedan pasos pendientes en el plan.")
+    return redirect("programacion:plan_detail", pk=plan.pk)
+
+
 # =============================================================================
 # COMPARATIVA DE GRUPOS
 # =============================================================================
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Survey, Song, SongProposal, Vote
+from .models import Survey, Song, SongProposal, SongVoteTally, Vote
 
 # Register your models here.
 
@@ -25,3 +25,9 @@ class VoteAdmin(admin.ModelAdmin):
     list_display = ('survey', 'song', 'voter', 'created_at')
     list_filter = ('created_at',)
     search_fields = ('survey__title', 'song__name', 'voter__username')
+
+@admin.register(SongVoteTally)
+class SongVoteTallyAdmin(admin.ModelAdmin):
+    list_display = ('survey', 'song', 'votes')
+    search_fields = ('survey__title', 'song__name')
+    readonly_fields = ('survey', 'song', 'votes')
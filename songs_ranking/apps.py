@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SongsRankingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'songs_ranking'
+
+    def ready(self):
+        from . import signals  # noqa: F401
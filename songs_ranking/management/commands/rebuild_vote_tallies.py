@@ -0,0 +1,19 @@
+"""
+Management command to rebuild the SongVoteTally counters from Vote.
+
+The counters are kept current by signals; run this after bulk operations
+that bypass them (queryset.update(), raw SQL, fixture loads).
+"""
+from django.core.management.base import BaseCommand
+
+from songs_ranking.models import SongVoteTally
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-song vote tallies used by the voting and results pages'
+
+    def handle(self, *args, **options):
+        SongVoteTally.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {SongVoteTally.objects.count()} vote tallies rebuilt'
+        ))
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.11 on 2026-10-19 00:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_vote_tallies(apps, schema_editor):
+    """Rellenar los contadores con los votos ya existentes"""
+    Vote = apps.get_model('songs_ranking', 'Vote')
+    SongVoteTally = apps.get_model('songs_ranking', 'SongVoteTally')
+
+    tallies = (
+        Vote.objects.values('survey_id', 'song_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    SongVoteTally.objects.bulk_create(
+        SongVoteTally(survey_id=t['survey_id'], song_id=t['song_id'], votes=t['total'])
+        for t in tallies
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('songs_ranking', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SongVoteTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('votes', models.PositiveIntegerField(default=0, verbose_name='Votes')),
+                ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vote_tallies', to='songs_ranking.song', verbose_name='Song')),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vote_tallies', to='songs_ranking.survey', verbose_name='Survey')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='songvotetally',
+            constraint=models.UniqueConstraint(fields=('survey', 'song'), name='unique_song_vote_tally'),
+        ),
+        migrations.RunPython(backfill_vote_tallies, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count
+from django.db.models.functions import Greatest
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
@@ -117,3 +119,59 @@ class Vote(models.Model):
         
     def __str__(self):
         return f"{self.voter.username} voted for {self.song} in {self.survey}"
+
+
+class SongVoteTally(models.Model):
+    """
+    Number of votes of a song in a survey.
+
+    Kept current by `songs_ranking/signals.py` when votes are added or
+    removed, so the voting and results pages read the counts with a join
+    instead of counting `Vote` rows on every request.
+    """
+    survey = models.ForeignKey(
+        Survey,
+        verbose_name=_("Survey"),
+        on_delete=models.CASCADE,
+        related_name="vote_tallies"
+    )
+    song = models.ForeignKey(
+        Song,
+        verbose_name=_("Song"),
+        on_delete=models.CASCADE,
+        related_name="vote_tallies"
+    )
+    votes = models.PositiveIntegerField(_("Votes"), default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["survey", "song"], name="unique_song_vote_tally")
+        ]
+
+    def __str__(self):
+        return f"{self.song} in {self.survey}: {self.votes}"
+
+    @classmethod
+    def bump(cls, survey_id, song_id, delta):
+        """Add `delta` to the tally atomically (never below zero)."""
+        rows = cls.objects.filter(survey_id=survey_id, song_id=song_id)
+        if rows.update(votes=Greatest(models.F("votes") + delta, 0)):
+            return
+        if delta > 0:
+            cls.objects.get_or_create(survey_id=survey_id, song_id=song_id, defaults={"votes": 0})
+            rows.update(votes=models.F("votes") + delta)
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every tally from `Vote`."""
+        tallies = (
+            Vote.objects.values("survey_id", "song_id")
+            .annotate(total=Count("id"))
+            .order_by()
+        )
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                cls(survey_id=t["survey_id"], song_id=t["song_id"], votes=t["total"])
+                for t in tallies
+            )
@@ -0,0 +1,20 @@
+"""
+Señales: mantener `SongVoteTally` al día cuando se añaden o quitan votos
+(también los borrados en cascada al eliminar un usuario).
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import SongVoteTally, Vote
+
+
+@receiver(post_save, sender=Vote, dispatch_uid="songs_ranking_vote_added")
+def on_vote_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        SongVoteTally.bump(instance.survey_id, instance.song_id, 1)
+
+
+@receiver(post_delete, sender=Vote, dispatch_uid="songs_ranking_vote_removed")
+def on_vote_deleted(sender, instance, **kwargs):
+    SongVoteTally.bump(instance.survey_id, instance.song_id, -1)
@@ -1,131 +1,195 @@
-import requests
 import base64
-import json
 import logging
+import threading
+
+import requests
 from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+AUTH_URL = "https://accounts.spotify.com/api/token"
+BASE_URL = "https://api.spotify.com/v1"
+
+# (conexión, lectura) en segundos
+TIMEOUT = (3.05, 10)
+# Token client-credentials compartido por todos los procesos; se renueva un poco antes de caducar
+TOKEN_CACHE_KEY = "songs_ranking:spotify_token"
+TOKEN_EXPIRY_MARGIN = 60
+# Máximo de IDs que admite GET /tracks
+TRACKS_BATCH_SIZE = 50
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """requests.Session shared by every SpotifyClient (keep-alive connection pool, retries on 5xx)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # Backoff corto (0.5 s, 1 s): las búsquedas se hacen dentro de una
+            # petición de página. Un 429 no se reintenta (seguiríamos dentro
+            # de la ventana de bloqueo) ni se espera su Retry-After: falla ya
+            retries = Retry(
+                total=2,
+                backoff_factor=0.5,
+                backoff_max=2,
+                status_forcelist=(500, 502, 503, 504),
+                allowed_methods=("GET", "POST"),
+                respect_retry_after_header=False,
+            )
+            adapter = HTTPAdapter(pool_maxsize=10, max_retries=retries)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+def _track_to_song(track):
+    artists = ", ".join([artist["name"] for artist in track["artists"]])
+    album_name = track["album"]["name"] if track["album"] else ""
+    images = track["album"]["images"] if track["album"] and "images" in track["album"] else []
+    image_url = images[0]["url"] if images else None
+
+    return {
+        "spotify_id": track["id"],
+        "name": track["name"],
+        "artist": artists,
+        "album": album_name,
+        "preview_url": track.get("preview_url"),
+        "image_url": image_url
+    }
+
+
 class SpotifyClient:
-    """Client for interacting with the Spotify API"""
-    
+    """
+    Client for interacting with the Spotify API.
+
+    Instances are cheap: they share a pooled HTTP session and the
+    client-credentials token, which is cached until shortly before it
+    expires.
+    """
+
     def __init__(self):
         self.client_id = settings.SPOTIFY_CLIENT_ID
         self.client_secret = settings.SPOTIFY_CLIENT_SECRET
         self.token = None
-        self.base_url = "https://api.spotify.com/v1"
-        
-    def get_auth_token(self):
-        """Get a new authorization token from Spotify"""
-        auth_url = "https://accounts.spotify.com/api/token"
+        self.base_url = BASE_URL
+        self.session = get_session()
+
+    def get_auth_token(self, force_refresh=False):
+        """Get an authorization token from Spotify (cached unless `force_refresh`)"""
+        if not force_refresh:
+            self.token = cache.get(TOKEN_CACHE_KEY)
+            if self.token:
+                return self.token
+
         auth_header = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
-        
+
         headers = {
             "Authorization": f"Basic {auth_header}",
             "Content-Type": "application/x-www-form-urlencoded"
         }
-        
+
         data = {"grant_type": "client_credentials"}
-        
+
         try:
-            response = requests.post(auth_url, headers=headers, data=data)
+            response = self.session.post(AUTH_URL, headers=headers, data=data, timeout=TIMEOUT)
             response.raise_for_status()
-            
+
             auth_data = response.json()
             self.token = auth_data["access_token"]
+            expires_in = int(auth_data.get("expires_in", 3600))
+            cache.set(TOKEN_CACHE_KEY, self.token, max(expires_in - TOKEN_EXPIRY_MARGIN, 1))
             return self.token
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching Spotify auth token: {str(e)}")
+            self.token = None
             return None
-    
-    def search_songs(self, query, limit=10):
-        """Search for songs using the Spotify API"""
+
+    def _get(self, path, params=None):
+        """
+        GET an API endpoint and return its JSON. If the token was revoked or
+        expired early (401), get a new one and retry once.
+
+        Raises:
+            requests.exceptions.RequestException: on HTTP or network errors
+            RuntimeError: if no token can be obtained
+        """
         if not self.token:
             self.get_auth_token()
-            
-        if not self.token:
-            logger.error("Failed to get Spotify authentication token")
-            return []
-            
-        search_url = f"{self.base_url}/search"
-        headers = {"Authorization": f"Bearer {self.token}"}
+
+        for attempt in range(2):
+            if not self.token:
+                raise RuntimeError("Failed to get Spotify authentication token")
+            response = self.session.get(
+                f"{self.base_url}/{path}",
+                headers={"Authorization": f"Bearer {self.token}"},
+                params=params,
+                timeout=TIMEOUT,
+            )
+            if response.status_code == 401 and attempt == 0:
+                self.get_auth_token(force_refresh=True)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def search_songs(self, query, limit=10):
+        """Search for songs using the Spotify API"""
         params = {
             "q": query,
             "type": "track",
             "limit": limit
         }
-        
+
         try:
             logger.info(f"Searching Spotify for: {query}")
-            response = requests.get(search_url, headers=headers, params=params)
-            response.raise_for_status()
-            
-            results = response.json()
-            logger.info(f"Spotify API response status: {response.status_code}")
-            
+            results = self._get("search", params)
+
             if 'tracks' not in results or 'items' not in results.get('tracks', {}):
                 logger.error(f"Unexpected response format from Spotify API: {results}")
                 return []
-                
+
             tracks = results.get("tracks", {}).get("items", [])
             logger.info(f"Found {len(tracks)} tracks in Spotify search")
-            
-            song_data = []
-            for track in tracks:
-                artists = ", ".join([artist["name"] for artist in track["artists"]])
-                album_name = track["album"]["name"] if track["album"] else ""
-                images = track["album"]["images"] if track["album"] and "images" in track["album"] else []
-                image_url = images[0]["url"] if images else None
-                
-                song = {
-                    "spotify_id": track["id"],
-                    "name": track["name"],
-                    "artist": artists,
-                    "album": album_name,
-                    "preview_url": track.get("preview_url"),
-                    "image_url": image_url
-                }
-                song_data.append(song)
-            
-            return song_data
-        except requests.exceptions.RequestException as e:
+
+            return [_track_to_song(track) for track in tracks]
+        except (requests.exceptions.RequestException, RuntimeError) as e:
             logger.error(f"Error searching Spotify songs: {str(e)}")
             return []
         except Exception as e:
             logger.error(f"Unexpected error in Spotify search: {str(e)}")
             return []
-    
+
     def get_song_by_id(self, spotify_id):
         """Get a specific song by its Spotify ID"""
-        if not self.token:
-            self.get_auth_token()
-            
-        if not self.token:
-            return None
-            
-        track_url = f"{self.base_url}/tracks/{spotify_id}"
-        headers = {"Authorization": f"Bearer {self.token}"}
-        
         try:
-            response = requests.get(track_url, headers=headers)
-            response.raise_for_status()
-            
-            track = response.json()
-            artists = ", ".join([artist["name"] for artist in track["artists"]])
-            album_name = track["album"]["name"] if track["album"] else ""
-            images = track["album"]["images"] if track["album"] and "images" in track["album"] else []
-            image_url = images[0]["url"] if images else None
-            
-            song = {
-                "spotify_id": track["id"],
-                "name": track["name"],
-                "artist": artists,
-                "album": album_name,
-                "preview_url": track.get("preview_url"),
-                "image_url": image_url
-            }
-            
-            return song
-        except requests.exceptions.RequestException as e:
+            return _track_to_song(self._get(f"tracks/{spotify_id}"))
+        except (requests.exceptions.RequestException, RuntimeError) as e:
             logger.error(f"Error fetching Spotify song {spotify_id}: {str(e)}")
             return None
+
+    def get_songs_by_ids(self, spotify_ids):
+        """
+        Get several songs with the several-tracks endpoint (up to 50 IDs per request).
+
+        Returns:
+            dict of spotify_id -> song data; unknown IDs and failed batches
+            are left out
+        """
+        spotify_ids = list(dict.fromkeys(spotify_ids))
+        songs = {}
+        for start in range(0, len(spotify_ids), TRACKS_BATCH_SIZE):
+            batch = spotify_ids[start:start + TRACKS_BATCH_SIZE]
+            try:
+                tracks = self._get("tracks", {"ids": ",".join(batch)}).get("tracks", [])
+            except (requests.exceptions.RequestException, RuntimeError) as e:
+                logger.error(f"Error fetching {len(batch)} Spotify songs: {str(e)}")
+                continue
+            for track in tracks:
+                if track:
+                    songs[track["id"]] = _track_to_song(track)
+        return songs
@@ -0,0 +1,32 @@
+import logging
+
+from django.db.models import Q
+from huey.contrib.djhuey import db_task
+
+from .models import Song
+from .spotify_client import SpotifyClient
+
+logger = logging.getLogger(__name__)
+
+
+@db_task()
+def refresh_preview_urls(song_ids):
+    """Rellena las URLs de previsualización que faltan consultando Spotify por lotes."""
+    songs = list(
+        Song.objects.filter(pk__in=song_ids).filter(Q(preview_url__isnull=True) | Q(preview_url=""))
+    )
+    if not songs:
+        return
+
+    spotify_songs = SpotifyClient().get_songs_by_ids([song.spotify_id for song in songs])
+
+    updated = []
+    for song in songs:
+        preview_url = spotify_songs.get(song.spotify_id, {}).get("preview_url")
+        if preview_url:
+            song.preview_url = preview_url
+            updated.append(song)
+
+    if updated:
+        Song.objects.bulk_update(updated, ["preview_url"])
+    logger.info(f"URLs de previsualización actualizadas: {len(updated)} de {len(songs)} canciones")
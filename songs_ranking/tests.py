@@ -1,3 +1,243 @@
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from martina_bescos_app.users.tests.factories import UserFactory
+
+from . import spotify_client
+from .models import Song, SongProposal, SongVoteTally, Survey, Vote
+from .spotify_client import SpotifyClient
+from .tasks import refresh_preview_urls
+
+
+def _response(status_code=200, data=None):
+    response = MagicMock(status_code=status_code)
+    response.json.return_value = data or {}
+    return response
+
+
+def _track(spotify_id, preview_url=None):
+    return {
+        "id": spotify_id,
+        "name": f"Song {spotify_id}",
+        "artists": [{"name": "Artist"}],
+        "album": {"name": "Album", "images": [{"url": "https://img/1"}]},
+        "preview_url": preview_url,
+    }
+
+
+class SpotifyClientTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.session = MagicMock()
+        self.session.post.return_value = _response(data={"access_token": "tok-1", "expires_in": 3600})
+        patcher = patch.object(spotify_client, "get_session", return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_token_is_shared_until_it_expires(self):
+        self.assertEqual(SpotifyClient().get_auth_token(), "tok-1")
+        self.assertEqual(SpotifyClient().get_auth_token(), "tok-1")
+        self.assertEqual(self.session.post.call_count, 1)
+
+        cache.delete(spotify_client.TOKEN_CACHE_KEY)  # caducado
+        SpotifyClient().get_auth_token()
+        self.assertEqual(self.session.post.call_count, 2)
+
+    def test_token_cache_timeout_follows_expiry(self):
+        with patch.object(spotify_client.cache, "set") as cache_set:
+            SpotifyClient().get_auth_token()
+        cache_set.assert_called_once_with(spotify_client.TOKEN_CACHE_KEY, "tok-1", 3600 - spotify_client.TOKEN_EXPIRY_MARGIN)
+
+    def test_requests_use_timeout(self):
+        self.session.get.return_value = _response(data=_track("a"))
+        SpotifyClient().get_song_by_id("a")
+        self.assertEqual(self.session.get.call_args.kwargs["timeout"], spotify_client.TIMEOUT)
+        self.assertEqual(self.session.post.call_args.kwargs["timeout"], spotify_client.TIMEOUT)
+
+    def test_unauthorized_refreshes_token_once(self):
+        self.session.get.side_effect = [_response(401), _response(data=_track("a"))]
+        self.session.post.side_effect = [
+            _response(data={"access_token": "tok-1", "expires_in": 3600}),
+            _response(data={"access_token": "tok-2", "expires_in": 3600}),
+        ]
+
+        song = SpotifyClient().get_song_by_id("a")
+
+        self.assertEqual(song["spotify_id"], "a")
+        self.assertEqual(self.session.get.call_args.kwargs["headers"]["Authorization"], "Bearer tok-2")
+        self.assertEqual(cache.get(spotify_client.TOKEN_CACHE_KEY), "tok-2")
+
+    def test_get_songs_by_ids_batches_requests(self):
+        ids = [f"id{n}" for n in range(120)]
+        self.session.get.side_effect = lambda url, params, **kwargs: _response(
+            data={"tracks": [_track(i) for i in params["ids"].split(",")] + [None]}
+        )
+
+        songs = SpotifyClient().get_songs_by_ids(ids + ids[:5])
+
+        self.assertEqual(len(songs), 120)
+        self.assertEqual(self.session.get.call_count, 3)
+        first_call = self.session.get.call_args_list[0]
+        self.assertTrue(first_call.args[0].endswith("/tracks"))
+        self.assertEqual(len(first_call.kwargs["params"]["ids"].split(",")), spotify_client.TRACKS_BATCH_SIZE)
+
+    def test_search_without_token_returns_empty_list(self):
+        self.session.post.return_value = _response(400)
+        self.session.post.return_value.raise_for_status.side_effect = spotify_client.requests.HTTPError("bad")
+
+        self.assertEqual(SpotifyClient().search_songs("love"), [])
+        self.session.get.assert_not_called()
+
+    def test_rate_limited_search_returns_empty_list(self):
+        self.session.get.return_value = _response(429)
+        self.session.get.return_value.raise_for_status.side_effect = spotify_client.requests.HTTPError("429")
+
+        self.assertEqual(SpotifyClient().search_songs("love"), [])
+        self.assertEqual(self.session.get.call_count, 1)
+
+
+class SpotifySessionTest(TestCase):
+    def test_session_does_not_retry_rate_limits(self):
+        with patch.object(spotify_client, "_session", None):
+            retries = spotify_client.get_session().get_adapter("https://api.spotify.com").max_retries
+        self.assertFalse(retries.is_retry("GET", 429, has_retry_after=True))
+        self.assertTrue(retries.is_retry("GET", 503))
+        self.assertFalse(retries.respect_retry_after_header)
+        self.assertLessEqual(retries.backoff_max, 2)
+
+
+class PreviewRefreshTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        now = timezone.now()
+        self.survey = Survey.objects.create(
+            title="Encuesta",
+            creator=self.user,
+            proposal_phase_start=now - timedelta(days=2),
+            proposal_phase_end=now - timedelta(days=1),
+            voting_phase_start=now - timedelta(hours=1),
+            voting_phase_end=now + timedelta(days=1),
+        )
+        self.without_preview = Song.objects.create(spotify_id="a", name="A", artist="X")
+        self.with_preview = Song.objects.create(spotify_id="b", name="B", artist="X", preview_url="https://p/b")
+        proposer = UserFactory()
+        for song in (self.without_preview, self.with_preview):
+            SongProposal.objects.create(survey=self.survey, song=song, participant=proposer)
+        self.client.force_login(self.user)
+
+    def test_voting_page_enqueues_refresh_instead_of_calling_spotify(self):
+        url = reverse("songs_ranking:voting_phase", args=[self.survey.pk])
+        with patch("songs_ranking.tasks.refresh_preview_urls") as task, \
+                patch("songs_ranking.views.SpotifyClient") as client:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.get(url).status_code, 200)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.get(url)
+
+        client.assert_not_called()
+        task.assert_called_once_with([self.without_preview.pk])
+
+    def test_task_updates_missing_preview_urls(self):
+        with patch("songs_ranking.tasks.SpotifyClient") as client:
+            client.return_value.get_songs_by_ids.return_value = {
+                "a": {"spotify_id": "a", "preview_url": "https://p/a"},
+            }
+            refresh_preview_urls.call_local([self.without_preview.pk, self.with_preview.pk])
+
+        client.return_value.get_songs_by_ids.assert_called_once_with(["a"])
+        self.without_preview.refresh_from_db()
+        self.assertEqual(self.without_preview.preview_url, "https://p/a")
+
+
+class VoteTallyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        now = timezone.now()
+        self.survey = Survey.objects.create(
+            title="Encuesta",
+            creator=self.user,
+            proposal_phase_start=now - timedelta(days=2),
+            proposal_phase_end=now - timedelta(days=1),
+            voting_phase_start=now - timedelta(hours=1),
+            voting_phase_end=now + timedelta(days=1),
+        )
+        proposer = UserFactory()
+        self.songs = [
+            Song.objects.create(spotify_id=f"s{n}", name=f"Song {n}", artist="X", preview_url="https://p")
+            for n in range(3)
+        ]
+        for song in self.songs:
+            SongProposal.objects.create(survey=self.survey, song=song, participant=proposer)
+        self.client.force_login(self.user)
+
+    def _votes(self, song):
+        return SongVoteTally.objects.filter(survey=self.survey, song=song).values_list("votes", flat=True).first()
+
+    def test_add_and_remove_vote_update_tally(self):
+        song = self.songs[0]
+        add_url = reverse("songs_ranking:add_vote", args=[self.survey.pk])
+        remove_url = reverse("songs_ranking:remove_vote", args=[self.survey.pk])
+        Vote.objects.create(survey=self.survey, song=song, voter=UserFactory())
+
+        response = self.client.post(add_url, {"song_id": song.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["vote_count"], 2)
+        self.assertEqual(self._votes(song), 2)
+
+        response = self.client.post(remove_url, {"song_id": song.pk})
+        self.assertEqual(response.context["vote_count"], 1)
+        self.assertEqual(self._votes(song), 1)
+
+    def test_deleting_voter_decrements_tally(self):
+        voter = UserFactory()
+        Vote.objects.create(survey=self.survey, song=self.songs[0], voter=voter)
+        Vote.objects.create(survey=self.survey, song=self.songs[0], voter=self.user)
+
+        voter.delete()
+
+        self.assertEqual(self._votes(self.songs[0]), 1)
+
+    def test_results_read_tallies_in_one_query(self):
+        for n, song in enumerate(self.songs):
+            for _ in range(n):
+                Vote.objects.create(survey=self.survey, song=song, voter=UserFactory())
+
+        url = reverse("songs_ranking:results", args=[self.survey.pk])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        # Una canción votada más no añade consultas
+        Vote.objects.create(survey=self.survey, song=self.songs[0], voter=UserFactory())
+        with self.assertNumQueries(len(queries)):
+            self.client.get(url)
+
+        ranking = [(item["song"], item["vote_count"]) for item in response.context["songs_with_votes"]]
+        self.assertEqual(ranking, [(self.songs[2], 2), (self.songs[1], 1)])
+        self.assertEqual(response.context["total_votes"], 3)
+
+    def test_voting_page_orders_proposals_by_tally(self):
+        Vote.objects.create(survey=self.survey, song=self.songs[1], voter=UserFactory())
+
+        response = self.client.get(reverse("songs_ranking:voting_phase", args=[self.survey.pk]))
+
+        self.assertEqual(response.context["proposals"][0].song, self.songs[1])
+        self.assertEqual(response.context["vote_counts"], {self.songs[0].pk: 0, self.songs[1].pk: 1, self.songs[2].pk: 0})
+
+    def test_rebuild_command(self):
+        Vote.objects.create(survey=self.survey, song=self.songs[0], voter=UserFactory())
+        SongVoteTally.objects.update(votes=7)
+
+        call_command("rebuild_vote_tallies", stdout=MagicMock())
 
-# Create your tests here.
+        self.assertEqual(self._votes(self.songs[0]), 1)
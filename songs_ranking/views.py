@@ -5,7 +5,10 @@ from django.http import HttpResponse, JsonResponse
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
 from django.contrib import messages
-from django.db.models import Count
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, FilteredRelation, Q, Value
+from django.db.models.functions import Coalesce
 from django.views.decorators.http import require_POST
 from django.utils.decorators import method_decorator
 import json
@@ -13,9 +16,13 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-from .models import Survey, Song, SongProposal, Vote
+from .models import Survey, Song, SongProposal, SongVoteTally, Vote
 from .spotify_client import SpotifyClient
 
+# Una consulta a Spotify por canción sin previsualización cada hora como mucho
+PREVIEW_REFRESH_KEY = "songs_ranking:preview_refresh:{song_id}"
+PREVIEW_REFRESH_INTERVAL = 60 * 60
+
 class SurveyListView(ListView):
     model = Survey
     context_object_name = 'surveys'
@@ -36,14 +43,10 @@ class SurveyDetailView(DetailView):
         # Get all song proposals for this survey
         proposals = SongProposal.objects.filter(survey=survey).select_related('song', 'participant')
         
-        # Count votes for each song in this survey
-        song_votes = Vote.objects.filter(survey=survey) \
-            .values('song') \
-            .annotate(vote_count=Count('id')) \
-            .order_by('-vote_count')
-        
-        # Create a dictionary with song_id as key and vote count as value
-        vote_counts = {vote['song']: vote['vote_count'] for vote in song_votes}
+        # Vote counts for each song in this survey (song_id -> votes)
+        vote_counts = dict(
+            SongVoteTally.objects.filter(survey=survey).values_list('song_id', 'votes')
+        )
         
         # Current user's proposals
         user_proposals = []
@@ -262,35 +265,23 @@ class VotingPhaseView(LoginRequiredMixin, DetailView):
             messages.error(self.request, "This survey is not in the voting phase yet.")
             return context
         
-        # Get all proposals for this survey, excluding those made by the current user
-        proposals = SongProposal.objects.filter(
-            survey=survey
-        ).exclude(
-            participant=self.request.user
-        ).select_related('song')
-        
-        # Count votes for each song in this survey
-        vote_counts = {}
-        for vote in Vote.objects.filter(survey=survey).values('song').annotate(count=Count('id')):
-            vote_counts[vote.get('song')] = vote.get('count')
+        # Proposals of other participants with their song's tally, most voted first (one query)
+        proposals = list(
+            SongProposal.objects.filter(
+                survey=survey
+            ).exclude(
+                participant=self.request.user
+            ).select_related('song').annotate(
+                tally=FilteredRelation('song__vote_tallies', condition=Q(song__vote_tallies__survey=survey)),
+                vote_count=Coalesce(F('tally__votes'), Value(0)),
+            ).order_by('-vote_count', 'created_at')
+        )
+        vote_counts = {proposal.song_id: proposal.vote_count for proposal in proposals}
         
-        # Refresh preview URLs for all songs
+        # Refresh missing preview URLs in the background
         self.refresh_preview_urls([p.song for p in proposals])
         
-        # Add vote count to each proposal for sorting
-        proposals_with_votes = []
-        for proposal in proposals:
-            vote_count = vote_counts.get(proposal.song.id, 0)
-            proposals_with_votes.append({
-                'proposal': proposal,
-                'vote_count': vote_count
-            })
-        
-        # Sort proposals by vote count in descending order
-        sorted_proposals = sorted(proposals_with_votes, key=lambda x: x['vote_count'], reverse=True)
-        
-        # Extract just the proposals for the template
-        context['proposals'] = [item['proposal'] for item in sorted_proposals]
+        context['proposals'] = proposals
         
         # Get all votes by the current user
         user_votes = Vote.objects.filter(
@@ -305,23 +296,26 @@ class VotingPhaseView(LoginRequiredMixin, DetailView):
         return context
     
     def refresh_preview_urls(self, songs):
-        """Actualiza las URLs de previsualización de las canciones usando la API de Spotify"""
-        from .spotify_client import SpotifyClient
-        
-        spotify_client = SpotifyClient()
-        
-        for song in songs:
-            # Solo actualizar si no tiene URL de previsualización o si está vacía
-            if not song.preview_url:
-                try:
-                    # Obtener datos actualizados de Spotify
-                    song_data = spotify_client.get_song_by_id(song.spotify_id)
-                    if song_data and song_data.get('preview_url'):
-                        song.preview_url = song_data.get('preview_url')
-                        song.save(update_fields=['preview_url'])
-                except Exception as e:
-                    # No interrumpir el flujo si hay un error con la API de Spotify
-                    logger.error(f"Error al actualizar URL de previsualización para {song.name}: {str(e)}")
+        """
+        Encola la actualización de las URLs de previsualización que faltan
+        (tarea en segundo plano: la página no espera a Spotify). Cada canción
+        se vuelve a consultar como mucho una vez por PREVIEW_REFRESH_INTERVAL,
+        porque muchas pistas no tienen previsualización.
+        """
+        from .tasks import refresh_preview_urls
+
+        song_ids = [
+            song.pk for song in songs
+            if not song.preview_url
+            and cache.add(PREVIEW_REFRESH_KEY.format(song_id=song.pk), 1, PREVIEW_REFRESH_INTERVAL)
+        ]
+        if song_ids:
+            transaction.on_commit(lambda: refresh_preview_urls(song_ids))
+
+def _song_vote_count(survey, song):
+    """Current number of votes of `song` in `survey` (from its tally)."""
+    return SongVoteTally.objects.filter(survey=survey, song=song) \
+        .values_list('votes', flat=True).first() or 0
 
 @method_decorator(require_POST, name='post')
 class AddVoteView(LoginRequiredMixin, View):
@@ -368,11 +362,11 @@ class AddVoteView(LoginRequiredMixin, View):
         if not created:
             return HttpResponse("You've already voted for this song", status=400)
         
-        # Get updated vote count for this song
-        vote_count = Vote.objects.filter(survey=survey, song=song).count()
+        # Updated vote count for this song (the tally was bumped when the vote was saved)
+        vote_count = _song_vote_count(survey, song)
         
         # Get total user votes
-        total_user_votes = Vote.objects.filter(survey=survey, voter=request.user).count()
+        total_user_votes = user_votes_count + 1
         
         # Update the response with both the button and vote count
         response = render(request, 'songs_ranking/partials/vote_actions.html', {
@@ -414,8 +408,8 @@ class RemoveVoteView(LoginRequiredMixin, View):
         except Vote.DoesNotExist:
             return HttpResponse("Vote does not exist", status=400)
         
-        # Get updated vote count for this song
-        vote_count = Vote.objects.filter(survey=survey, song=song).count()
+        # Updated vote count for this song (the tally was bumped when the vote was deleted)
+        vote_count = _song_vote_count(survey, song)
         
         # Get total user votes
         user_votes_count = Vote.objects.filter(survey=survey, voter=request.user).count()
@@ -444,25 +438,20 @@ class ResultsView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        survey = self.get_object()
+        survey = self.object
         
-        # Get vote counts for each song
-        song_votes = Vote.objects.filter(survey=survey) \
-            .values('song') \
-            .annotate(vote_count=Count('id')) \
-            .order_by('-vote_count')
-        
-        # Get songs data
-        songs_with_votes = []
-        for vote in song_votes:
-            song = Song.objects.get(pk=vote['song'])
-            songs_with_votes.append({
-                'song': song,
-                'vote_count': vote['vote_count']
-            })
+        # Songs with their vote counts, most voted first (one joined query)
+        tallies = SongVoteTally.objects.filter(survey=survey, votes__gt=0) \
+            .select_related('song') \
+            .order_by('-votes', 'song__name')
+        
+        songs_with_votes = [
+            {'song': tally.song, 'vote_count': tally.votes}
+            for tally in tallies
+        ]
         
         context['songs_with_votes'] = songs_with_votes
-        context['total_votes'] = Vote.objects.filter(survey=survey).count()
+        context['total_votes'] = sum(item['vote_count'] for item in songs_with_votes)
         context['total_participants'] = SongProposal.objects.filter(survey=survey) \
             .values('participant').distinct().count()
             